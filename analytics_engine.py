@@ -5,32 +5,51 @@ import json
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 import requests
-from openai import OpenAI
-import sys
-import io
+import sandbox # Pre-forked, resource-limited workers for generated code
+import ask_cache # Question -> code -> result caches
+import ask_context # Per-version schema summary and system prompt
+import llm_clients # Long-lived LLM clients, one per API key
 
 # Configuration
 DATA_FOLDER = 'data_uploads'
 GOVT_API_URL = "https://api.data.gov.in/resource/YOUR_RESOURCE_ID" 
 GOVT_API_KEY = "YOUR_API_KEY_FROM_VIDEO"
 
-# OpenAI Configuration - expects env var or user to provide
-# For hackathon simplicity, we initialize client without key, it will look for env var OPENAI_API_KEY
-# or we can handle it in the request.
-try:
-    client = OpenAI()
-except:
-    client = None # Handle gracefully if no key currently
+# OpenAI Configuration - clients are created per API key on first use and kept;
+# without a key in the request, OpenAI() looks for the OPENAI_API_KEY env var.
+LLM_CLIENTS = llm_clients.LLMClients('openai', "gpt-3.5-turbo") # or gpt-4
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS
 
 # Global Data Storage
 GLOBAL_DF = None
+DATA_VERSION = 0 # Bumped on every load so sandbox workers are re-forked from the new frame
+DATA_KEY = None # The loaded files (name, size, mtime), stable across restarts
+ASK_SANDBOX = sandbox.SandboxPool()
+ASK_CACHE = ask_cache.AskCache()
+ASK_PROMPT = ask_context.SchemaContext("""
+    You are a data assistant. I have a Pandas DataFrame named `df`.
+    Columns: {columns}
+    Column types: {dtypes}
+    Known values of text columns:
+{categories}
+    Sample Data:
+    {sample}
+    
+    When I ask a question, return ONLY valid Python Pandas code to solve it.
+    - Assume `df` is already loaded.
+    - Store the final result in a variable called `result`.
+    - `result` should be a Dictionary if it's a single row or aggregation (e.g. {{'count': 50}}).
+    - `result` should be a List of Dictionaries if it's a dataframe slice (e.g. df.head().to_dict(orient='records')).
+    - If plotting is needed, return the data logic, the frontend will handle charts.
+    - Do NOT return markdown formatting (like ```python). Just the code.
+    - Do NOT print anything.
+    """)
 
 def load_data():
     """Loads CSV/Excel files into the global DataFrame."""
-    global GLOBAL_DF
+    global GLOBAL_DF, DATA_VERSION, DATA_KEY
     print("Loading data files...")
     
     if not os.path.exists(DATA_FOLDER):
@@ -58,6 +77,8 @@ def load_data():
         GLOBAL_DF = pd.concat(df_list, ignore_index=True)
         # Basic cleaning
         GLOBAL_DF.dropna(how='all', inplace=True)
+        DATA_VERSION += 1
+        DATA_KEY = sorted((os.path.basename(f), os.path.getsize(f), os.path.getmtime(f)) for f in all_files)
         print(f"Data Loaded: {len(GLOBAL_DF)} records.")
         return True
     return False
@@ -88,84 +109,50 @@ def ask_question():
     if not question:
         return jsonify({"error": "Question is required"}), 400
         
-    # Configure Client temporarily if key provided
-    local_client = client
-    if api_key:
-        local_client = OpenAI(api_key=api_key)
-        
-    if not local_client or not local_client.api_key:
-         return jsonify({"error": "OpenAI API Key missing. Set OPENAI_API_KEY env var or pass 'api_key'."}), 400
-
-    # 1. Prompt Engineering
-    columns = list(GLOBAL_DF.columns)
-    df_head = GLOBAL_DF.head(3).to_markdown()
-    
-    system_prompt = f"""
-    You are a data assistant. I have a Pandas DataFrame named `df`.
-    Columns: {columns}
-    Sample Data:
-    {df_head}
-    
-    When I ask a question, return ONLY valid Python Pandas code to solve it.
-    - Assume `df` is already loaded.
-    - Store the final result in a variable called `result`.
-    - `result` should be a Dictionary if it's a single row or aggregation (e.g. {{'count': 50}}).
-    - `result` should be a List of Dictionaries if it's a dataframe slice (e.g. df.head().to_dict(orient='records')).
-    - If plotting is needed, return the data logic, the frontend will handle charts.
-    - Do NOT return markdown formatting (like ```python). Just the code.
-    - Do NOT print anything.
-    """
+    # Generated code is reused while the columns stay the same, results while the files do
+    summary, system_prompt = ASK_PROMPT.get(GLOBAL_DF, DATA_VERSION)
+    code_key = ask_cache.code_key(question, summary.fingerprint, LLM_CLIENTS.model_name)
+    code_cached, generated_code = ASK_CACHE.code.get(code_key)
 
     try:
-        # 2. Call OpenAI
-        print(f"Asking OpenAI: {question}")
-        completion = local_client.chat.completions.create(
-            model="gpt-3.5-turbo", # or gpt-4
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": question}
-            ],
-            temperature=0
-        )
-        
-        generated_code = completion.choices[0].message.content.strip()
-        
-        # Cleanup markdown if present
-        if generated_code.startswith("```"):
-            generated_code = generated_code.split('\n', 1)[1]
-            if generated_code.endswith("```"):
-                generated_code = generated_code.rsplit('\n', 1)[0]
-        
-        print(f"Generated Code:\n{generated_code}")
-        
-        # 3. Execution (The Dangerous Part)
-        local_vars = {'df': GLOBAL_DF, 'pd': pd}
-        
-        # Capture stdout just in case
-        old_stdout = sys.stdout
-        sys.stdout = mystdout = io.StringIO()
-        
-        try:
-            exec(generated_code, {}, local_vars)
-        except Exception as e:
-            sys.stdout = old_stdout
-            return jsonify({"error": f"Code Execution Failed: {str(e)}", "code": generated_code}), 500
-        
-        sys.stdout = old_stdout
+        if not code_cached:
+            # 1. Client for this key (reused across requests)
+            try:
+                local_client = LLM_CLIENTS.get(api_key)
+            except llm_clients.MissingKey:
+                 return jsonify({"error": "OpenAI API Key missing. Set OPENAI_API_KEY env var or pass 'api_key'."}), 400
+
+            # 2. Call OpenAI with the prompt prepared for this data version
+            print(f"Asking OpenAI: {question}")
+            generated_code = local_client.generate(system_prompt, question)
+            
+            print(f"Generated Code:\n{generated_code}")
         
-        result = local_vars.get('result')
+        # 3. Execution in a sandbox worker (CPU, memory and wall-clock limited)
+        result_key = ask_cache.result_key(generated_code, DATA_KEY)
+        result_cached, result = ASK_CACHE.results.get(result_key)
+        if not result_cached:
+            try:
+                result = ASK_SANDBOX.run(generated_code, GLOBAL_DF, DATA_VERSION)
+            except sandbox.PoolBusy as e:
+                return jsonify({"error": str(e), "code": generated_code}), 503
+            except sandbox.SandboxError as e:
+                return jsonify({"error": f"Code Execution Failed: {str(e)}", "code": generated_code}), 500
+            ASK_CACHE.results.set(result_key, result)
+
+        # Only code that ran successfully is worth reusing
+        if not code_cached:
+            ASK_CACHE.code.set(code_key, generated_code)
         
-        # 4. Response Formatting
-        # Make sure result is JSON serializable
-        if isinstance(result, pd.DataFrame):
-            result = result.to_dict(orient='records')
-        elif isinstance(result, pd.Series):
-            result = result.to_dict()
-            
+        # 4. Response Formatting (the sandbox already made the result JSON-ready)
         return jsonify({
             "generated_code": generated_code,
             "result": result,
-            "type": str(type(result))
+            "type": str(type(result)),
+            "cache": {
+                "code": "hit" if code_cached else "miss",
+                "result": "hit" if result_cached else "miss"
+            }
         })
         
     except Exception as e:
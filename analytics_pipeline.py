@@ -1,8 +1,98 @@
 import pandas as pd
 import numpy as np
 import os
+import threading
 from datetime import datetime
-from state_utils import get_official_states_only
+from state_utils import normalize_state_series, fill_canonical_states
+import database
+import snapshot_cache
+from data_schema import apply_schema, parse_dates
+
+def resolve_columns(df):
+    """Case-insensitive lookup of the columns the analytics methods work with."""
+    cols = {c.lower(): c for c in df.columns}
+    return {
+        "district": next((v for k, v in cols.items() if k == 'district'), None),
+        "state": next((v for k, v in cols.items() if k == 'state'), None),
+        "pincode": next((v for k, v in cols.items() if k == 'pincode'), None),
+        "date": next((v for k, v in cols.items() if k == 'date'), None),
+        "age_group": next((v for k, v in cols.items() if k == 'age_group'), None),
+        "enrolments": next((v for k, v in cols.items() if k in ['enrolments', 'total_enrolments']), None),
+        "updates": next((v for k, v in cols.items() if k in ['updates', 'total_updates']), None),
+        "demo": [v for k, v in cols.items() if k in ['demo_age_5_17', 'demo_age_17_', 'total_demographic']],
+        "bio": [v for k, v in cols.items() if k in ['bio_age_5_17', 'bio_age_17_', 'total_biometric']],
+    }
+
+# Grouping levels for anomaly detection (keys of resolve_columns)
+ANOMALY_LEVELS = ('state', 'district', 'pincode')
+# Windowed mode: baseline days a (key, day) needs before it can be scored
+WINDOW_MIN_PERIODS = 3
+
+def anomaly_records(flags, columnar=False):
+    """
+    Serialize a frame from UidaiAnalytics.anomaly_frame.
+    Records: one dict per flag. Columnar: one list per field, which is much smaller
+    on the wire for large pages.
+    """
+    z = flags['z_score'].to_numpy()
+    data = {}
+    for col in flags.columns:
+        if col == 'z_score':
+            continue
+        values = flags[col]
+        if col == 'date' and pd.api.types.is_datetime64_any_dtype(values):
+            data[col] = values.dt.strftime('%Y-%m-%d %H:%M:%S').fillna('NaT').tolist()
+        else:
+            data[col] = values.astype(object).where(values.notna(), None).tolist()
+    data['z_score'] = np.round(z, 2).tolist()
+    data['severity'] = ["High"] * len(flags)
+    data['reason'] = [f"Spike of {v:.2f}x standard deviation detected." for v in z]
+
+    if columnar:
+        return data
+    keys = list(data.keys())
+    return [dict(zip(keys, row)) for row in zip(*data.values())]
+
+def format_state_trends(grouped):
+    """
+    Shape a (state, TimeKey) -> metric sums frame into the /api/analytics/states response.
+    Metric columns are any of enrolments, updates, demographic, biometric; TimeKey labels
+    are strings. Shared by the pandas and SQL execution modes.
+    """
+    # Every state gets every time bucket (0 where it had no rows), like pivot_table(fill_value=0)
+    timelines = {
+        metric: grouped[metric].unstack('TimeKey', fill_value=0).to_dict(orient='index')
+        for metric in grouped.columns
+    }
+    
+    # Format for Frontend (Array of Objects)
+    formatted_data = []
+    for state in grouped.index.get_level_values('state').unique():
+        timeline_e = timelines.get('enrolments', {}).get(state, {})
+        timeline_u = timelines.get('updates', {}).get(state, {})
+        timeline_d = timelines.get('demographic', {}).get(state, {})
+        timeline_b = timelines.get('biometric', {}).get(state, {})
+        
+        formatted_data.append({
+            "state": state,
+            "total_enrolments": sum(timeline_e.values()),
+            "total_updates": sum(timeline_u.values()),
+            "total_demographic": sum(timeline_d.values()),
+            "total_biometric": sum(timeline_b.values()),
+            "timeline_enrolments": timeline_e,
+            "timeline_updates": timeline_u,
+            "timeline_demographic": timeline_d,
+            "timeline_biometric": timeline_b
+        })
+        
+    return formatted_data
+
+def _row_total(df, cols):
+    """Row-wise sum of a few count columns (missing counts as 0), added column by column."""
+    total = df[cols[0]].fillna(0)
+    for col in cols[1:]:
+        total = total + df[col].fillna(0)
+    return total
 
 class UidaiAnalytics:
     def __init__(self, upload_folder='data_uploads'):
@@ -14,71 +104,188 @@ class UidaiAnalytics:
             'Overall': None
         }
         self.master_df = None
+        self.columns = {}
+        # What has been prepared: the caller's data version, or the source frame itself
+        self.data_version = None
+        self._source_df = None
+        self._prepare_lock = threading.Lock()
+
+    def is_prepared(self, df=None, version=None):
+        """True when the given data (by version, else by identity) is already prepared."""
+        if self.master_df is None:
+            return False
+        if version is not None:
+            return version == self.data_version
+        return df is not None and df is self._source_df
 
-    def load_datasets(self, df=None):
+    def load_datasets(self, df=None, snapshot_path=None, version=None):
         """
-        Loads data from an external DataFrame (e.g. from SQLite).
+        Loads data from an external DataFrame (e.g. from SQLite),
+        or straight from a columnar snapshot file written by snapshot_cache.
+        Preparation (schema, date parsing, column resolution, age-group partitions)
+        runs once per data version; repeat calls with the same version (or the same
+        frame object when no version is given) return immediately.
         """
-        if df is not None:
-            self.master_df = df
-            # Case-insensitive column search
-            cols = {c.lower(): c for c in self.master_df.columns}
+        if self.is_prepared(df, version):
+            return True
+
+        if df is None and snapshot_path is not None:
+            df = snapshot_cache.read_snapshot(snapshot_path)
+
+        if df is None:
+            return False
+
+        with self._prepare_lock:
+            # Another request may have prepared the same data while we waited
+            if self.is_prepared(df, version):
+                return True
+
+            # Compact typed schema (no-op for frames from the DataStore); returns a
+            # shallow copy so nothing leaks into the caller's (shared) frame
+            master_df = apply_schema(df)
+            columns = resolve_columns(master_df)
             
-            # Ensure Date column is datetime
-            date_col = next((v for k, v in cols.items() if k == 'date'), None)
+            # Ensure Date column is datetime (covers capitalised 'Date' in ad-hoc files)
+            date_col = columns['date']
             if date_col:
-                self.master_df[date_col] = pd.to_datetime(self.master_df[date_col], errors='coerce')
+                master_df[date_col] = parse_dates(master_df[date_col])
             
             # Populate age group datasets (mock logic for segmentation if no explicit group exists)
-            group_col = next((v for k, v in cols.items() if k == 'age_group'), None)
+            datasets = {group: None for group in self.datasets.keys()}
+            group_col = columns['age_group']
             if group_col:
-                for group in self.datasets.keys():
-                    self.datasets[group] = self.master_df[self.master_df[group_col] == group]
+                for group in datasets.keys():
+                    datasets[group] = master_df[master_df[group_col] == group]
             else:
                 # Mock: Put everything in 'Overall'
-                self.datasets['Overall'] = self.master_df
-                self.datasets['18+'] = self.master_df # Default for analytics hub
+                datasets['Overall'] = master_df
+                datasets['18+'] = master_df # Default for analytics hub
+            
+            # Publish the prepared state
+            self.datasets = datasets
+            self.columns = columns
+            self.master_df = master_df
+            self._source_df = df
+            self.data_version = version
             
-            print(f"Data synced into Analytics Engine: {len(self.master_df)} records")
+            print(f"Data synced into Analytics Engine: {len(master_df)} records (version {version})")
             return True
-        return False
 
-    def detect_anomalies(self, df=None):
+    def anomaly_frame(self, df=None, threshold=2.5, level='district'):
         """
-        Identifies districts/centers with enrolment spikes > 2 Standard Deviations from the mean.
-        Useful for detecting Fraud or Data Entry Errors.
+        Rows whose enrolments lie more than `threshold` standard deviations above
+        the mean of their group (state, district or pincode), most severe first.
+        Group statistics are broadcast back with groupby-transform, so the frame is
+        never merged or iterated. Columns: <level>, district, date, enrolments, z_score.
         """
         target_df = df if df is not None else self.master_df
-        if target_df is None: return []
+        if target_df is None or level not in ANOMALY_LEVELS:
+            return None
 
-        anomalies = []
-        
-        # Case-insensitive column search
-        cols = {c.lower(): c for c in target_df.columns}
-        district_col = next((v for k, v in cols.items() if k == 'district'), None)
-        enrolment_col = next((v for k, v in cols.items() if k in ['enrolments', 'total_enrolments']), None)
-        date_col = next((v for k, v in cols.items() if k == 'date'), None)
-
-        if district_col and enrolment_col:
-            stats = target_df.groupby(district_col)[enrolment_col].agg(['mean', 'std']).reset_index()
-            
-            # Join back to find outliers
-            merged = pd.merge(target_df, stats, on=district_col)
-            merged['Z_Score'] = (merged[enrolment_col] - merged['mean']) / (merged['std'].replace(0, 1))
-            
-            # Filter Anomalies (Z-Score > 2.5)
-            anomaly_df = merged[merged['Z_Score'] > 2.5]
-            
-            for _, row in anomaly_df.iterrows():
-                anomalies.append({
-                    "district": row[district_col],
-                    "date": str(row.get(date_col, 'N/A')),
-                    "enrolments": row[enrolment_col],
-                    "severity": "High",
-                    "reason": f"Spike of {row['Z_Score']:.2f}x standard deviation detected."
-                })
-        
-        return anomalies
+        # Columns were resolved once in load_datasets; only ad-hoc frames need a lookup
+        columns = self.columns if target_df is self.master_df else resolve_columns(target_df)
+        key_col = columns[level]
+        enrolment_col = columns['enrolments']
+        if not key_col or not enrolment_col:
+            return None
+
+        counts = pd.to_numeric(target_df[enrolment_col], errors='coerce')
+        values = pd.Series(counts.to_numpy(dtype='float64', na_value=np.nan), index=target_df.index)
+        grouped = values.groupby(target_df[key_col], observed=True)
+        mean = grouped.transform('mean')
+        std = grouped.transform('std').replace(0, 1)
+        z_score = ((values - mean) / std).to_numpy(dtype='float64', na_value=np.nan)
+
+        # NaN (single-row groups, missing counts) never compares greater
+        hits = np.flatnonzero(z_score > threshold)
+        hits = hits[np.argsort(-z_score[hits], kind='stable')]
+
+        rows = target_df.iloc[hits]
+        flags = {level: rows[key_col].to_numpy()}
+        district_col = columns['district']
+        if level != 'district' and district_col:
+            flags['district'] = rows[district_col].to_numpy()
+        date_col = columns['date']
+        flags['date'] = rows[date_col].to_numpy() if date_col else np.full(len(rows), 'N/A', dtype=object)
+        flags['enrolments'] = rows[enrolment_col].to_numpy()
+        flags['z_score'] = z_score[hits]
+        return pd.DataFrame(flags)
+
+    def window_anomaly_frame(self, df=None, threshold=2.5, level='district', window=30, lookback=90, seasonal=False):
+        """
+        Windowed detector: daily enrolment totals per group over the last `window` days
+        (ending at the latest date in the data), each scored against a rolling
+        baseline of that group's previous `lookback` days. With seasonal=True the
+        baseline only uses the same weekday. Rows older than window + lookback days
+        are filtered out before any grouping.
+        Columns: <level>, date, enrolments, baseline, z_score (most severe first).
+        """
+        target_df = df if df is not None else self.master_df
+        if target_df is None or level not in ANOMALY_LEVELS:
+            return None
+
+        columns = self.columns if target_df is self.master_df else resolve_columns(target_df)
+        key_col = columns[level]
+        enrolment_col = columns['enrolments']
+        date_col = columns['date']
+        if not key_col or not enrolment_col or not date_col:
+            return None
+
+        dates = target_df[date_col]
+        end = dates.max()
+        if pd.isna(end):
+            return None
+        end = end.normalize()
+        window_start = end - pd.Timedelta(days=window - 1)
+        recent = dates >= window_start - pd.Timedelta(days=lookback)
+
+        # Daily totals per group, for the window plus its baseline only
+        counts = pd.to_numeric(target_df.loc[recent, enrolment_col], errors='coerce')
+        daily = pd.DataFrame({
+            'key': target_df.loc[recent, key_col],
+            'day': dates[recent].dt.normalize(),
+            'value': counts.to_numpy(dtype='float64', na_value=np.nan),
+        }).groupby(['key', 'day'], observed=True, sort=True)['value'].sum().reset_index()
+
+        group_keys = ['key']
+        if seasonal:
+            daily['weekday'] = daily['day'].dt.dayofweek
+            group_keys.append('weekday')
+
+        # Time-based rolling per group; closed='left' keeps the scored day out of its own baseline
+        daily = daily.sort_values(group_keys + ['day'], kind='stable').reset_index(drop=True)
+        rolling = daily.set_index('day').groupby(group_keys, observed=True, sort=False)['value'] \
+            .rolling(f'{lookback}D', closed='left', min_periods=WINDOW_MIN_PERIODS)
+        # Groups come back in order of first appearance, i.e. the sorted order of daily
+        baseline = rolling.mean().to_numpy()
+        std = rolling.std().to_numpy()
+        std = np.where(std == 0, 1.0, std)
+        z_score = (daily['value'].to_numpy() - baseline) / std
+
+        in_window = (daily['day'] >= window_start).to_numpy()
+        hits = np.flatnonzero(in_window & (z_score > threshold))
+        hits = hits[np.argsort(-z_score[hits], kind='stable')]
+
+        rows = daily.iloc[hits]
+        return pd.DataFrame({
+            level: rows['key'].to_numpy(),
+            'date': rows['day'].to_numpy(),
+            'enrolments': rows['value'].round().astype('int64').to_numpy(),
+            'baseline': np.round(baseline[hits], 2),
+            'z_score': z_score[hits],
+        })
+
+    def detect_anomalies(self, df=None, threshold=2.5, level='district', limit=None, offset=0):
+        """
+        Identifies districts/centers with enrolment spikes > 2.5 Standard Deviations from the mean.
+        Useful for detecting Fraud or Data Entry Errors.
+        Returns the flags (most severe first) as a list of dicts; limit/offset select a page.
+        """
+        flags = self.anomaly_frame(df, threshold=threshold, level=level)
+        if flags is None:
+            return []
+        stop = None if limit is None else offset + limit
+        return anomaly_records(flags.iloc[offset:stop])
 
     def analyze_societal_trends(self):
         """
@@ -93,25 +300,25 @@ class UidaiAnalytics:
         }
 
         # 1. Migration Hubs (High Volume of Address Updates in 18+)
+        # Age-group slices share the master frame's columns
+        columns = self.columns
         df_18 = self.datasets.get('18+')
         if df_18 is not None:
-            cols = {c.lower(): c for c in df_18.columns}
-            district_col = next((v for k, v in cols.items() if k == 'district'), None)
-            update_col = next((v for k, v in cols.items() if k in ['updates', 'total_updates']), None)
+            district_col = columns['district']
+            update_col = columns['updates']
             
             if district_col and update_col:
-                top_migration = df_18.groupby(district_col)[update_col].sum().nlargest(5).reset_index()
+                top_migration = df_18.groupby(district_col, observed=True)[update_col].sum().nlargest(5).reset_index()
                 insights['migration_hubs'] = top_migration.to_dict(orient='records')
 
         # 2. Saturation Gaps (Low Enrolment in 0-5)
         df_05 = self.datasets.get('0-5')
         if df_05 is not None:
-            cols = {c.lower(): c for c in df_05.columns}
-            district_col = next((v for k, v in cols.items() if k == 'district'), None)
-            enrolment_col = next((v for k, v in cols.items() if k in ['enrolments', 'total_enrolments']), None)
+            district_col = columns['district']
+            enrolment_col = columns['enrolments']
 
             if district_col and enrolment_col:
-                low_saturation = df_05.groupby(district_col)[enrolment_col].sum().nsmallest(5).reset_index()
+                low_saturation = df_05.groupby(district_col, observed=True)[enrolment_col].sum().nsmallest(5).reset_index()
                 insights['saturation_gaps'] = low_saturation.to_dict(orient='records')
 
         return insights
@@ -120,8 +327,11 @@ class UidaiAnalytics:
         """
         Aggregates enrolments by State and Time Period.
         period: 'daily', 'monthly', 'yearly'
+        All four metrics come from a single grouped aggregation over (state, time bucket)
+        on a narrow projection of the master frame; the full frame is never copied.
         """
-        if self.master_df is None: return {}
+        df = self.master_df
+        if df is None: return []
 
         # 1. Enrich with State Data (Mock Mapping for MVP - In real life, use a GIS CSV)
         state_map = {
@@ -133,96 +343,56 @@ class UidaiAnalytics:
             'Jaipur': 'Rajasthan'
         }
         
-        # Apply Mapping (Default to 'Other' if unknown)
-        df = self.master_df.copy()
-        
-        # NORMALIZE STATES TO OFFICIAL 29
-        df = get_official_states_only(df)
-        
-        cols = {c.lower(): c for c in df.columns}
-        district_col = next((v for k, v in cols.items() if k == 'district'), None)
-        state_col = next((v for k, v in cols.items() if k == 'state'), None)
-        date_col = next((v for k, v in cols.items() if k == 'date'), None)
-        enrol_col = next((v for k, v in cols.items() if k in ['enrolments', 'total_enrolments']), None)
-        update_col = next((v for k, v in cols.items() if k in ['updates', 'total_updates']), None)
+        columns = self.columns
+        district_col = columns['district']
+        state_col = columns['state']
+        date_col = columns['date']
+        enrol_col = columns['enrolments']
+        update_col = columns['updates']
         
         # Demographic & Biometric columns
-        demo_cols = [v for k, v in cols.items() if k in ['demo_age_5_17', 'demo_age_17_', 'total_demographic']]
-        bio_cols = [v for k, v in cols.items() if k in ['bio_age_5_17', 'bio_age_17_', 'total_biometric']]
+        demo_cols = columns['demo']
+        bio_cols = columns['bio']
 
-        if not state_col and district_col:
-            df['state'] = df[district_col].map(state_map).fillna('Other')
-            state_col = 'state'
-        elif not state_col:
+        if database.CANONICAL_STATES_ON_INGEST and 'state_canonical' in df.columns:
+            # Official names were stored at ingest (UTs / invalid entries are NaN and dropped);
+            # rows loaded while that was switched off are normalized here
+            states = fill_canonical_states(df['state_canonical'], df[state_col]) if state_col else df['state_canonical']
+        elif state_col:
+            # NORMALIZE STATES TO OFFICIAL 29 (UTs / invalid entries become NaN and are dropped)
+            states = normalize_state_series(df[state_col])
+        elif district_col:
+            # Apply Mapping (Default to 'Other' if unknown)
+            states = df[district_col].map(state_map).fillna('Other')
+        else:
             return []
 
         # 2. Time Grouping
         if not date_col or date_col not in df.columns: return []
-        
-        if period == 'daily':
-            df['TimeKey'] = df[date_col].dt.date.astype(str)
-        elif period == 'monthly':
-            df['TimeKey'] = df[date_col].dt.to_period('M').astype(str)
-        elif period == 'yearly':
-            df['TimeKey'] = df[date_col].dt.to_period('Y').astype(str)
-            
-        # 3. Aggregate
-        if enrol_col:
-            pivot_enrol = df.pivot_table(index=state_col, columns='TimeKey', values=enrol_col, aggfunc='sum', fill_value=0)
-            result_enrol = pivot_enrol.to_dict(orient='index')
-        else:
-            result_enrol = {}
+        # Group on periods and turn only the aggregated labels into strings
+        freq = {'daily': 'D', 'monthly': 'M', 'yearly': 'Y'}.get(period, 'M')
+        time_key = df[date_col].dt.to_period(freq)
 
+        # 3. Aggregate: one groupby computes every metric
+        metrics = {}
+        if enrol_col:
+            metrics['enrolments'] = df[enrol_col]
         if update_col:
-            pivot_update = df.pivot_table(index=state_col, columns='TimeKey', values=update_col, aggfunc='sum', fill_value=0)
-            result_update = pivot_update.to_dict(orient='index')
-        else:
-            result_update = {}
-
-        # Aggregate Demographics
+            metrics['updates'] = df[update_col]
         if demo_cols:
-            df['temp_demo'] = df[demo_cols].sum(axis=1)
-            pivot_demo = df.pivot_table(index=state_col, columns='TimeKey', values='temp_demo', aggfunc='sum', fill_value=0)
-            result_demo = pivot_demo.to_dict(orient='index')
-        else:
-            result_demo = {}
-
-        # Aggregate Biometrics
+            metrics['demographic'] = _row_total(df, demo_cols)
         if bio_cols:
-            df['temp_bio'] = df[bio_cols].sum(axis=1)
-            pivot_bio = df.pivot_table(index=state_col, columns='TimeKey', values='temp_bio', aggfunc='sum', fill_value=0)
-            result_bio = pivot_bio.to_dict(orient='index')
-        else:
-            result_bio = {}
-        
-        # Format for Frontend (Array of Objects)
-        formatted_data = []
-        all_states = set(result_enrol.keys()) | set(result_update.keys())
-        
-        for state in all_states:
-            timeline_e = result_enrol.get(state, {})
-            timeline_u = result_update.get(state, {})
-            timeline_d = result_demo.get(state, {})
-            timeline_b = result_bio.get(state, {})
-            
-            total_e = sum(timeline_e.values())
-            total_u = sum(timeline_u.values())
-            total_d = sum(timeline_d.values())
-            total_b = sum(timeline_b.values())
-            
-            formatted_data.append({
-                "state": state,
-                "total_enrolments": total_e,
-                "total_updates": total_u,
-                "total_demographic": total_d,
-                "total_biometric": total_b,
-                "timeline_enrolments": timeline_e,
-                "timeline_updates": timeline_u,
-                "timeline_demographic": timeline_d,
-                "timeline_biometric": timeline_b
-            })
-            
-        return formatted_data
+            metrics['biometric'] = _row_total(df, bio_cols)
+
+        # States come from the enrolment / update pivots, as before
+        if not enrol_col and not update_col:
+            return []
+
+        narrow = pd.DataFrame({'state': states, 'TimeKey': time_key, **metrics})
+        grouped = narrow.groupby(['state', 'TimeKey'], observed=True, sort=True).sum()
+        grouped.index = grouped.index.set_levels(grouped.index.levels[1].astype(str), level='TimeKey')
+
+        return format_state_trends(grouped)
 
 # Quick Test
 if __name__ == "__main__":
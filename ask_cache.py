@@ -0,0 +1,49 @@
+"""
+Two-level cache for the /api/ask text-to-code path.
+    code:    normalized question + schema fingerprint + model -> generated code
+    results: generated code + data key                         -> JSON-ready result
+A repeated question skips the LLM round trip when the columns are unchanged, and
+skips execution too when the data is unchanged. The data key must identify the
+data durably (e.g. the id watermark and row count), not a per-process counter,
+since both levels can be persisted in ASK_CACHE_DIR.
+"""
+import hashlib
+import json
+import os
+import re
+from result_cache import ResultCache
+
+ASK_CODE_CACHE_SIZE = int(os.environ.get('ASK_CODE_CACHE_SIZE', 512))
+ASK_CODE_CACHE_TTL = int(os.environ.get('ASK_CODE_CACHE_TTL', 7 * 24 * 3600))
+ASK_RESULT_CACHE_SIZE = int(os.environ.get('ASK_RESULT_CACHE_SIZE', 128))
+ASK_RESULT_CACHE_TTL = int(os.environ.get('ASK_RESULT_CACHE_TTL', 3600))
+# Directory for the cache entry files (one JSON file per entry); unset keeps both levels in memory only
+ASK_CACHE_DIR = os.environ.get('ASK_CACHE_DIR')
+
+def normalize_question(question):
+    """Casefold, collapse whitespace and drop trailing punctuation: 'Top states?' == 'top  states'."""
+    return re.sub(r'\s+', ' ', question or '').strip().casefold().rstrip('?.! ')
+
+def schema_fingerprint(df):
+    """Hash of the column names and dtypes the generated code was written against."""
+    schema = [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+    return hashlib.sha256(json.dumps(schema).encode()).hexdigest()
+
+def _digest(*parts):
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+def code_key(question, schema, model):
+    return _digest('code', normalize_question(question), schema, model)
+
+def result_key(code, data_key):
+    return _digest('result', code, str(data_key))
+
+class AskCache:
+    def __init__(self, cache_dir=ASK_CACHE_DIR):
+        def directory(name):
+            return os.path.join(cache_dir, name) if cache_dir else None
+        self.code = ResultCache(ASK_CODE_CACHE_SIZE, ttl=ASK_CODE_CACHE_TTL, directory=directory('ask_code'))
+        self.results = ResultCache(ASK_RESULT_CACHE_SIZE, ttl=ASK_RESULT_CACHE_TTL, directory=directory('ask_results'))
+
+    def stats(self):
+        return {"code": self.code.stats(), "results": self.results.stats()}
@@ -0,0 +1,68 @@
+"""
+Precomputed schema context for /api/ask prompts.
+summarize() describes a frame once: column names, dtypes, the value sets of
+low-cardinality text columns and a few sample rows. SchemaContext keeps that
+summary and the rendered system prompt for the current data version, so a
+question only costs a string concatenation instead of re-scanning the frame.
+"""
+import os
+import threading
+from collections import namedtuple
+import pandas as pd
+from ask_cache import schema_fingerprint
+
+# Text columns with at most this many distinct values list them in the prompt
+ASK_CATEGORY_LIMIT = int(os.environ.get('ASK_CATEGORY_LIMIT', 40))
+ASK_SAMPLE_ROWS = int(os.environ.get('ASK_SAMPLE_ROWS', 3))
+
+SchemaSummary = namedtuple('SchemaSummary', ['columns', 'dtypes', 'categories', 'sample', 'fingerprint'])
+
+def _category_values(series, limit):
+    """Sorted observed values of a text or categorical column, or None if there are too many."""
+    dtype = series.dtype
+    if not (isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(dtype) or pd.api.types.is_object_dtype(dtype)):
+        return None
+    if series.nunique(dropna=True) > limit:
+        return None
+    return sorted(map(str, series.dropna().unique()))
+
+def summarize(df, sample_rows=ASK_SAMPLE_ROWS, category_limit=ASK_CATEGORY_LIMIT):
+    """SchemaSummary of df (one pass over the text columns)."""
+    categories = {}
+    for col in df.columns:
+        values = _category_values(df[col], category_limit)
+        if values:
+            categories[str(col)] = values
+    return SchemaSummary(
+        columns=[str(c) for c in df.columns],
+        dtypes={str(c): str(t) for c, t in df.dtypes.items()},
+        categories=categories,
+        sample=df.head(sample_rows).to_markdown(),
+        fingerprint=schema_fingerprint(df)
+    )
+
+def render(template, summary):
+    """Fill a prompt template's {columns}, {dtypes}, {categories} and {sample} fields."""
+    dtypes = ', '.join(f"{c}: {t}" for c, t in summary.dtypes.items())
+    categories = '\n'.join(f"    - {c}: {', '.join(v)}" for c, v in summary.categories.items()) or '    (none)'
+    return template.format(columns=summary.columns, dtypes=dtypes, categories=categories, sample=summary.sample)
+
+class SchemaContext:
+    """Summary and system prompt of the latest data version, rebuilt only when the version changes."""
+
+    def __init__(self, template):
+        self.template = template
+        self._version = None
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def get(self, df, version):
+        """(SchemaSummary, system prompt) for df at this data version."""
+        with self._lock:
+            if self._entry is not None and self._version == version:
+                return self._entry
+        summary = summarize(df)
+        entry = (summary, render(self.template, summary))
+        with self._lock:
+            self._version, self._entry = version, entry
+        return entry
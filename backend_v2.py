@@ -2,20 +2,31 @@ import pandas as pd
 import glob
 import os
 import json
+import threading
 from dotenv import load_dotenv
 
 load_dotenv() # Load variables from .env file (if it exists)
-import io
-import sys
 import random
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-import google.generativeai as genai
 import requests
-from analytics_pipeline import UidaiAnalytics  # New Analytics Engine
+from analytics_pipeline import UidaiAnalytics, ANOMALY_LEVELS, anomaly_records  # New Analytics Engine
 
 import database # New DB Module
+import ingest # Chunked streaming ingestion
+import ingest_jobs # Background upload jobs
+import enrichment # Vectorized mock fields for sparse uploads
+import sandbox # Pre-forked, resource-limited workers for /api/ask code
+import ask_cache # Question -> code -> result caches for /api/ask
+import ask_context # Per-version schema summary and system prompt
+import llm_clients # Long-lived LLM clients, one per API key
+import responses # Paging, projection and streamed JSON for list responses
+import query_planner # Common /api/ask questions compiled to pandas without the LLM
+from data_store import DataStore # Incremental in-memory copy of aadhaar_data
+from result_cache import ResultCache # LRU cache for analytics results
+import running_stats # Ingest-time anomaly statistics
+from sql_analytics import SqlAnalytics # Aggregations pushed down to the database
 
 # App Config
 app = Flask(__name__)
@@ -25,8 +36,40 @@ DATA_FOLDER = 'data_uploads'
 ALLOWED_EXTENSIONS = {'csv', 'xlsx'}
 
 # Global State
-GLOBAL_DF = None
-ANALYTICS_ENGINE = UidaiAnalytics(DATA_FOLDER) # Initialize Pipeline
+GLOBAL_DF = None # Always the DataFrame of the latest DATA_STORE snapshot
+DATA_STORE = DataStore()
+# pandas: aggregate the in-memory DATA_STORE frame; sql: aggregate in the database,
+# so analytics routes never load aadhaar_data into the worker
+ANALYTICS_BACKEND = os.environ.get('ANALYTICS_BACKEND', 'pandas').lower()
+ANALYTICS_ENGINE = SqlAnalytics(DATA_FOLDER) if ANALYTICS_BACKEND == 'sql' else UidaiAnalytics(DATA_FOLDER) # Initialize Pipeline
+INGEST_QUEUE = ingest_jobs.JobQueue()
+ASK_SANDBOX = sandbox.SandboxPool()
+ASK_CACHE = ask_cache.AskCache()
+LLM_CLIENTS = llm_clients.LLMClients('gemini', 'gemini-1.5-flash')
+QUERY_PLANNER = query_planner.QueryPlanner(stored_states=database.CANONICAL_STATES_ON_INGEST)
+ASK_PROMPT = ask_context.SchemaContext("""
+    You are a data assistant. I have a Pandas DataFrame named `df`.
+    Columns: {columns}
+    Column types: {dtypes}
+    Known values of text columns:
+{categories}
+    Sample Data:
+    {sample}
+    
+    When I ask a question, return ONLY valid Python Pandas code to solve it.
+    - Assume `df` is already loaded.
+    - Store the final result in a variable called `result`.
+    - `result` should be a Dictionary if it's a single row or aggregation (e.g. {{'count': 50}}).
+    - `result` should be a List of Dictionaries if it's a dataframe slice (e.g. df.head().to_dict(orient='records')).
+    - Int32 count columns are nullable (missing values are pd.NA): use pandas methods such as sum(), mean() or fillna(0) on them, not NumPy functions.
+    - Do NOT return markdown formatting (like ```python). Just the plain code.
+    - Do NOT include print statements.
+    """)
+ANALYTICS_LOCK = threading.Lock() # Held while ANALYTICS_ENGINE prepares and computes one version
+ANALYTICS_CACHE = ResultCache(maxsize=int(os.environ.get('ANALYTICS_CACHE_SIZE', 128)))
+# Page size of /api/analytics/anomalies (default and upper bound)
+ANOMALY_DEFAULT_LIMIT = int(os.environ.get('ANOMALY_DEFAULT_LIMIT', 1000))
+ANOMALY_MAX_LIMIT = int(os.environ.get('ANOMALY_MAX_LIMIT', 10000))
 CONFIG_PATH = 'config.json'
 
 def load_config():
@@ -73,46 +116,90 @@ database.init_db()
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def enrich_data(df):
-    """Enrich data with mock UIDAI fields if missing"""
-    # Ensure columns exist before processing
-    cols = [c.lower() for c in df.columns]
-    
-    if 'status' not in cols:
-        statuses = ['Generated', 'Rejected', 'In Process', 'Hold']
-        weights = [0.7, 0.1, 0.15, 0.05]
-        df['status'] = [random.choices(statuses, weights)[0] for _ in range(len(df))]
-    
-    if 'gender' not in cols:
-        df['gender'] = [random.choice(['Male', 'Female', 'Transgender']) for _ in range(len(df))]
-        
-    if 'eid' not in cols:
-        df['eid'] = [f"{random.randint(1000,9999)}/{random.randint(10000,99999)}/{random.randint(10000,99999)}" for _ in range(len(df))]
-    
-    if 'total_enrolments' not in cols:
-        df['total_enrolments'] = [random.randint(1, 100) for _ in range(len(df))]
-    
-    if 'total_updates' not in cols:
-        df['total_updates'] = [random.randint(1, 50) for _ in range(len(df))]
-        
-    return df
-
 def load_data_from_db(force=False):
-    """Sync GLOBAL_DF with SQLite Database (Only if explicitly needed)."""
+    """Sync GLOBAL_DF with the Database (Only if explicitly needed).
+    force=True appends rows added since the last sync instead of re-reading the table."""
     global GLOBAL_DF
     if GLOBAL_DF is not None and not force:
         return True
         
-    print(f"Loading GLOBAL_DF from SQLite (force={force})...")
+    print(f"Syncing GLOBAL_DF from Database (force={force})...")
     try:
         database.init_db() # Ensure tables exist
-        GLOBAL_DF = database.get_all_data()
-        print(f"Loaded {len(GLOBAL_DF)} records into memory.")
+        snapshot = DATA_STORE.refresh()
+        GLOBAL_DF = snapshot.df
+        print(f"{len(GLOBAL_DF)} records in memory (data version {snapshot.version}).")
         return True
     except Exception as e:
         print(f"DB Sync Error: {e}")
         return False
 
+def ensure_analytics_data():
+    """Load the in-memory data the analytics engine needs (nothing to load in SQL mode)."""
+    if ANALYTICS_BACKEND == 'sql':
+        return True
+    return load_data_from_db()
+
+def after_ingest():
+    """Runs on the ingestion worker once a file is committed."""
+    # In SQL mode the frame only exists if /api/ask loaded it
+    if ANALYTICS_BACKEND != 'sql' or GLOBAL_DF is not None:
+        load_data_from_db(force=True) # Sync with FORCE
+        DATA_STORE.persist() # Refresh the cold-start snapshot
+        if ASK_SANDBOX.version is not None:
+            # Re-fork the /api/ask workers now rather than on the next question
+            snapshot = DATA_STORE.snapshot()
+            ASK_SANDBOX.prepare(snapshot.df, snapshot.version)
+
+def data_version():
+    """
+    Data version for analytics cache keys: the DataStore snapshot, or in SQL mode the id
+    watermark of the engine SqlAnalytics reads (the replica, if configured).
+    """
+    if ANALYTICS_BACKEND == 'sql':
+        return ('sql', database.get_max_id(bind=ANALYTICS_ENGINE.engine))
+    return DATA_STORE.version
+
+def prepare_analytics(snapshot=None):
+    """Hand a snapshot (default: the current one) to the analytics engine (no-op if that version is already prepared)."""
+    if snapshot is None:
+        snapshot = DATA_STORE.snapshot()
+    ANALYTICS_ENGINE.load_datasets(snapshot.df, version=snapshot.version)
+
+def cursor_version():
+    """Identifies the data behind a paged response, across processes (the DataStore version is per process)."""
+    if ANALYTICS_BACKEND == 'sql':
+        return database.get_max_id(bind=ANALYTICS_ENGINE.engine)
+    if DATA_STORE.df is None:
+        return database.get_max_id(bind=DATA_STORE.engine)
+    return DATA_STORE.snapshot().watermark
+
+def ask_response(body, result, params, version):
+    """/api/ask response; a list-of-records result is paged, projected and streamed like the analytics lists."""
+    if not (isinstance(result, list) and all(isinstance(r, dict) for r in result)):
+        return responses.respond(dict(body, result=result))
+    page = responses.project(responses.paginate(result, params), params.fields)
+    # Without paging parameters the body is the same as an unpaged answer
+    envelope = dict(body, count=len(result)) if params.paged else body
+    return responses.send_list(page, params, total=len(result), version=version, envelope=envelope, key='result')
+
+def cached_analytics(endpoint, params, compute):
+    """
+    Serve an analytics result from ANALYTICS_CACHE, keyed by endpoint, params and data version.
+    The snapshot is taken once, so compute(snapshot) works on exactly the version in the key
+    (snapshot is None in SQL mode).
+    """
+    snapshot = None if ANALYTICS_BACKEND == 'sql' else DATA_STORE.snapshot()
+    version = data_version() if snapshot is None else snapshot.version
+    key = (endpoint, tuple(sorted(params.items())), version)
+
+    def locked_compute():
+        # The engine holds one prepared frame; another version must not replace it mid-computation
+        with ANALYTICS_LOCK:
+            return compute(snapshot)
+
+    return ANALYTICS_CACHE.get_or_compute(key, locked_compute)
+
 # Function alias for backward compatibility or replacement
 def load_data():
     # We no longer load everything on every status check
@@ -133,6 +220,11 @@ def status():
             "status": "online",
             "records": stats['total_records'],
             "files_loaded": files,
+            "analytics_cache": ANALYTICS_CACHE.stats(),
+            "ingest_queue": INGEST_QUEUE.stats(),
+            "ask_cache": ASK_CACHE.stats(),
+            "llm": LLM_CLIENTS.stats(),
+            "ask_planner": QUERY_PLANNER.stats(),
             "keys_configured": {
                 "gemini": bool(CONFIG.get("gemini_key")),
                 "govt": bool(CONFIG.get("govt_key"))
@@ -157,7 +249,7 @@ def update_config():
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    """Handle CSV/Excel uploads and save to SQLite"""
+    """Save a CSV/Excel upload and queue it for ingestion; returns 202 with the job id"""
     if 'file' not in request.files:
         return jsonify({"error": "No file part"}), 400
     
@@ -167,33 +259,53 @@ def upload_file():
         
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        path = os.path.join(DATA_FOLDER, filename)
-        file.save(path)
-        
-        # Parse and Insert into DB
+        if database.is_file_processed(filename):
+            return jsonify({"error": "File already processed."}), 400
+
+        # Saving over a file a queued or running job still reads would corrupt that import
         try:
-            if filename.endswith('.csv'):
-                df = pd.read_csv(path)
-            else:
-                df = pd.read_excel(path)
-            
-            # Enrich with defaults
-            df = enrich_data(df)
-            
-            # Save to DB
-            success, msg = database.insert_dataframe(df, filename)
-            
-            if success:
-                load_data_from_db(force=True) # Sync with FORCE
-                return jsonify({"message": f"Successfully imported {filename}", "details": msg})
-            else:
-                return jsonify({"error": msg}), 400
-                
+            INGEST_QUEUE.reserve(filename)
+        except ingest_jobs.FileBusy as e:
+            return jsonify({"error": str(e), "job_id": e.job_id}), 409
+
+        # Parse, enrich and insert on an ingestion worker (streamed in bounded chunks)
+        try:
+            path = os.path.join(DATA_FOLDER, filename)
+            file.save(path)
+            chunk_size = request.args.get('chunk_size', type=int)
+            # Seeded per chunk with ENRICH_SEED, so a resumed import draws the same mock data
+            enrich = enrichment.Enricher()
+            job_id = INGEST_QUEUE.submit(path, filename, chunk_size=chunk_size, transform=enrich, on_success=after_ingest)
+        except ingest_jobs.QueueFull as e:
+            INGEST_QUEUE.release(filename)
+            return jsonify({"error": str(e)}), 503
         except Exception as e:
+            INGEST_QUEUE.release(filename)
             return jsonify({"error": f"Processing error: {str(e)}"}), 500
+
+        return jsonify({
+            "message": f"Queued {filename} for import",
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}"
+        }), 202
         
     return jsonify({"error": "Invalid file type. Only CSV/XLSX allowed."}), 400
 
+@app.route('/api/jobs', methods=['GET'])
+def list_ingest_jobs():
+    """Recent ingestion jobs, newest first (?status=queued|running|succeeded|failed|skipped, ?limit=)"""
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    jobs = ingest_jobs.list_jobs(status=request.args.get('status'), limit=limit)
+    return jsonify({"jobs": jobs, "queue": INGEST_QUEUE.stats()})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_ingest_job(job_id):
+    """Status, progress (rows parsed / inserted) and result message of one ingestion job"""
+    job = ingest_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
 @app.route('/api/dashboard/summary', methods=['GET'])
 def get_dashboard_summary():
     """Returns high-level stats for the Dashboard (FAST DB LOOKUP)"""
@@ -262,63 +374,81 @@ def ask_question():
 
     data = request.json
     question = data.get('question')
-    api_key = data.get('api_key') or CONFIG['gemini_key']
-    
-    if not api_key:
-         return jsonify({"error": "Gemini API Key not configured. Go to Admin Settings."}), 400
-
-    # Configure Gemini
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-1.5-flash')
-
-    columns = list(GLOBAL_DF.columns)
-    df_head = GLOBAL_DF.head(3).to_markdown()
-    
-    system_prompt = f"""
-    You are a data assistant. I have a Pandas DataFrame named `df`.
-    Columns: {columns}
-    Sample Data:
-    {df_head}
-    
-    When I ask a question, return ONLY valid Python Pandas code to solve it.
-    - Assume `df` is already loaded.
-    - Store the final result in a variable called `result`.
-    - `result` should be a Dictionary if it's a single row or aggregation (e.g. {{'count': 50}}).
-    - `result` should be a List of Dictionaries if it's a dataframe slice (e.g. df.head().to_dict(orient='records')).
-    - Do NOT return markdown formatting (like ```python). Just the plain code.
-    - Do NOT include print statements.
-    """
 
+    snapshot = DATA_STORE.snapshot()
+    df = snapshot.df
+    # Watermark and row count identify the data across restarts (the version is per process)
+    data_key = (snapshot.watermark, len(df))
+    # Paging, fields and format come in the JSON body alongside the question
     try:
-        response = model.generate_content(system_prompt + "\nQuestion: " + question)
-        generated_code = response.text.strip().replace('```python', '').replace('```', '')
-        
-        print(f"Gemini Code: {generated_code}")
+        params = responses.list_params(data, version=data_key)
+    except responses.ResponseError as param_err:
+        return jsonify({"error": str(param_err)}), param_err.status
 
-        local_vars = {'df': GLOBAL_DF, 'pd': pd}
-        old_stdout = sys.stdout
-        sys.stdout = mystdout = io.StringIO()
-        
+    # Totals, rankings and counts the grammar understands skip the LLM and the sandbox
+    plan = QUERY_PLANNER.plan(question, df, snapshot.version) if query_planner.ASK_PLANNER else None
+    if plan is not None:
         try:
-            exec(generated_code, {}, local_vars)
-        except Exception as exec_err:
-             sys.stdout = old_stdout
-             return jsonify({"error": f"Execution Error: {exec_err}", "code": generated_code}), 500
+            result_key = ask_cache.result_key(plan.code, data_key)
+            result_cached, result = ASK_CACHE.results.get(result_key)
+            if not result_cached:
+                result = query_planner.run(plan, df)
+                ASK_CACHE.results.set(result_key, result)
+            return ask_response({
+                "code": plan.code,
+                "source": "planner",
+                "plan": plan.intent,
+                "cache": {"result": "hit" if result_cached else "miss"}
+            }, result, params, data_key)
+        except responses.ResponseError as param_err:
+            return jsonify({"error": str(param_err)}), param_err.status
+        except Exception as plan_err:
+            print(f"Planned query failed, asking the LLM instead: {plan_err}")
+
+    # Generated code is reused while the columns stay the same, results while the data does
+    summary, system_prompt = ASK_PROMPT.get(df, snapshot.version)
+    code_key = ask_cache.code_key(question, summary.fingerprint, LLM_CLIENTS.model_name)
+    code_cached, generated_code = ASK_CACHE.code.get(code_key)
 
-        sys.stdout = old_stdout
-        result = local_vars.get('result')
-        
-        # Serialization fix
-        if isinstance(result, pd.DataFrame):
-            result = result.to_dict(orient='records')
-        elif isinstance(result, pd.Series):
-            result = result.to_dict()
+    try:
+        if not code_cached:
+            api_key = data.get('api_key') or CONFIG['gemini_key']
+            try:
+                model = LLM_CLIENTS.get(api_key)
+            except llm_clients.MissingKey:
+                 return jsonify({"error": "Gemini API Key not configured. Go to Admin Settings."}), 400
+
+            generated_code = model.generate(system_prompt, question)
             
-        return jsonify({
+            print(f"Gemini Code: {generated_code}")
+
+        result_key = ask_cache.result_key(generated_code, data_key)
+        result_cached, result = ASK_CACHE.results.get(result_key)
+        if not result_cached:
+            # Runs in a sandbox worker forked from this snapshot, under CPU/memory/time limits
+            try:
+                result = ASK_SANDBOX.run(generated_code, df, snapshot.version)
+            except sandbox.PoolBusy as busy_err:
+                return jsonify({"error": str(busy_err), "code": generated_code}), 503
+            except sandbox.SandboxError as exec_err:
+                return jsonify({"error": f"Execution Error: {exec_err}", "code": generated_code}), 500
+            ASK_CACHE.results.set(result_key, result)
+
+        # Only code that ran successfully is worth reusing
+        if not code_cached:
+            ASK_CACHE.code.set(code_key, generated_code)
+            
+        return ask_response({
             "code": generated_code,
-            "result": result
-        })
+            "source": "llm",
+            "cache": {
+                "code": "hit" if code_cached else "miss",
+                "result": "hit" if result_cached else "miss"
+            }
+        }, result, params, data_key)
         
+    except responses.ResponseError as param_err:
+        return jsonify({"error": str(param_err)}), param_err.status
     except Exception as e:
         return jsonify({"error": f"Gemini/Processing Error: {str(e)}"}), 500
 
@@ -327,39 +457,136 @@ def ask_question():
 @app.route('/api/analytics/advanced', methods=['GET'])
 def get_advanced_analytics():
     """Exposes the Societal Trends Engine"""
-    load_data_from_db()
-    ANALYTICS_ENGINE.load_datasets(GLOBAL_DF)
+    ensure_analytics_data()
     
-    trends = ANALYTICS_ENGINE.analyze_societal_trends()
+    def compute(snapshot):
+        prepare_analytics(snapshot)
+        return ANALYTICS_ENGINE.analyze_societal_trends()
+    
+    trends = cached_analytics('advanced', {}, compute)
     return jsonify(trends)
 
 @app.route('/api/analytics/anomalies', methods=['GET'])
 def get_anomalies():
-    """Exposes the Anomaly Detection Engine"""
-    load_data_from_db()
-    ANALYTICS_ENGINE.load_datasets(GLOBAL_DF)
-    
-    anomalies = ANALYTICS_ENGINE.detect_anomalies()
-    return jsonify({
-        "count": len(anomalies),
-        "flags": anomalies
-    })
+    """
+    Exposes the Anomaly Detection Engine.
+    Query params: threshold (z-score, default 2.5), level (state/district/pincode),
+    limit (page size, capped at ANOMALY_MAX_LIMIT), offset or cursor (next_cursor of
+    the previous page), fields (comma-separated), format (records/columns/ndjson),
+    mode: stored (flags kept in the database, re-scored after every load), full
+    (recomputed from the in-memory data), window (daily totals of the last `window`
+    days against a rolling `lookback`-day baseline, same weekday only with seasonal=1)
+    or auto (default: stored whenever it can answer the request).
+    Flags are ordered most severe first, so limit alone gives the top-K.
+    """
+    threshold = request.args.get('threshold', 2.5, type=float)
+    level = request.args.get('level', 'district')
+    mode = request.args.get('mode', 'auto')
+    window = request.args.get('window', 30, type=int)
+    lookback = request.args.get('lookback', 90, type=int)
+    seasonal = request.args.get('seasonal', '0') in ('1', 'true')
+    if level not in ANOMALY_LEVELS:
+        return jsonify({"error": f"level must be one of {', '.join(ANOMALY_LEVELS)}"}), 400
+    if mode not in ('auto', 'stored', 'full', 'window'):
+        return jsonify({"error": "mode must be one of auto, stored, full, window"}), 400
+    if window < 1 or lookback < 1:
+        return jsonify({"error": "window and lookback must be positive numbers of days"}), 400
+    version = cursor_version()
+    try:
+        params = responses.list_params(
+            request.args, version=version, default_limit=ANOMALY_DEFAULT_LIMIT,
+            max_limit=ANOMALY_MAX_LIMIT, formats=('records', 'columns', 'ndjson')
+        )
+    except responses.ResponseError as param_err:
+        return jsonify({"error": str(param_err)}), param_err.status
+    limit, offset = params.limit, params.offset
+
+    # Stored flags only cover district level at or above the ingest threshold
+    storable = level == 'district' and threshold >= running_stats.ANOMALY_THRESHOLD
+    if ANALYTICS_BACKEND == 'sql' and mode in ('full', 'window'):
+        return jsonify({"error": f"mode={mode} needs the in-memory data; ANALYTICS_BACKEND=sql serves stored flags only"}), 400
+    if ANALYTICS_BACKEND == 'sql' and not storable:
+        return jsonify({"error": f"ANALYTICS_BACKEND=sql serves stored flags: district level with threshold >= {running_stats.ANOMALY_THRESHOLD}"}), 400
+    if mode == 'stored' and not storable:
+        return jsonify({"error": f"stored flags are district level with threshold >= {running_stats.ANOMALY_THRESHOLD}"}), 400
+    if mode == 'stored' or ANALYTICS_BACKEND == 'sql' or (mode == 'auto' and storable and database.has_anomaly_stats()):
+        count, page = database.get_anomaly_flags(threshold=threshold, limit=limit, offset=offset)
+        mode = 'stored'
+    elif mode == 'window':
+        load_data_from_db()
+        window_params = {'threshold': threshold, 'level': level, 'window': window, 'lookback': lookback, 'seasonal': seasonal}
+
+        def compute(snapshot):
+            prepare_analytics(snapshot)
+            return ANALYTICS_ENGINE.window_anomaly_frame(**window_params)
+
+        flags = cached_analytics('anomalies_window', window_params, compute)
+        if flags is None:
+            flags = pd.DataFrame(columns=[level, 'date', 'enrolments', 'baseline', 'z_score'])
+        count, page = len(flags), flags.iloc[offset:offset + limit]
+    else:
+        load_data_from_db()
+
+        def compute(snapshot):
+            prepare_analytics(snapshot)
+            return ANALYTICS_ENGINE.anomaly_frame(threshold=threshold, level=level)
+
+        # The full flag frame is cached per (threshold, level); pages are sliced from it
+        flags = cached_analytics('anomalies', {'threshold': threshold, 'level': level}, compute)
+        if flags is None:
+            flags = pd.DataFrame(columns=[level, 'date', 'enrolments', 'z_score'])
+        count, page = len(flags), flags.iloc[offset:offset + limit]
+        mode = 'full'
+
+    response = {
+        "count": count,
+        "returned": len(page),
+        "offset": offset,
+        "limit": limit,
+        "level": level,
+        "threshold": threshold,
+        "mode": mode
+    }
+    if mode == 'window':
+        response.update({"window": window, "lookback": lookback, "seasonal": seasonal})
+    try:
+        flags = responses.project(anomaly_records(page, columnar=params.format == 'columns'), params.fields)
+    except responses.ResponseError as param_err:
+        return jsonify({"error": str(param_err)}), param_err.status
+    return responses.send_list(flags, params, total=count, version=version, envelope=response, key='flags')
 
 @app.route('/api/analytics/states', methods=['GET'])
 def get_state_metrics():
-    """Returns State-wise enrolment trends aggregated by Day/Month/Year"""
+    """
+    Returns State-wise enrolment trends aggregated by Day/Month/Year.
+    Also takes limit, offset or cursor, fields (e.g. state,total_enrolments to drop
+    the timelines) and format (json/ndjson); the total is in X-Total-Count.
+    """
     period = request.args.get('period', 'monthly') # daily, monthly, yearly
-    load_data_from_db()
-    ANALYTICS_ENGINE.load_datasets(GLOBAL_DF)
+    ensure_analytics_data()
+    version = cursor_version()
+    try:
+        params = responses.list_params(request.args, version=version)
+    except responses.ResponseError as param_err:
+        return jsonify({"error": str(param_err)}), param_err.status
     
-    data = ANALYTICS_ENGINE.get_state_trends(period)
-    return jsonify(data)
+    def compute(snapshot):
+        prepare_analytics(snapshot)
+        return ANALYTICS_ENGINE.get_state_trends(period)
+    
+    data = cached_analytics('states', {'period': period}, compute)
+    try:
+        page = responses.project(responses.paginate(data, params), params.fields)
+    except responses.ResponseError as param_err:
+        return jsonify({"error": str(param_err)}), param_err.status
+    return responses.send_list(page, params, total=len(data), version=version)
 
 # --- Main Execution ---
 
 if __name__ == '__main__':
     # Initial Load
     load_data()
+    ingest_jobs.fail_interrupted_jobs() # Single process: nothing else is running jobs
     print("-------------------------------------------------------")
     print(" ANALYTICS BACKEND V4 (FIXED) STARTED")
     print("-------------------------------------------------------")
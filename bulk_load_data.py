@@ -1,33 +1,164 @@
 import os
+import time
 import glob
+import argparse
+import contextlib
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import database
+import ingest
+import snapshot_cache
 
-def bulk_load():
+DATA_FOLDER = 'data_uploads'
+
+def fill_missing_totals(df):
+    """Basic enrichment if columns are missing"""
+    cols = [c.lower() for c in df.columns]
+    if 'total_enrolments' not in cols and 'enrolments' not in cols:
+         df['total_enrolments'] = 0
+    if 'total_updates' not in cols and 'updates' not in cols:
+         df['total_updates'] = 0
+    return df
+
+def find_data_files(data_folder=DATA_FOLDER):
+    return glob.glob(os.path.join(data_folder, "*.csv")) + glob.glob(os.path.join(data_folder, "*.xlsx"))
+
+def bulk_load(streaming=True, chunk_size=None):
     database.init_db()
-    data_folder = 'data_uploads'
-    files = glob.glob(os.path.join(data_folder, "*.csv")) + glob.glob(os.path.join(data_folder, "*.xlsx"))
-    
+    files = find_data_files()
+
     for f in files:
         filename = os.path.basename(f)
         print(f"Loading {filename}...")
         try:
-            if filename.endswith('.csv'):
-                df = pd.read_csv(f)
+            if streaming:
+                # Read, normalize and insert in bounded chunks
+                success, msg = ingest.stream_file(f, filename, chunk_size=chunk_size, transform=fill_missing_totals)
             else:
-                df = pd.read_excel(f)
-            
-            # Basic enrichment if columns are missing
-            cols = [c.lower() for c in df.columns]
-            if 'total_enrolments' not in cols and 'enrolments' not in cols:
-                 df['total_enrolments'] = 0
-            if 'total_updates' not in cols and 'updates' not in cols:
-                 df['total_updates'] = 0
-            
-            success, msg = database.insert_dataframe(df, filename)
+                digest = ingest.file_digest(f)
+                ledger = database.get_ledger(digest)
+                if ledger is not None and ledger['status'] == 'complete':
+                    print(f"Result: False, Identical content already loaded as {ledger['filename']}.")
+                    continue
+
+                if filename.endswith('.csv'):
+                    df = pd.read_csv(f)
+                else:
+                    df = pd.read_excel(f)
+
+                df = fill_missing_totals(df)
+                success, msg = database.insert_dataframe(df, filename, digest=digest)
             print(f"Result: {success}, {msg}")
         except Exception as e:
             print(f"Error loading {filename}: {e}")
 
+# --- Parallel Mode ---
+
+def _parse_file(path):
+    """Runs in a worker process: parse and normalize one file (CPU-bound for Excel)."""
+    started_at = time.time()
+    if path.endswith('.csv'):
+        df = pd.read_csv(path)
+    else:
+        df = pd.read_excel(path)
+    df = database.normalize_dataframe(fill_missing_totals(df))
+    return df, started_at
+
+def _write_file(df, filename, started_at, digest):
+    """Runs on a writer thread: insert a parsed file and record its outcome."""
+    success, msg = database.insert_dataframe(df, filename, normalize=False, started_at=started_at, digest=digest)
+    return {
+        "file": filename,
+        "status": "loaded" if success else "failed",
+        "rows": len(df) if success else 0,
+        "seconds": time.time() - started_at,
+        "message": msg
+    }
+
+def bulk_load_parallel(workers=None, writers=None):
+    """
+    Parse files in a process pool and insert them from a pool of writer threads.
+    Each file's outcome (rows, duration, error) is recorded in uploaded_files;
+    a failing file does not stop the others.
+    """
+    database.init_db()
+    files = find_data_files()
+
+    # SQLite allows a single writer at a time; server databases can take several
+    if writers is None:
+        writers = 1 if database.engine.dialect.name == 'sqlite' else min(4, max(1, len(files)))
+
+    results = []
+    pending = []
+    digests = {}
+    for f in files:
+        filename = os.path.basename(f)
+        if database.is_file_processed(filename):
+            results.append({"file": filename, "status": "skipped", "rows": 0, "seconds": 0.0, "message": "File already processed."})
+            continue
+
+        digests[f] = ingest.file_digest(f)
+        ledger = database.get_ledger(digests[f])
+        if ledger is not None and ledger['status'] == 'complete':
+            results.append({"file": filename, "status": "skipped", "rows": 0, "seconds": 0.0,
+                            "message": f"Identical content already loaded as {ledger['filename']}."})
+        elif ledger is not None and database.get_committed_chunks(digests[f]):
+            # Interrupted streaming load: finish it chunk by chunk instead of inserting the whole file again
+            started_at = time.time()
+            success, msg = ingest.stream_file(f, filename, transform=fill_missing_totals)
+            rows = database.get_ledger(digests[f])['rows'] if success else 0
+            results.append({"file": filename, "status": "loaded" if success else "failed", "rows": rows,
+                            "seconds": time.time() - started_at, "message": msg})
+        elif digests[f] in (digests[p] for p in pending):
+            twin = os.path.basename(next(p for p in pending if digests[p] == digests[f]))
+            results.append({"file": filename, "status": "skipped", "rows": 0, "seconds": 0.0,
+                            "message": f"Identical content to {twin}."})
+        else:
+            pending.append(f)
+
+    print(f"Loading {len(pending)} files with {workers or os.cpu_count()} parser processes and {writers} writer(s)...")
+    started = time.time()
+
+    with ProcessPoolExecutor(max_workers=workers) as parsers, ThreadPoolExecutor(max_workers=writers) as writer_pool:
+        parse_jobs = {parsers.submit(_parse_file, f): f for f in pending}
+        write_jobs = []
+
+        for job in as_completed(parse_jobs):
+            filename = os.path.basename(parse_jobs[job])
+            try:
+                df, started_at = job.result()
+            except Exception as e:
+                database.record_file_failure(filename, e)
+                results.append({"file": filename, "status": "failed", "rows": 0, "seconds": 0.0, "message": str(e)})
+                print(f"  {filename}: parse failed ({e})")
+                continue
+            write_jobs.append(writer_pool.submit(_write_file, df, filename, started_at, digests[parse_jobs[job]]))
+
+        for job in as_completed(write_jobs):
+            result = job.result()
+            results.append(result)
+            print(f"  {result['file']}: {result['status']} {result['rows']} rows in {result['seconds']:.1f}s")
+
+    print(f"Done in {time.time() - started:.1f}s")
+    for r in results:
+        print(f"{r['status']:<8} {r['rows']:>9}  {r['seconds']:7.1f}s  {r['file']}  {r['message']}")
+    return results
+
 if __name__ == "__main__":
-    bulk_load()
+    parser = argparse.ArgumentParser(description="Bulk load data_uploads/*.csv|*.xlsx into the database")
+    parser.add_argument('--parallel', action='store_true', help="parse files in a process pool")
+    parser.add_argument('--workers', type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument('--writers', type=int, default=None, help="writer connections (default: 1 on SQLite)")
+    parser.add_argument('--chunk-size', type=int, default=None, help="rows per chunk in streaming mode")
+    parser.add_argument('--defer-indexes', action='store_true', help="into an empty table: drop the indexes and rebuild them once after the load")
+    args = parser.parse_args()
+
+    database.init_db()
+    with (database.deferred_indexes() if args.defer_indexes else contextlib.nullcontext()):
+        if args.parallel:
+            bulk_load_parallel(workers=args.workers, writers=args.writers)
+        else:
+            bulk_load(chunk_size=args.chunk_size)
+
+    # Let API workers cold-start from the columnar snapshot
+    snapshot_cache.write_from_database()
@@ -0,0 +1,129 @@
+"""
+Dialect-native bulk writers for DataFrames.
+database.insert_dataframe and migrate_db.py both go through bulk_insert(), which
+picks the fastest path for the connected database:
+    - PostgreSQL: COPY FROM STDIN fed by an in-memory CSV buffer
+    - SQLite: a single executemany inside the caller's transaction, with tuned pragmas
+    - anything else: pandas to_sql with multi-row batches
+"""
+import io
+import pandas as pd
+from datetime import datetime
+from sqlalchemy import Integer, String, DateTime, Date
+
+# Rows per COPY statement / executemany batch
+BATCH_SIZE = 100000
+
+# Per-connection pragmas for fast SQLite writes (safe: no 'synchronous=OFF')
+SQLITE_PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+]
+
+# Registry of dialect name -> writer(conn, table, df) -> rows written
+WRITERS = {}
+
+def register_writer(dialect_name):
+    """Decorator to register a bulk writer for a SQLAlchemy dialect name."""
+    def decorator(func):
+        WRITERS[dialect_name] = func
+        return func
+    return decorator
+
+def prepare_frame(df, table, columns=None):
+    """
+    Project df onto the table's columns and coerce values to what the table expects.
+    Integer columns become nullable integers (so 280.0 is written as 280) and
+    float-typed String columns holding whole numbers (e.g. pincode) lose the '.0'.
+    """
+    allowed = set(columns) if columns is not None else set(table.columns.keys())
+    cols = [c for c in df.columns if c in allowed and c in table.columns]
+    out = df[cols].copy()
+
+    for col in cols:
+        col_type = table.columns[col].type
+        series = out[col]
+        if isinstance(col_type, Integer):
+            if not pd.api.types.is_integer_dtype(series):
+                out[col] = pd.to_numeric(series, errors='coerce').round().astype('Int64')
+        elif isinstance(col_type, String) and pd.api.types.is_float_dtype(series):
+            values = series.dropna()
+            if (values == values.round()).all():
+                out[col] = series.astype('Int64')
+        elif isinstance(col_type, DateTime) and pd.api.types.is_datetime64_any_dtype(series):
+            out[col] = series.dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+        elif isinstance(col_type, Date) and pd.api.types.is_datetime64_any_dtype(series):
+            out[col] = series.dt.strftime('%Y-%m-%d')
+
+    # Mirror the column default that to_sql used to skip
+    if 'timestamp' in table.columns and 'timestamp' in allowed and 'timestamp' not in out.columns:
+        out['timestamp'] = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    return out
+
+def _batches(df):
+    for start in range(0, len(df), BATCH_SIZE):
+        yield df.iloc[start:start + BATCH_SIZE]
+
+@register_writer('sqlite')
+def sqlite_writer(conn, table, df):
+    dbapi_conn = conn.connection
+
+    # Pragmas can only be changed outside a transaction; they stick to the pooled connection
+    if not dbapi_conn.info.get('bulk_pragmas') and not dbapi_conn.driver_connection.in_transaction:
+        for pragma in SQLITE_PRAGMAS:
+            conn.exec_driver_sql(pragma)
+        dbapi_conn.info['bulk_pragmas'] = True
+
+    columns = ', '.join(f'"{c}"' for c in df.columns)
+    placeholders = ', '.join('?' for _ in df.columns)
+    statement = f'INSERT INTO "{table.name}" ({columns}) VALUES ({placeholders})'
+
+    cursor = dbapi_conn.cursor()
+    try:
+        for batch in _batches(df):
+            # Column-wise conversion to plain Python values (NaN/NA -> None)
+            values = [batch[c].astype(object).where(batch[c].notna(), None).tolist() for c in batch.columns]
+            cursor.executemany(statement, list(zip(*values)))
+    finally:
+        cursor.close()
+    return len(df)
+
+@register_writer('postgresql')
+def postgres_copy_writer(conn, table, df):
+    columns = ', '.join(f'"{c}"' for c in df.columns)
+    statement = f'COPY "{table.name}" ({columns}) FROM STDIN WITH (FORMAT csv)'
+
+    cursor = conn.connection.cursor()
+    try:
+        for batch in _batches(df):
+            buffer = io.StringIO()
+            batch.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            if hasattr(cursor, 'copy_expert'):
+                # psycopg2
+                cursor.copy_expert(statement, buffer)
+            else:
+                # psycopg 3
+                with cursor.copy(statement) as copy:
+                    copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+    return len(df)
+
+def pandas_writer(conn, table, df):
+    df.to_sql(table.name, conn, if_exists='append', index=False, method='multi', chunksize=1000)
+    return len(df)
+
+def bulk_insert(conn, table, df, columns=None):
+    """
+    Append df to table using the fastest writer for conn's dialect.
+    Runs inside the caller's transaction; the caller commits.
+    columns optionally restricts the write to columns known to exist in the live table.
+    """
+    df = prepare_frame(df, table, columns)
+    if df.empty:
+        return 0
+    writer = WRITERS.get(conn.dialect.name, pandas_writer)
+    return writer(conn, table, df)
@@ -0,0 +1,156 @@
+"""
+Compact in-memory schema for the aadhaar_data DataFrame.
+Applied once when the data is loaded (DataStore) so that every analytics method
+works on the same typed frame:
+    - low-cardinality strings -> category
+    - pincode / age -> small integers
+    - counts -> int32 (nullable Int32 when the column has missing values, so sums stay exact)
+    - date -> datetime64
+Nullable counts hold pd.NA, not NaN: pandas reductions skip it and return exact
+integers (Int32 sums are Int64 scalars), .to_numpy() gives an object array unless a
+dtype and na_value are passed, and every JSON encoder here writes it as null.
+Run `python data_schema.py` for a before/after memory report on the current database.
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = ['state', 'state_canonical', 'district', 'sub_district', 'gender', 'status', 'registrar', 'enrolment_agency']
+COUNT_COLUMNS = ['total_enrolments', 'total_updates', 'demo_age_5_17', 'demo_age_17_', 'bio_age_5_17', 'bio_age_17_']
+# Integer identifiers: column -> (numpy dtype without NaN, nullable dtype with NaN)
+INTEGER_COLUMNS = {
+    'pincode': ('int32', 'Int32'),
+    'age': ('int16', 'Int16'),
+}
+DATE_COLUMN = 'date'
+# Typed copy of `date` kept for the database's range scans; in memory `date` itself is datetime64
+REDUNDANT_COLUMNS = ['date_value']
+
+# Formats seen in the extracts, tried in order before falling back to inference
+DATE_FORMATS = ['%d-%m-%Y', '%Y-%m-%d']
+
+def parse_dates(series):
+    """
+    Parse a date column once per unique value.
+    Dates repeat heavily (one per day per pincode), so this is far cheaper than
+    parsing every row, and handles files that mix dd-mm-yyyy and yyyy-mm-dd.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+
+    codes, uniques = pd.factorize(series)
+    if len(uniques) == 0:
+        # Nothing to parse: every value is missing
+        return pd.Series(pd.NaT, index=series.index, name=series.name, dtype='datetime64[ns]')
+    text = pd.Series(uniques, dtype=object).astype(str)
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+    for fmt in DATE_FORMATS:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(text[missing], format=fmt, errors='coerce')
+    missing = parsed.isna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(text[missing], format='mixed', dayfirst=True, errors='coerce')
+
+    values = parsed.to_numpy()
+    result = np.where(codes >= 0, values[codes.clip(min=0)], np.datetime64('NaT'))
+    return pd.Series(result, index=series.index, name=series.name, dtype='datetime64[ns]')
+
+def _compact_count(series):
+    if series.dtype in ('int32', 'Int32'):
+        return series
+    numeric = pd.to_numeric(series, errors='coerce')
+    if numeric.isna().any():
+        # Not float32: its 24-bit mantissa makes large group sums inexact
+        return numeric.round().astype('Int32')
+    return numeric.astype('int32')
+
+def _compact_integer(series, dense, nullable):
+    if series.dtype in (dense, nullable):
+        return series
+    numeric = pd.to_numeric(series, errors='coerce')
+    if numeric.isna().any():
+        return numeric.round().astype(nullable)
+    return numeric.astype(dense)
+
+def apply_schema(df):
+    """
+    Return df with the compact schema applied. Columns that are already typed are
+    left alone, so calling this on a prepared frame is cheap. The input is not mutated.
+    """
+    if df is None:
+        return df
+    out = df.drop(columns=[c for c in REDUNDANT_COLUMNS if c in df.columns]).copy(deep=False)
+
+    for col in CATEGORICAL_COLUMNS:
+        if col in out.columns and not isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype('category')
+
+    for col, (dense, nullable) in INTEGER_COLUMNS.items():
+        if col in out.columns:
+            out[col] = _compact_integer(out[col], dense, nullable)
+
+    for col in COUNT_COLUMNS:
+        if col in out.columns:
+            out[col] = _compact_count(out[col])
+
+    if DATE_COLUMN in out.columns:
+        out[DATE_COLUMN] = parse_dates(out[DATE_COLUMN])
+
+    return out
+
+def concat_frames(frames):
+    """
+    Concatenate typed frames without losing the schema.
+    Categorical columns get a shared category set first (plain pd.concat would
+    fall back to object), and dtypes that drifted are re-applied afterwards.
+    """
+    frames = [f for f in frames if f is not None and len(f)]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+
+    aligned = [f.copy(deep=False) for f in frames]
+    for col in CATEGORICAL_COLUMNS:
+        if not all(col in f.columns for f in aligned):
+            continue
+        # Union of category values (all-null columns may carry a different categories dtype)
+        values = [
+            pd.Series(f[col].cat.categories if isinstance(f[col].dtype, pd.CategoricalDtype) else f[col].dropna().unique(), dtype=object)
+            for f in aligned
+        ]
+        categories = pd.Index(pd.concat(values, ignore_index=True).unique())
+        for f in aligned:
+            f[col] = pd.Categorical(f[col], categories=categories)
+
+    return apply_schema(pd.concat(aligned, ignore_index=True))
+
+def memory_report(before, after):
+    """Per-column memory (MB) of two frames, plus totals."""
+    rows = []
+    for col in after.columns:
+        rows.append({
+            "column": col,
+            "dtype_before": str(before[col].dtype) if col in before.columns else '',
+            "dtype_after": str(after[col].dtype),
+            "mb_before": before[col].memory_usage(deep=True, index=False) / 1e6 if col in before.columns else 0.0,
+            "mb_after": after[col].memory_usage(deep=True, index=False) / 1e6,
+        })
+    report = pd.DataFrame(rows)
+    totals = {
+        "rows": len(after),
+        "mb_before": round(report['mb_before'].sum(), 2),
+        "mb_after": round(report['mb_after'].sum(), 2),
+    }
+    totals['reduction'] = f"{(1 - totals['mb_after'] / totals['mb_before']) * 100:.1f}%" if totals['mb_before'] else "n/a"
+    return report, totals
+
+if __name__ == "__main__":
+    import database
+    raw = database.get_all_data()
+    typed = apply_schema(raw)
+    report, totals = memory_report(raw, typed)
+    print("--- Memory Report (aadhaar_data in memory) ---")
+    print(report.round(3).to_string(index=False))
+    print(f"\nRows: {totals['rows']}  Before: {totals['mb_before']} MB  After: {totals['mb_after']} MB  Saved: {totals['reduction']}")
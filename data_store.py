@@ -0,0 +1,98 @@
+"""
+Versioned in-memory copy of the aadhaar_data table.
+Instead of re-reading the whole table after every upload, refresh() appends only
+the rows above the last seen id (the watermark) and publishes a new immutable
+snapshot. Readers grab one snapshot and keep a consistent view even while a
+refresh is running.
+Rows, watermark and row count all come from one engine (the primary by default),
+so a lagging read replica can never be mixed in.
+"""
+import threading
+from collections import namedtuple
+import database
+import snapshot_cache
+from data_schema import apply_schema, concat_frames
+
+# df is never mutated after publication (and already has the data_schema dtypes);
+# version increases on every change
+Snapshot = namedtuple('Snapshot', ['df', 'version', 'watermark'])
+
+class DataStore:
+    def __init__(self, engine=None):
+        self.engine = engine or database.engine
+        self._snapshot = Snapshot(None, 0, 0)
+        self._refresh_lock = threading.Lock() # Serializes writers only; readers never block
+
+    def snapshot(self):
+        """Current snapshot (df, version, watermark)."""
+        return self._snapshot
+
+    @property
+    def df(self):
+        return self._snapshot.df
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def _publish(self, df, watermark):
+        # A single attribute assignment is atomic, so readers see the old or the new snapshot
+        self._snapshot = Snapshot(df, self._snapshot.version + 1, watermark)
+        return self._snapshot
+
+    def _load_full(self):
+        # Cold start: memory-map the columnar snapshot when it matches the database
+        cached = snapshot_cache.load_if_fresh()
+        if cached is not None:
+            df, meta = cached
+            df = apply_schema(df) # No-op for snapshots written from a typed frame
+            print(f"Data store: loaded {len(df)} records from snapshot (watermark {meta['watermark']})")
+            return self._publish(df, meta['watermark'])
+
+        df = apply_schema(database.get_all_data(bind=self.engine))
+        watermark = int(df['id'].max()) if 'id' in df.columns and len(df) else 0
+        print(f"Data store: full load of {len(df)} records (watermark {watermark})")
+        return self._publish(df, watermark)
+
+    def refresh(self, full=False):
+        """
+        Bring the snapshot up to date with the database.
+        Appends rows with id > watermark; falls back to a full load on first use,
+        when rows were removed, or when the row count no longer matches the table.
+        """
+        with self._refresh_lock:
+            current = self._snapshot
+            if current.df is None or full:
+                return self._load_full()
+
+            expected = database.get_record_count(bind=self.engine)
+            max_id = database.get_max_id(bind=self.engine)
+            if max_id < current.watermark:
+                # Table was cleared or rebuilt
+                return self._load_full()
+            if max_id == current.watermark and expected == len(current.df):
+                return current
+
+            new_rows = database.get_rows_since(current.watermark, bind=self.engine)
+            if new_rows.empty:
+                df = current.df
+            else:
+                df = concat_frames([current.df, apply_schema(new_rows)])
+
+            # Rows committed out of id order (concurrent writers) would be missed by the watermark
+            if len(df) != expected:
+                return self._load_full()
+
+            watermark = int(new_rows['id'].max()) if not new_rows.empty else max_id
+            print(f"Data store: appended {len(new_rows)} records (watermark {watermark})")
+            return self._publish(df, watermark)
+
+    def persist(self):
+        """Write the current snapshot to the on-disk columnar cache."""
+        current = self._snapshot
+        if current.df is None:
+            return False
+        # Another writer got ahead of us: a snapshot tagged with today's fingerprint would be stale
+        if database.get_max_id(bind=self.engine) != current.watermark:
+            return False
+        return snapshot_cache.write_snapshot(current.df, watermark=current.watermark)
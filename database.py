@@ -1,10 +1,17 @@
 import os
+import sys
+import time
+from contextlib import contextmanager
 import pandas as pd
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, DateTime, text, inspect
+from sqlalchemy import create_engine, event, MetaData, Table, Column, Index, Integer, BigInteger, String, Date, DateTime, Float, text, inspect, select, bindparam, func
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 from dotenv import load_dotenv
+import bulk_writer
+import running_stats
+from state_utils import normalize_state_series
+from data_schema import parse_dates
 
 load_dotenv()
 
@@ -16,8 +23,69 @@ DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///uidai_data.db')
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-# Global Engine
-engine = create_engine(DATABASE_URL)
+# Store the official state name next to the raw one at ingest, so analytics can
+# read it instead of normalizing every query. Set to 0 to normalize at query time only.
+CANONICAL_STATES_ON_INGEST = os.environ.get('CANONICAL_STATES_ON_INGEST', '1') == '1'
+
+# Optional read replica for the dashboard queries (get_stats, get_all_data, ...)
+READ_DATABASE_URL = os.environ.get('READ_DATABASE_URL')
+if READ_DATABASE_URL and READ_DATABASE_URL.startswith("postgres://"):
+    READ_DATABASE_URL = READ_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+# Connection pool (per engine). Pre-ping drops connections the server closed;
+# recycle (seconds, -1 = never) keeps them younger than server / proxy idle timeouts.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+
+# SQLite: WAL lets readers run while an upload holds the write lock, and writers
+# wait up to the busy timeout for each other instead of failing with "database is locked"
+SQLITE_WAL = os.environ.get('SQLITE_WAL', '1') == '1'
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 30000))
+
+def _is_sqlite_memory(url):
+    return url.startswith('sqlite') and (url.rstrip('/').endswith(':memory:') or url.rstrip('/') == 'sqlite:')
+
+def _configure_sqlite(sqlite_engine):
+    """Apply the busy timeout (and WAL for file databases) on every new connection."""
+    use_wal = SQLITE_WAL and not _is_sqlite_memory(str(sqlite_engine.url))
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _on_connect(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            if use_wal:
+                cursor.execute("PRAGMA journal_mode=WAL")
+        finally:
+            cursor.close()
+
+def make_engine(url):
+    """Engine with the configured pool; SQLite connections also get WAL and a busy timeout."""
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if not _is_sqlite_memory(url):
+        # In-memory SQLite uses a single shared connection, which takes no pool sizing
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+    new_engine = create_engine(url, **options)
+    if new_engine.dialect.name == 'sqlite':
+        _configure_sqlite(new_engine)
+    return new_engine
+
+# Global Engines: all writes go to `engine`; read-only dashboard queries use `read_engine`
+engine = make_engine(DATABASE_URL)
+read_engine = make_engine(READ_DATABASE_URL) if READ_DATABASE_URL else engine
+
+def _forget_inherited_connections():
+    # A forked child (sandbox worker, parser process) shares the parent's pooled sockets;
+    # close=False drops them from its pool without sending anything on them
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_inherited_connections)
+
 metadata = MetaData()
 
 # Define Tables (Reflecting schema for migration/creation)
@@ -25,6 +93,7 @@ aadhaar_data = Table(
     'aadhaar_data', metadata,
     Column('id', Integer, primary_key=True),
     Column('state', String),
+    Column('state_canonical', String), # Official state name, NULL for UTs / invalid entries
     Column('district', String),
     Column('sub_district', String),
     Column('pincode', String),
@@ -33,7 +102,8 @@ aadhaar_data = Table(
     Column('enrolment_agency', String),
     Column('registrar', String),
     Column('status', String),
-    Column('date', String),
+    Column('date', String), # As found in the source file (dd-mm-yyyy or yyyy-mm-dd)
+    Column('date_value', Date), # Parsed date, for range scans and partitioning
     Column('total_enrolments', Integer, default=0),
     Column('total_updates', Integer, default=0),
     Column('demo_age_5_17', Integer, default=0),
@@ -43,18 +113,137 @@ aadhaar_data = Table(
     Column('timestamp', DateTime, default=datetime.utcnow)
 )
 
+# Secondary indexes for filtered queries on the raw table (the dashboards read the rollups).
+# On PostgreSQL the (key, date) indexes also carry the counts, so sums are index-only scans.
+COVERED_COUNTS = ['total_enrolments', 'total_updates']
+Index('ix_aadhaar_data_state_date', aadhaar_data.c.state, aadhaar_data.c.date_value, postgresql_include=COVERED_COUNTS)
+Index('ix_aadhaar_data_district_date', aadhaar_data.c.district, aadhaar_data.c.date_value, postgresql_include=COVERED_COUNTS)
+Index('ix_aadhaar_data_date_value', aadhaar_data.c.date_value)
+Index('ix_aadhaar_data_status', aadhaar_data.c.status)
+Index('ix_aadhaar_data_pincode', aadhaar_data.c.pincode)
+
 uploaded_files = Table(
     'uploaded_files', metadata,
     Column('id', Integer, primary_key=True),
     Column('filename', String, unique=True),
     Column('upload_date', DateTime, default=datetime.utcnow),
-    Column('record_count', Integer)
+    Column('record_count', Integer),
+    Column('status', String, default='loaded'), # loaded / failed
+    Column('duration_seconds', Float),
+    Column('error', String)
+)
+
+# --- Ingest ledger ---
+# Content identity of file loads: the sha256 of the whole file and, for every committed
+# chunk, a checksum of its raw rows. A file whose digest is complete is skipped without
+# being parsed; a partial one resumes after its last committed chunk.
+ingest_ledger = Table(
+    'ingest_ledger', metadata,
+    Column('digest', String, primary_key=True),
+    Column('filename', String), # Latest name the content was loaded under
+    Column('size_bytes', BigInteger),
+    Column('chunk_size', Integer), # Resumes must reuse the chunk boundaries
+    Column('status', String, nullable=False, default='loading'), # loading / complete
+    Column('chunks', Integer, nullable=False, default=0),
+    Column('rows', BigInteger, nullable=False, default=0),
+    Column('started_at', DateTime, default=datetime.utcnow),
+    Column('finished_at', DateTime)
 )
 
+ingest_chunks = Table(
+    'ingest_chunks', metadata,
+    Column('digest', String, primary_key=True),
+    Column('chunk_index', Integer, primary_key=True),
+    Column('checksum', String, nullable=False),
+    Column('rows', Integer, nullable=False),
+    Column('committed_at', DateTime, default=datetime.utcnow)
+)
+
+# --- Rollups ---
+# Pre-aggregated counts maintained by insert_dataframe in the same transaction as the raw insert.
+# NULL keys are stored as '' so they can be part of the primary key.
+ROLLUP_METRICS = ['record_count', 'total_enrolments', 'total_updates', 'total_demographic', 'total_biometric']
+
+def _rollup_table(name, keys):
+    return Table(
+        name, metadata,
+        *[Column(k, String, primary_key=True) for k in keys],
+        *[Column(m, BigInteger, nullable=False, default=0) for m in ROLLUP_METRICS]
+    )
+
+aadhaar_rollup = _rollup_table('aadhaar_rollup', ['state', 'district', 'date', 'status'])
+# Small rollup read by get_stats; its size does not grow with dates or districts
+aadhaar_state_rollup = _rollup_table('aadhaar_state_rollup', ['state', 'status'])
+
+ROLLUPS = [
+    (aadhaar_rollup, ['state', 'district', 'date', 'status']),
+    (aadhaar_state_rollup, ['state', 'status']),
+]
+
+# --- Anomaly statistics ---
+# Running per-district (n, mean, m2) of total_enrolments, folded in chunk by chunk at ingest,
+# and the rows scoring above running_stats.ANOMALY_THRESHOLD against those stats, re-scored
+# after every loaded file so they match a full recomputation.
+anomaly_stats = Table(
+    'anomaly_stats', metadata,
+    Column('district', String, primary_key=True),
+    Column('n', BigInteger, nullable=False, default=0),
+    Column('mean', Float, nullable=False, default=0.0),
+    Column('m2', Float, nullable=False, default=0.0)
+)
+
+anomaly_flags = Table(
+    'anomaly_flags', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('district', String),
+    Column('date', String),
+    Column('enrolments', Integer),
+    Column('z_score', Float, index=True),
+    Column('mean', Float), # District stats the row was last scored against
+    Column('std', Float),
+    Column('flagged_at', DateTime, default=datetime.utcnow)
+)
+
+def _add_missing_columns():
+    """Add columns defined above that an older database does not have yet."""
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
+                    print(f"Added column {table.name}.{column.name}")
+                    added.append(f"{table.name}.{column.name}")
+    if 'aadhaar_data.state_canonical' in added and CANONICAL_STATES_ON_INGEST:
+        canonicalize_states()
+    if 'aadhaar_data.date_value' in added:
+        backfill_date_values()
+
+def _ensure_indexes():
+    """Create indexes defined above that an existing table does not have yet."""
+    inspector = inspect(engine)
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine)
+                print(f"Created index {index.name}")
+
 def init_db():
     """Initialize the database and create tables if they don't exist."""
     try:
         metadata.create_all(engine)
+        _add_missing_columns()
+        _ensure_indexes()
+        _ensure_rollups()
+        _ensure_anomaly_stats()
         print(f"Database initialized on {engine.url}")
     except Exception as e:
         print(f"Error initializing database: {e}")
@@ -62,9 +251,9 @@ def init_db():
 def get_engine():
     return engine
 
-def insert_dataframe(df, filename):
-    """Inserts a pandas DataFrame into the aadhaar_data table."""
-    
+def normalize_dataframe(df):
+    """Standardize column names and derive totals from the demo_/bio_ age columns."""
+
     # Standardize column names (lowercase and underscores)
     df.columns = [col.lower().replace(' ', '_') for col in df.columns]
     
@@ -84,14 +273,446 @@ def insert_dataframe(df, filename):
             df['total_enrolments'] = df[bio_cols].sum(axis=1)
         else:
             df['total_enrolments'] = df['total_enrolments'].fillna(0) + df[bio_cols].sum(axis=1)
+
+    if 'date' in df.columns:
+        df['date_value'] = parse_dates(df['date'])
+
+    if CANONICAL_STATES_ON_INGEST and 'state' in df.columns:
+        df['state_canonical'] = normalize_state_series(df['state']).astype(object)
+
+    return df
+
+def _is_file_processed(conn, filename):
+    # Using SQLAlchemy Core for safer queries
+    # Failed attempts are recorded too, but must not block a retry
+    query = text("SELECT id FROM uploaded_files WHERE filename = :filename AND (status IS NULL OR status != 'failed')")
+    return conn.execute(query, {"filename": filename}).fetchone() is not None
+
+def is_file_processed(filename):
+    """True if filename has already been loaded successfully."""
+    with engine.connect() as conn:
+        return _is_file_processed(conn, filename)
+
+def _track_file(conn, filename, record_count, status='loaded', duration=None, error=None):
+    """Record the outcome of a file load, replacing any earlier failed attempt."""
+    conn.execute(
+        uploaded_files.delete().where(uploaded_files.c.filename == filename).where(uploaded_files.c.status == 'failed')
+    )
+    conn.execute(
+        uploaded_files.insert().values(
+            filename=filename, record_count=record_count, status=status,
+            duration_seconds=duration, error=error
+        )
+    )
+
+def record_file_failure(filename, error, duration=None):
+    """Store a failed load in uploaded_files (e.g. a file that could not be parsed)."""
+    try:
+        with engine.begin() as conn:
+            _track_file(conn, filename, 0, status='failed', duration=duration, error=str(error))
+    except Exception as e:
+        print(f"Could not record failure for {filename}: {e}")
+
+def _rollup_frame(df, keys):
+    """Aggregate a normalized frame into rollup rows (list of dicts) for the given keys."""
+    def numeric(col):
+        if col in df.columns:
+            return pd.to_numeric(df[col], errors='coerce')
+        return pd.Series(float('nan'), index=df.index)
+
+    parts = {}
+    for k in keys:
+        if k in df.columns:
+            parts[k] = df[k].astype(object).where(df[k].notna(), '').astype(str)
+        else:
+            parts[k] = pd.Series('', index=df.index)
+
+    parts['record_count'] = pd.Series(1, index=df.index)
+    parts['total_enrolments'] = numeric('total_enrolments')
+    parts['total_updates'] = numeric('total_updates')
+    # Same NULL semantics as SUM(a + b) in SQL: a row with either side missing adds nothing
+    parts['total_demographic'] = numeric('demo_age_5_17') + numeric('demo_age_17_')
+    parts['total_biometric'] = numeric('bio_age_5_17') + numeric('bio_age_17_')
+
+    grouped = pd.DataFrame(parts).groupby(keys, sort=False)[ROLLUP_METRICS].sum(min_count=0)
+    return grouped.round().astype('int64').reset_index().to_dict(orient='records')
+
+def _upsert_rollup(conn, table, keys, rows):
+    """Add rows to a rollup table, summing metrics into existing keys."""
+    if not rows:
+        return
+    dialect = conn.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={m: table.c[m] + stmt.excluded[m] for m in ROLLUP_METRICS}
+        )
+        conn.execute(stmt, rows)
+        return
+
+    # Generic fallback: update, then insert keys that did not exist yet
+    for row in rows:
+        where = [table.c[k] == row[k] for k in keys]
+        result = conn.execute(
+            table.update().where(*where).values({m: table.c[m] + row[m] for m in ROLLUP_METRICS})
+        )
+        if result.rowcount == 0:
+            conn.execute(table.insert().values(row))
+
+def _update_rollups(conn, df):
+    for table, keys in ROLLUPS:
+        _upsert_rollup(conn, table, keys, _rollup_frame(df, keys))
+
+def rebuild_rollups():
+    """Recompute all rollup tables from aadhaar_data (for existing databases or after migrations)."""
+    with engine.begin() as conn:
+        for table, keys in ROLLUPS:
+            key_exprs = ', '.join(f"COALESCE(CAST({k} AS VARCHAR), '')" for k in keys)
+            group_by = ', '.join(str(i + 1) for i in range(len(keys)))
+            conn.execute(table.delete())
+            conn.execute(text(f"""
+                INSERT INTO {table.name} ({', '.join(keys + ROLLUP_METRICS)})
+                SELECT {key_exprs},
+                       COUNT(*),
+                       COALESCE(SUM(total_enrolments), 0),
+                       COALESCE(SUM(total_updates), 0),
+                       COALESCE(SUM(demo_age_5_17 + demo_age_17_), 0),
+                       COALESCE(SUM(bio_age_5_17 + bio_age_17_), 0)
+                FROM aadhaar_data
+                GROUP BY {group_by}
+            """))
+    print("Rollup tables rebuilt.")
+
+def canonicalize_states():
+    """
+    Fill state_canonical for rows loaded before it existed (or with CANONICAL_STATES_ON_INGEST=0).
+    Only the distinct raw state names are normalized; each one becomes a single UPDATE.
+    """
+    with engine.begin() as conn:
+        raw = [r[0] for r in conn.execute(text(
+            "SELECT DISTINCT state FROM aadhaar_data WHERE state_canonical IS NULL AND state IS NOT NULL"
+        ))]
+        canonical = normalize_state_series(pd.Series(raw, dtype=object))
+        updated = 0
+        for name, official in zip(raw, canonical):
+            if pd.isna(official):
+                continue
+            result = conn.execute(
+                aadhaar_data.update()
+                .where(aadhaar_data.c.state == name, aadhaar_data.c.state_canonical.is_(None))
+                .values(state_canonical=official)
+            )
+            updated += result.rowcount
+    print(f"Canonical states filled for {updated} records")
+    return updated
+
+def backfill_date_values():
+    """
+    Fill date_value for rows loaded before it existed.
+    The distinct date strings are parsed in Python and applied with one UPDATE
+    through a temporary lookup table, so aadhaar_data is scanned once.
+    """
+    with engine.begin() as conn:
+        raw = [r[0] for r in conn.execute(text(
+            "SELECT DISTINCT date FROM aadhaar_data WHERE date_value IS NULL AND date IS NOT NULL"
+        ))]
+        parsed = parse_dates(pd.Series(raw, dtype=object))
+        mapping = [{'raw': r, 'value': d.date()} for r, d in zip(raw, parsed) if not pd.isna(d)]
+        if not mapping:
+            return 0
+
+        date_map = Table(
+            'date_value_map', MetaData(),
+            Column('raw', String, primary_key=True),
+            Column('value', Date),
+            prefixes=['TEMPORARY']
+        )
+        date_map.create(conn)
+        conn.execute(date_map.insert(), mapping)
+        lookup = select(date_map.c.value).where(date_map.c.raw == aadhaar_data.c.date).scalar_subquery()
+        result = conn.execute(
+            aadhaar_data.update()
+            .where(aadhaar_data.c.date_value.is_(None), aadhaar_data.c.date.in_(select(date_map.c.raw)))
+            .values(date_value=lookup)
+        )
+        date_map.drop(conn)
+    print(f"Date values filled for {result.rowcount} records")
+    return result.rowcount
+
+@contextmanager
+def deferred_indexes():
+    """
+    Drop aadhaar_data's secondary indexes for a large load and rebuild them afterwards;
+    one build over the loaded table is much cheaper than updating five indexes per row.
+    Only done while the table is empty: with rows in it, something may be serving
+    queries that need the indexes, so they are kept and maintained row by row.
+    If the load dies halfway, the next init_db recreates them.
+    """
+    with engine.connect() as conn:
+        has_data = conn.execute(text("SELECT 1 FROM aadhaar_data LIMIT 1")).first() is not None
+    if has_data:
+        print("aadhaar_data already has rows; keeping its indexes during the load.")
+        yield
+        return
+
+    inspector = inspect(engine)
+    existing = {ix['name'] for ix in inspector.get_indexes('aadhaar_data')}
+    for index in aadhaar_data.indexes:
+        if index.name in existing:
+            index.drop(engine)
+    try:
+        yield
+    finally:
+        started = time.time()
+        _ensure_indexes()
+        print(f"Indexes rebuilt in {time.time() - started:.1f}s")
+
+def upgrade():
+    """
+    Bring an existing database up to the current schema. Safe to run repeatedly:
+    adds missing columns and indexes, fills derived columns left empty, and builds
+    the rollup / anomaly tables if they are missing.
+    """
+    init_db()
+    backfill_date_values()
+    if CANONICAL_STATES_ON_INGEST:
+        canonicalize_states()
+
+def partition_by_date():
+    """
+    PostgreSQL only: turn aadhaar_data into a table range-partitioned by date_value,
+    with one partition per year (first data year to next year) and a DEFAULT
+    partition for NULL / out-of-range dates. Runs in one transaction and is a no-op
+    when the table is already partitioned.
+    Partitioned tables cannot have a primary key without the partition column,
+    so id keeps its sequence and gets a plain index instead.
+    """
+    if engine.dialect.name != 'postgresql':
+        print("Date partitioning is only available on PostgreSQL.")
+        return False
+
+    backfill_date_values()
+    with engine.begin() as conn:
+        kind = conn.execute(text("SELECT relkind FROM pg_class WHERE relname = 'aadhaar_data'")).scalar()
+        if kind == 'p':
+            print("aadhaar_data is already partitioned.")
+            return True
+
+        first, last = conn.execute(text(
+            "SELECT EXTRACT(YEAR FROM MIN(date_value)), EXTRACT(YEAR FROM MAX(date_value)) FROM aadhaar_data"
+        )).fetchone()
+        this_year = datetime.utcnow().year
+        first = int(first) if first is not None else this_year
+        last = max(int(last) if last is not None else this_year, this_year) + 1
+
+        conn.execute(text("ALTER TABLE aadhaar_data RENAME TO aadhaar_data_unpartitioned"))
+        for index in aadhaar_data.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        conn.execute(text(
+            "CREATE TABLE aadhaar_data (LIKE aadhaar_data_unpartitioned INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (date_value)"
+        ))
+        for year in range(first, last + 1):
+            conn.execute(text(
+                f"CREATE TABLE aadhaar_data_{year} PARTITION OF aadhaar_data "
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+            ))
+        conn.execute(text("CREATE TABLE aadhaar_data_default PARTITION OF aadhaar_data DEFAULT"))
+
+        conn.execute(text("INSERT INTO aadhaar_data SELECT * FROM aadhaar_data_unpartitioned"))
+        # The id sequence belongs to the old table; move it before dropping that table
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence('aadhaar_data_unpartitioned', 'id')")).scalar()
+        if sequence:
+            conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY aadhaar_data.id"))
+        conn.execute(text("DROP TABLE aadhaar_data_unpartitioned"))
+
+        conn.execute(text("CREATE INDEX ix_aadhaar_data_id ON aadhaar_data (id)"))
+        for index in aadhaar_data.indexes:
+            index.create(conn)
+    print(f"aadhaar_data partitioned by year ({first}-{last} plus default).")
+    return True
+
+def _ensure_rollups():
+    """Build rollups once for databases that have raw data but predate the rollup tables."""
+    with engine.connect() as conn:
+        has_data = conn.execute(text("SELECT 1 FROM aadhaar_data LIMIT 1")).first() is not None
+        has_rollup = conn.execute(text("SELECT 1 FROM aadhaar_state_rollup LIMIT 1")).first() is not None
+    if has_data and not has_rollup:
+        rebuild_rollups()
+
+def _stats_frame(result):
+    frame = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+    return frame.set_index('district').astype('float64')
+
+def _stats_rows(stats, key='district'):
+    return [
+        {key: k, 'n': int(n), 'mean': float(mean), 'm2': float(m2)}
+        for k, n, mean, m2 in zip(stats.index, stats['n'], stats['mean'], stats['m2'])
+    ]
+
+def _flag_rows(flags):
+    records = flags.astype(object).where(flags.notna(), None).to_dict(orient='records')
+    for r in records:
+        r['enrolments'] = int(r['enrolments'])
+    return records
+
+def _update_anomaly_stats(conn, df):
+    """Fold a chunk into anomaly_stats. Flags are re-scored once the whole file is in."""
+    chunk = running_stats.chunk_stats(df)
+    if chunk.empty:
+        return
+    keys = chunk.index.tolist()
+
+    # Create missing districts first, so the locking read below sees every key
+    existing = {r[0] for r in conn.execute(select(anomaly_stats.c.district).where(anomaly_stats.c.district.in_(keys)))}
+    missing = [{'district': k, 'n': 0, 'mean': 0.0, 'm2': 0.0} for k in keys if k not in existing]
+    if missing:
+        dialect = conn.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            conn.execute(dialect_insert(anomaly_stats).on_conflict_do_nothing(index_elements=['district']), missing)
+        else:
+            conn.execute(anomaly_stats.insert(), missing)
+
+    # FOR UPDATE serializes concurrent writers per district on PostgreSQL (SQLite has one writer)
+    prior = _stats_frame(conn.execute(
+        select(anomaly_stats).where(anomaly_stats.c.district.in_(keys)).with_for_update()
+    ))
+    combined = running_stats.combine(prior, chunk).loc[keys]
+
+    conn.execute(
+        anomaly_stats.update().where(anomaly_stats.c.district == bindparam('key')).values(
+            n=bindparam('n'), mean=bindparam('mean'), m2=bindparam('m2')
+        ),
+        _stats_rows(combined, key='key')
+    )
+
+def rescore_anomaly_flags(conn, threshold=None):
+    """
+    Replace anomaly_flags with every row scoring above threshold against the current
+    anomaly_stats, which gives the same flags as a full UidaiAnalytics.anomaly_frame run.
+    The database only returns candidates: z > t is tested without a square root as
+    deviation^2 * (n - 1) > t^2 * m2, with a small margin, and score() applies the exact rule.
+    Returns the number of flags.
+    """
+    threshold = running_stats.ANOMALY_THRESHOLD if threshold is None else threshold
+    if conn.dialect.name == 'postgresql':
+        # Concurrent loads finishing together would otherwise both insert their flags
+        conn.execute(text("LOCK TABLE anomaly_flags IN EXCLUSIVE MODE"))
+    conn.execute(anomaly_flags.delete())
+
+    stats = _stats_frame(conn.execute(select(anomaly_stats)))
+    if stats.empty:
+        return 0
+    deviation = aadhaar_data.c.total_enrolments - anomaly_stats.c.mean
+    candidates = pd.read_sql_query(
+        select(aadhaar_data.c.district, aadhaar_data.c.date, aadhaar_data.c.total_enrolments)
+        .join(anomaly_stats, anomaly_stats.c.district == aadhaar_data.c.district)
+        .where(
+            anomaly_stats.c.n > 1,
+            deviation > 0,
+            deviation * deviation * (anomaly_stats.c.n - 1) > 0.99 * threshold ** 2 * anomaly_stats.c.m2
+        )
+        .order_by(aadhaar_data.c.id),
+        conn
+    )
+    flags = running_stats.score(candidates, stats, threshold)
+    if not flags.empty:
+        conn.execute(anomaly_flags.insert(), _flag_rows(flags))
+    return len(flags)
+
+def rebuild_anomaly_stats(chunksize=100000):
+    """Recompute anomaly_stats from the full history of aadhaar_data, then re-score anomaly_flags."""
+    query = select(aadhaar_data.c.district, aadhaar_data.c.total_enrolments)
+    with engine.begin() as conn:
+        conn.execute(anomaly_stats.delete())
+
+        stats = None
+        for chunk in pd.read_sql_query(query, conn, chunksize=chunksize):
+            stats = running_stats.combine(stats, running_stats.chunk_stats(chunk))
+        if stats is None or stats.empty:
+            conn.execute(anomaly_flags.delete())
+            print("Anomaly statistics rebuilt (no data).")
+            return
+
+        conn.execute(anomaly_stats.insert(), _stats_rows(stats))
+        flagged = rescore_anomaly_flags(conn)
+    print(f"Anomaly statistics rebuilt: {len(stats)} districts, {flagged} flags.")
+
+def _ensure_anomaly_stats():
+    """Build anomaly statistics once for databases that have raw data but predate the tables."""
+    with engine.connect() as conn:
+        has_data = conn.execute(text("SELECT 1 FROM aadhaar_data LIMIT 1")).first() is not None
+        has_stats = conn.execute(text("SELECT 1 FROM anomaly_stats LIMIT 1")).first() is not None
+    if has_data and not has_stats:
+        rebuild_anomaly_stats()
+        return
+    # Flags scored against older stats (as loaded chunk by chunk before re-scoring existed)
+    with engine.connect() as conn:
+        stale = conn.execute(
+            select(anomaly_flags.c.id)
+            .join(anomaly_stats, anomaly_stats.c.district == anomaly_flags.c.district)
+            .where(anomaly_flags.c.mean != anomaly_stats.c.mean)
+            .limit(1)
+        ).first() is not None
+    if stale:
+        with engine.begin() as conn:
+            print(f"Anomaly flags re-scored against the current statistics: {rescore_anomaly_flags(conn)} flags.")
+
+def has_anomaly_stats():
+    """True once anomaly_stats has been populated (by ingestion or a rebuild)."""
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT 1 FROM anomaly_stats LIMIT 1")).first() is not None
+
+def get_anomaly_flags(threshold=None, limit=None, offset=0):
+    """
+    Stored flags with z_score above threshold, most severe first.
+    Returns (total matching, DataFrame of district, date, enrolments, z_score).
+    """
+    where = [anomaly_flags.c.z_score > threshold] if threshold is not None else []
+    query = (
+        select(anomaly_flags.c.district, anomaly_flags.c.date, anomaly_flags.c.enrolments, anomaly_flags.c.z_score)
+        .where(*where)
+        .order_by(anomaly_flags.c.z_score.desc(), anomaly_flags.c.id)
+        .offset(offset)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    with read_engine.connect() as conn:
+        total = conn.execute(select(func.count()).select_from(anomaly_flags).where(*where)).scalar()
+        flags = pd.read_sql_query(query, conn)
+    return total, flags
+
+def _insert_frame(conn, df, table_cols):
+    """Insert an already normalized frame, keeping only columns the table knows."""
+    # Dialect-native bulk path (COPY on PostgreSQL, executemany on SQLite)
+    inserted = bulk_writer.bulk_insert(conn, aadhaar_data, df, columns=table_cols)
+    _update_rollups(conn, df)
+    _update_anomaly_stats(conn, df)
+    return inserted
+
+def insert_dataframe(df, filename, normalize=True, started_at=None, digest=None):
+    """
+    Inserts a pandas DataFrame into the aadhaar_data table.
+    Pass normalize=False for frames that already went through normalize_dataframe,
+    and started_at (epoch seconds) to include earlier parsing time in the recorded duration.
+    digest (the file's sha256) records the content in ingest_ledger as one complete chunk.
+    """
+    started_at = started_at or time.time()
+    if normalize:
+        df = normalize_dataframe(df)
     
     with engine.connect() as conn:
         # Check if file was already uploaded to avoid duplicates
-        # Using SQLAlchemy Core for safer queries
-        query = text("SELECT id FROM uploaded_files WHERE filename = :filename")
-        result = conn.execute(query, {"filename": filename}).fetchone()
-        
-        if result:
+        if _is_file_processed(conn, filename):
             return False, "File already processed."
 
         try:
@@ -99,58 +720,170 @@ def insert_dataframe(df, filename):
             inspector = inspect(engine)
             table_cols = [c['name'] for c in inspector.get_columns('aadhaar_data')]
             
-            # Filter DF to only have columns that exist in the table
-            df_to_insert = df[[col for col in df.columns if col in table_cols]]
-            
-            # Use Pandas to insert data
-            df_to_insert.to_sql('aadhaar_data', conn, if_exists='append', index=False)
+            inserted = _insert_frame(conn, df, table_cols)
+
+            if digest is not None:
+                _start_ledger(conn, digest, filename)
+                _complete_ledger(conn, digest, 1, inserted)
+
+            # The new rows moved their districts' stats; score everything against them
+            rescore_anomaly_flags(conn)
             
             # Track the file
-            conn.execute(
-                uploaded_files.insert().values(filename=filename, record_count=len(df))
-            )
+            _track_file(conn, filename, len(df), duration=time.time() - started_at)
             conn.commit()
             
-            return True, f"Inserted {len(df_to_insert)} records."
+            return True, f"Inserted {inserted} records."
             
         except Exception as e:
             conn.rollback() # Rollback on error
+            record_file_failure(filename, e, duration=time.time() - started_at)
             return False, str(e)
 
-def get_all_data():
-    """Fetch all records from the database."""
+def get_ledger(digest):
+    """Ledger entry of a file digest as a dict, or None if the content was never loaded."""
+    with engine.connect() as conn:
+        row = conn.execute(select(ingest_ledger).where(ingest_ledger.c.digest == digest)).first()
+    return dict(row._mapping) if row is not None else None
+
+def get_committed_chunks(digest):
+    """{chunk_index: (checksum, rows)} of the chunks already committed for a digest."""
+    query = select(ingest_chunks.c.chunk_index, ingest_chunks.c.checksum, ingest_chunks.c.rows).where(ingest_chunks.c.digest == digest)
+    with engine.connect() as conn:
+        return {row[0]: (row[1], row[2]) for row in conn.execute(query)}
+
+def _start_ledger(conn, digest, filename, size_bytes=None, chunk_size=None):
+    exists = conn.execute(select(ingest_ledger.c.digest).where(ingest_ledger.c.digest == digest)).first()
+    if exists:
+        # Resumes keep the committed chunk_size (ingest.stream_file passes it back in)
+        values = {'filename': filename}
+        if chunk_size is not None:
+            values['chunk_size'] = chunk_size
+        conn.execute(ingest_ledger.update().where(ingest_ledger.c.digest == digest).values(**values))
+    else:
+        conn.execute(ingest_ledger.insert().values(
+            digest=digest, filename=filename, size_bytes=size_bytes, chunk_size=chunk_size, status='loading'
+        ))
+
+def _complete_ledger(conn, digest, chunks, rows):
+    conn.execute(
+        ingest_ledger.update().where(ingest_ledger.c.digest == digest)
+        .values(status='complete', chunks=chunks, rows=rows, finished_at=datetime.utcnow())
+    )
+
+def insert_file_chunks(chunks, filename, digest, size_bytes=None, chunk_size=None, on_progress=None):
+    """
+    Streaming, resumable variant of insert_dataframe for a file identified by its content digest.
+    chunks yields (chunk_index, checksum, DataFrame) for the chunks not committed yet
+    (see ingest.stream_file). Each chunk commits together with its ingest_chunks row,
+    so a failure keeps the chunks before it and a later call with the same digest
+    continues from there. The file is tracked in uploaded_files once every chunk is in.
+    on_progress(chunk_index, chunk_rows, total_rows) is called after each commit;
+    total_rows includes chunks committed by earlier attempts.
+    """
+    started_at = time.time()
+    with engine.connect() as conn:
+        if _is_file_processed(conn, filename):
+            return False, "File already processed."
+
+        committed = 0
+        try:
+            _start_ledger(conn, digest, filename, size_bytes, chunk_size)
+            conn.commit()
+
+            done = conn.execute(
+                select(func.count(), func.coalesce(func.sum(ingest_chunks.c.rows), 0)).where(ingest_chunks.c.digest == digest)
+            ).first()
+            chunk_count, total = done[0], done[1]
+
+            inspector = inspect(engine)
+            table_cols = [c['name'] for c in inspector.get_columns('aadhaar_data')]
+
+            for index, checksum, chunk in chunks:
+                chunk = normalize_dataframe(chunk)
+                rows = _insert_frame(conn, chunk, table_cols)
+                conn.execute(ingest_chunks.insert().values(digest=digest, chunk_index=index, checksum=checksum, rows=rows))
+                conn.commit()
+                committed += 1
+                chunk_count += 1
+                total += rows
+                if on_progress:
+                    on_progress(index, rows, total)
+
+            _complete_ledger(conn, digest, chunk_count, total)
+            rescore_anomaly_flags(conn)
+            _track_file(conn, filename, total, duration=time.time() - started_at)
+            conn.commit()
+
+            return True, f"Inserted {total} records."
+
+        except Exception as e:
+            conn.rollback()
+            record_file_failure(filename, e, duration=time.time() - started_at)
+            return False, f"{e} ({committed} chunk(s) committed in this attempt; loading the file again resumes after them)"
+
+def get_all_data(bind=None):
+    """
+    Fetch all records from the database (the read replica when configured).
+    Pass bind=engine where the rows must match the primary, e.g. for a snapshot
+    tagged with the primary's fingerprint.
+    """
     try:
-        return pd.read_sql_table("aadhaar_data", engine)
+        return pd.read_sql_table("aadhaar_data", bind or read_engine)
     except Exception as e:
         print(f"Error fetching data: {e}")
         return pd.DataFrame() # Return empty DF on failure
 
+def get_max_id(bind=None):
+    """Highest aadhaar_data.id (the ingestion watermark), 0 when empty. bind defaults to the primary."""
+    with (bind or engine).connect() as conn:
+        return conn.execute(text("SELECT MAX(id) FROM aadhaar_data")).scalar() or 0
+
+def get_record_count(bind=None):
+    """Total rows in aadhaar_data, read from the rollup instead of a table scan."""
+    with (bind or engine).connect() as conn:
+        return conn.execute(text("SELECT SUM(record_count) FROM aadhaar_state_rollup")).scalar() or 0
+
+def get_rows_since(watermark, bind=None):
+    """Fetch only the rows inserted after the given id watermark."""
+    # Typed select so column types match what get_all_data returns
+    query = select(aadhaar_data).where(aadhaar_data.c.id > watermark).order_by(aadhaar_data.c.id)
+    return pd.read_sql_query(query, bind or engine)
+
+def get_uploaded_manifest():
+    """(filename, record_count, upload_date) of every loaded file, used to fingerprint the data."""
+    with engine.connect() as conn:
+        result = conn.execute(text(
+            "SELECT filename, record_count, upload_date FROM uploaded_files "
+            "WHERE status IS NULL OR status != 'failed' ORDER BY filename"
+        )).fetchall()
+        return [(row[0], row[1], str(row[2])) for row in result]
+
 def get_uploaded_filenames():
     """Fetch list of uploaded filenames."""
-    with engine.connect() as conn:
-        result = conn.execute(text("SELECT filename FROM uploaded_files")).fetchall()
+    with read_engine.connect() as conn:
+        result = conn.execute(text("SELECT filename FROM uploaded_files WHERE status IS NULL OR status != 'failed'")).fetchall()
         return [row[0] for row in result]
 
 def get_stats():
-    """Get high-level statistics from the DB."""
+    """Get high-level statistics from the DB (served from the rollup tables)."""
     stats = {}
     
-    with engine.connect() as conn:
+    with read_engine.connect() as conn:
         # Total Records
-        total_records = conn.execute(text("SELECT COUNT(*) FROM aadhaar_data")).scalar()
+        total_records = conn.execute(text("SELECT SUM(record_count) FROM aadhaar_state_rollup")).scalar()
         stats['total_records'] = total_records or 0
         
-        # Records by Status
-        status_res = conn.execute(text("SELECT status, COUNT(*) FROM aadhaar_data GROUP BY status")).fetchall()
-        stats['by_status'] = {row[0]: row[1] for row in status_res}
+        # Records by Status ('' is the stored form of NULL)
+        status_res = conn.execute(text("SELECT status, SUM(record_count) FROM aadhaar_state_rollup GROUP BY status")).fetchall()
+        stats['by_status'] = {(row[0] or None): row[1] for row in status_res}
         
         # Top States
-        top_states_res = conn.execute(text("SELECT state, SUM(total_enrolments) as total FROM aadhaar_data GROUP BY state ORDER BY total DESC LIMIT 5")).fetchall()
-        stats['top_states'] = {row[0]: row[1] for row in top_states_res}
+        top_states_res = conn.execute(text("SELECT state, SUM(total_enrolments) as total FROM aadhaar_state_rollup GROUP BY state ORDER BY total DESC LIMIT 5")).fetchall()
+        stats['top_states'] = {(row[0] or None): row[1] for row in top_states_res}
 
         # Demographic & Biometric Totals
-        # Note: Handling potential NULL sums
-        totals_res = conn.execute(text("SELECT SUM(demo_age_5_17 + demo_age_17_), SUM(bio_age_5_17 + bio_age_17_) FROM aadhaar_data")).fetchone()
+        totals_res = conn.execute(text("SELECT SUM(total_demographic), SUM(total_biometric) FROM aadhaar_state_rollup")).fetchone()
         stats['total_demographic'] = totals_res[0] or 0
         stats['total_biometric'] = totals_res[1] or 0
     
@@ -162,4 +895,16 @@ def clear_db():
     init_db()
 
 if __name__ == "__main__":
-    init_db()
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'upgrade':
+        upgrade() # Runs init_db itself
+        if '--partition' in sys.argv:
+            partition_by_date()
+    else:
+        init_db()
+        if command == 'rebuild-rollups':
+            rebuild_rollups()
+        elif command == 'canonicalize-states':
+            canonicalize_states()
+        elif command == 'rebuild-anomaly-stats':
+            rebuild_anomaly_stats()
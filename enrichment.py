@@ -0,0 +1,110 @@
+"""
+Mock UIDAI fields for uploads that lack them (status, gender, eid, counts).
+Every column is drawn in one call on a NumPy Generator instead of one random.*
+call per row. An Enricher can be passed as the transform of ingest.stream_file:
+with ENRICH_SEED set, each chunk is drawn from a Generator seeded with
+(seed, file digest, chunk index), so the same file and chunk size always get the
+same mock data, even when a load is resumed part-way.
+"""
+import os
+import numpy as np
+
+# Seed for reproducible mock data; unset draws fresh entropy for every Enricher
+ENRICH_SEED = os.environ.get('ENRICH_SEED')
+
+STATUSES = ['Generated', 'Rejected', 'In Process', 'Hold']
+STATUS_WEIGHTS = [0.7, 0.1, 0.15, 0.05]
+GENDERS = ['Male', 'Female', 'Transgender']
+
+# (low, high inclusive) of each '/'-separated EID group, e.g. 1234/56789/01234
+EID_GROUPS = [(1000, 9999), (10000, 99999), (10000, 99999)]
+ENROLMENT_RANGE = (1, 100)
+UPDATE_RANGE = (1, 50)
+
+def make_rng(seed=None, *key):
+    """
+    Generator for the given seed (int or numeric string); None means unpredictable.
+    Extra integers in key derive an independent stream from the same seed.
+    """
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng([int(seed), *key])
+
+def weighted_choice(rng, values, size, weights=None):
+    """size draws from values (uniform, or with the given probabilities) as an object array."""
+    values = np.asarray(values, dtype=object)
+    if weights is not None:
+        weights = np.asarray(weights, dtype='float64')
+        weights = weights / weights.sum()
+    return values[rng.choice(len(values), size=size, p=weights)]
+
+def format_eids(groups, widths):
+    """
+    Join equal-length integer arrays into zero-padded 'g1/g2/...' strings without a
+    Python loop: digits are written into a byte matrix (one newline-terminated row
+    per EID), which is decoded once and split into strings.
+    """
+    size = len(groups[0])
+    row_width = sum(widths) + len(widths)
+    out = np.full((size, row_width), ord('/'), dtype=np.uint8)
+    out[:, -1] = ord('\n')
+    start = 0
+    for values, width in zip(groups, widths):
+        values = values.astype(np.int32)
+        for position in range(width - 1, -1, -1):
+            values, digit = np.divmod(values, 10)
+            out[:, start + position] = digit + ord('0')
+        start += width + 1
+    return np.array(out.tobytes().decode('ascii').split('\n')[:-1], dtype=object)
+
+class Enricher:
+    """Callable that fills the missing mock columns of a DataFrame in place and returns it."""
+
+    def __init__(self, seed=ENRICH_SEED):
+        self.seed = seed
+        self.rng = make_rng(seed)
+
+    def for_chunk(self, digest, chunk_index):
+        """
+        Enricher for one chunk of the file with this sha256 digest. With a seed its
+        draws depend only on (seed, digest, chunk_index), not on the chunks before it;
+        without one the shared Generator is used.
+        """
+        if self.seed is None:
+            return self
+        chunk = Enricher.__new__(Enricher)
+        chunk.seed = self.seed
+        chunk.rng = make_rng(self.seed, int(digest, 16), chunk_index)
+        return chunk
+
+    def _integers(self, bounds, size):
+        low, high = bounds
+        return self.rng.integers(low, high, size=size, endpoint=True)
+
+    def __call__(self, df):
+        cols = [c.lower() for c in df.columns]
+        size = len(df)
+
+        if 'status' not in cols:
+            df['status'] = weighted_choice(self.rng, STATUSES, size, STATUS_WEIGHTS)
+
+        if 'gender' not in cols:
+            df['gender'] = weighted_choice(self.rng, GENDERS, size)
+
+        if 'eid' not in cols:
+            df['eid'] = format_eids(
+                [self._integers(bounds, size) for bounds in EID_GROUPS],
+                [len(str(high)) for _, high in EID_GROUPS]
+            )
+
+        if 'total_enrolments' not in cols:
+            df['total_enrolments'] = self._integers(ENROLMENT_RANGE, size)
+
+        if 'total_updates' not in cols:
+            df['total_updates'] = self._integers(UPDATE_RANGE, size)
+
+        return df
+
+def enrich_data(df, seed=ENRICH_SEED):
+    """One-off enrichment of a whole frame (use an Enricher for chunked input)."""
+    return Enricher(seed)(df)
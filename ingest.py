@@ -0,0 +1,114 @@
+"""
+Streaming ingestion for large CSV/Excel extracts.
+Files are read, normalized and inserted in bounded chunks so that memory stays
+flat regardless of file size.
+Every file is identified by the sha256 of its content (see database.ingest_ledger):
+content that is already loaded is skipped without parsing, whatever its filename,
+and an interrupted load resumes after its last committed chunk.
+"""
+import os
+import hashlib
+import pandas as pd
+import database
+
+# Rows per chunk (override with the INGEST_CHUNK_SIZE environment variable)
+DEFAULT_CHUNK_SIZE = int(os.environ.get('INGEST_CHUNK_SIZE', 50000))
+
+def read_chunks(path, chunk_size=None):
+    """Yield DataFrames of at most chunk_size rows from a CSV or XLSX file."""
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+
+    if path.endswith('.csv'):
+        with pd.read_csv(path, chunksize=chunk_size) as reader:
+            for chunk in reader:
+                yield chunk
+        return
+
+    # Excel: openpyxl read-only mode streams rows instead of loading the sheet
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+def file_digest(path, block_size=1 << 20):
+    """sha256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_checksum(df):
+    """Checksum of a raw chunk's column names and values (before any transform)."""
+    digest = hashlib.sha256('\x1f'.join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def print_progress(filename):
+    """Default progress reporter: one line per committed chunk."""
+    def report(chunk_index, chunk_rows, total_rows):
+        print(f"  {filename}: chunk {chunk_index + 1} -> {chunk_rows} rows ({total_rows} total)")
+    return report
+
+def _pending_chunks(path, chunk_size, committed, transform, digest):
+    """(index, checksum, chunk) for chunks not in committed; committed ones are only verified."""
+    for index, chunk in enumerate(read_chunks(path, chunk_size)):
+        checksum = chunk_checksum(chunk)
+        if index in committed:
+            if committed[index][0] != checksum:
+                raise ValueError(f"Chunk {index + 1} no longer matches the committed rows; cannot resume this load.")
+            continue
+        if transform is None:
+            yield index, checksum, chunk
+        elif hasattr(transform, 'for_chunk'):
+            # Per-chunk transforms (enrichment.Enricher) come out the same whether or not earlier chunks ran
+            yield index, checksum, transform.for_chunk(digest, index)(chunk)
+        else:
+            yield index, checksum, transform(chunk)
+
+def stream_file(path, filename=None, chunk_size=None, transform=None, on_progress=None, digest=None):
+    """
+    Stream a file into the aadhaar_data table, one committed chunk at a time.
+    transform(df) is applied to every raw chunk before normalization (e.g. enrichment);
+    chunks committed by an earlier attempt are read and checksummed but not transformed
+    or inserted again. A transform with a for_chunk(digest, chunk_index) method is asked
+    for the callable to use on each chunk.
+    digest: the file's sha256 if the caller already computed it.
+    Returns the same (success, message) tuple as database.insert_dataframe.
+    """
+    filename = filename or os.path.basename(path)
+    if on_progress is None:
+        on_progress = print_progress(filename)
+
+    digest = digest or file_digest(path)
+    ledger = database.get_ledger(digest)
+    committed = {}
+    if ledger is not None:
+        if ledger['status'] == 'complete':
+            return False, f"Identical content already loaded as {ledger['filename']}."
+        committed = database.get_committed_chunks(digest)
+        if committed:
+            # Chunk boundaries must match the committed ones
+            chunk_size = ledger['chunk_size']
+            print(f"  {filename}: resuming after {len(committed)} committed chunk(s)")
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+
+    chunks = _pending_chunks(path, chunk_size, committed, transform, digest)
+    return database.insert_file_chunks(
+        chunks, filename, digest,
+        size_bytes=os.path.getsize(path), chunk_size=chunk_size, on_progress=on_progress
+    )
@@ -0,0 +1,235 @@
+"""
+Background ingestion jobs.
+/api/upload saves the file, registers a job and returns its id straight away; a
+bounded thread pool then streams the file into the database with ingest.stream_file.
+At most INGEST_WORKERS files load at once and at most INGEST_MAX_PENDING jobs may be
+queued or running, so a burst of uploads cannot take over the API's threads or
+database connections.
+
+Jobs and their progress live in the ingest_jobs table, which every API process can
+read. With a SQLite main database the table goes to a separate local SQLite file
+(JOBS_DATABASE_URL): a load holds the main database's write lock until it commits,
+and the upload request and the per-chunk progress updates must not wait behind it.
+"""
+import functools
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, BigInteger, String, DateTime, select
+import database
+import ingest
+
+def _default_jobs_url():
+    if database.engine.dialect.name == 'sqlite':
+        return 'sqlite:///ingest_jobs.db'
+    return database.DATABASE_URL
+
+JOBS_DATABASE_URL = os.environ.get('JOBS_DATABASE_URL') or _default_jobs_url()
+
+# Files loaded concurrently. SQLite has a single writer, so parallel loads would only
+# queue on its lock (and could outlast the busy timeout).
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 1 if database.engine.dialect.name == 'sqlite' else 2))
+# Jobs queued or running before uploads are refused
+INGEST_MAX_PENDING = int(os.environ.get('INGEST_MAX_PENDING', 16))
+
+jobs_engine = database.engine if JOBS_DATABASE_URL == database.DATABASE_URL else database.make_engine(JOBS_DATABASE_URL)
+jobs_metadata = MetaData()
+
+# status: queued -> running -> succeeded / failed / skipped (content already loaded)
+ingest_jobs = Table(
+    'ingest_jobs', jobs_metadata,
+    Column('id', String, primary_key=True),
+    Column('filename', String),
+    Column('status', String, nullable=False, default='queued', index=True),
+    Column('rows_parsed', BigInteger, nullable=False, default=0), # Read from the file
+    Column('rows_inserted', BigInteger, nullable=False, default=0), # Committed, chunk by chunk
+    Column('chunks', Integer, nullable=False, default=0),
+    Column('message', String),
+    Column('created_at', DateTime, default=datetime.utcnow),
+    Column('started_at', DateTime),
+    Column('finished_at', DateTime)
+)
+
+def init_jobs_db():
+    jobs_metadata.create_all(jobs_engine)
+
+def _job_dict(row):
+    job = dict(row._mapping)
+    for key in ('created_at', 'started_at', 'finished_at'):
+        if job[key] is not None:
+            job[key] = job[key].isoformat()
+    return job
+
+def create_job(job_id, filename):
+    with jobs_engine.begin() as conn:
+        conn.execute(ingest_jobs.insert().values(id=job_id, filename=filename, status='queued'))
+
+def update_job(job_id, **values):
+    with jobs_engine.begin() as conn:
+        conn.execute(ingest_jobs.update().where(ingest_jobs.c.id == job_id).values(**values))
+
+def get_job(job_id):
+    """One job as a dict, or None."""
+    with jobs_engine.connect() as conn:
+        row = conn.execute(select(ingest_jobs).where(ingest_jobs.c.id == job_id)).first()
+    return _job_dict(row) if row is not None else None
+
+def list_jobs(status=None, limit=50):
+    """Most recent jobs first, optionally filtered by status."""
+    query = select(ingest_jobs).order_by(ingest_jobs.c.created_at.desc(), ingest_jobs.c.id).limit(limit)
+    if status:
+        query = query.where(ingest_jobs.c.status == status)
+    with jobs_engine.connect() as conn:
+        return [_job_dict(row) for row in conn.execute(query)]
+
+def fail_interrupted_jobs():
+    """
+    Mark jobs left queued/running by a previous process as failed.
+    Only call this when no other process runs jobs against the same jobs table.
+    """
+    with jobs_engine.begin() as conn:
+        result = conn.execute(
+            ingest_jobs.update()
+            .where(ingest_jobs.c.status.in_(['queued', 'running']))
+            .values(status='failed', message="Interrupted by a server restart; upload the file again.",
+                    finished_at=datetime.utcnow())
+        )
+    if result.rowcount:
+        print(f"Marked {result.rowcount} interrupted ingestion job(s) as failed")
+    return result.rowcount
+
+def _remove_upload(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        print(f"Could not remove {path}: {e}")
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when INGEST_MAX_PENDING jobs are already queued or running."""
+
+class FileBusy(Exception):
+    """Raised by JobQueue.reserve when an upload or job for the same filename is in progress."""
+    def __init__(self, filename, job_id=None):
+        self.filename = filename
+        self.job_id = job_id
+        detail = f" (job {job_id})" if job_id else ""
+        super().__init__(f"{filename} is already being imported{detail}; wait for it to finish.")
+
+class JobQueue:
+    def __init__(self, workers=INGEST_WORKERS, max_pending=INGEST_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest')
+        self._pending = 0
+        self._active = {} # filename -> job id (None while the upload is still being saved)
+        self._lock = threading.Lock()
+        init_jobs_db()
+
+    def reserve(self, filename):
+        """
+        Claim a filename before its upload is written to disk, so a second upload of
+        the same name cannot overwrite the file a job is reading. Raises FileBusy.
+        submit() takes the reservation over; call release() if the job is never submitted.
+        """
+        with self._lock:
+            if filename in self._active:
+                raise FileBusy(filename, self._active[filename])
+            self._active[filename] = None
+
+    def release(self, filename):
+        with self._lock:
+            if self._active.get(filename) is None:
+                self._active.pop(filename, None)
+
+    def submit(self, path, filename, chunk_size=None, transform=None, on_success=None):
+        """
+        Queue a file for loading and return the job id.
+        transform(df) is applied to every raw chunk (as in ingest.stream_file);
+        on_success() runs on the worker after the rows are committed, before the job
+        is reported as succeeded (e.g. to refresh in-memory data).
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if self._active.get(filename) is not None:
+                raise FileBusy(filename, self._active[filename])
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"{self._pending} ingestion jobs already pending; try again later.")
+            self._pending += 1
+            self._active[filename] = job_id
+
+        try:
+            create_job(job_id, filename)
+            self._executor.submit(self._run, job_id, path, filename, chunk_size, transform, on_success)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self._active.pop(filename, None)
+            raise
+        return job_id
+
+    def _run(self, job_id, path, filename, chunk_size, transform, on_success):
+        progress = {'rows_parsed': 0, 'rows_inserted': 0, 'chunks': 0}
+
+        def parse(df, chunk_transform=transform):
+            progress['rows_parsed'] += len(df)
+            return chunk_transform(df) if chunk_transform is not None else df
+
+        if hasattr(transform, 'for_chunk'):
+            # Keep per-chunk seeding (enrichment.Enricher) through the row counting
+            parse.for_chunk = lambda digest, index: functools.partial(parse, chunk_transform=transform.for_chunk(digest, index))
+
+        def report(chunk_index, chunk_rows, total_rows):
+            # total_rows includes chunks committed by an earlier attempt at the same file,
+            # which are not passed through parse() again
+            progress['chunks'] = chunk_index + 1
+            progress['rows_inserted'] = total_rows
+            progress['rows_parsed'] = max(progress['rows_parsed'], total_rows)
+            print(f"  job {job_id[:8]} {filename}: chunk {chunk_index + 1} -> {chunk_rows} rows ({total_rows} total)")
+            try:
+                update_job(job_id, **progress)
+            except Exception as e:
+                print(f"Job {job_id}: could not record progress: {e}")
+
+        status = None
+        try:
+            update_job(job_id, status='running', started_at=datetime.utcnow())
+            digest = ingest.file_digest(path)
+            ledger = database.get_ledger(digest)
+            if ledger is not None and ledger['status'] == 'complete':
+                # Nothing went wrong, there is just nothing to load; the saved copy is redundant
+                success, status = False, 'skipped'
+                message = f"Identical content already loaded as {ledger['filename']}."
+                _remove_upload(path)
+            else:
+                success, message = ingest.stream_file(
+                    path, filename, chunk_size=chunk_size, transform=parse, on_progress=report, digest=digest
+                )
+            # On failure the chunks committed so far stay in place; uploading the file again resumes
+            if success and on_success is not None:
+                try:
+                    on_success()
+                except Exception as e:
+                    print(f"Job {job_id}: post-ingest refresh failed: {e}")
+        except Exception as e:
+            success, message = False, f"Processing error: {e}"
+
+        try:
+            update_job(
+                job_id,
+                status=status or ('succeeded' if success else 'failed'),
+                message=message,
+                finished_at=datetime.utcnow(),
+                **progress
+            )
+        except Exception as e:
+            print(f"Job {job_id}: could not record result: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._active.pop(filename, None)
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "pending": self._pending, "files": sorted(self._active)}
@@ -0,0 +1,127 @@
+"""
+Long-lived LLM clients for the text-to-code endpoints.
+LLMClients hands out one client per API key and keeps it, so the underlying
+gRPC/HTTP connections are reused across requests instead of being rebuilt for
+every question. All clients share one interface, generate(system_prompt, question)
+-> code, and a 'stub' provider answers locally (ASK_LLM_PROVIDER=stub), which
+makes /api/ask testable without network access or keys.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from google.ai import generativelanguage as glm # Installed with google-generativeai
+except ImportError:
+    glm = None
+
+# Overrides the provider an app asks for (e.g. 'stub' in tests)
+ASK_LLM_PROVIDER = os.environ.get('ASK_LLM_PROVIDER')
+# Distinct API keys kept alive at once
+LLM_CLIENT_CACHE_SIZE = int(os.environ.get('LLM_CLIENT_CACHE_SIZE', 16))
+
+class MissingKey(Exception):
+    """No API key was given and none is configured for the provider."""
+
+def strip_code_fences(text):
+    """Plain code from a model reply that may be wrapped in ```python fences."""
+    code = text.strip()
+    if code.startswith("```"):
+        code = code.split('\n', 1)[1] if '\n' in code else ''
+    if code.rstrip().endswith("```"):
+        code = code.rstrip()[:-3]
+    return code.strip()
+
+class GeminiClient:
+    def __init__(self, api_key, model_name):
+        if not api_key:
+            raise MissingKey("Gemini API key missing.")
+        if glm is None:
+            raise ImportError("google-generativeai is not installed.")
+        self.model_name = model_name
+        self.model_path = model_name if model_name.startswith('models/') else f"models/{model_name}"
+        # The public GAPIC client takes its key per instance (genai.configure is
+        # process-wide) and keeps its own channel for the life of the client
+        self.client = glm.GenerativeServiceClient(client_options={'api_key': api_key})
+
+    def generate(self, system_prompt, question):
+        prompt = system_prompt + "\nQuestion: " + question
+        response = self.client.generate_content(
+            model=self.model_path,
+            contents=[glm.Content(role='user', parts=[glm.Part(text=prompt)])]
+        )
+        if not response.candidates:
+            raise ValueError(f"Gemini returned no answer ({response.prompt_feedback.block_reason.name}).")
+        return strip_code_fences(''.join(part.text for part in response.candidates[0].content.parts))
+
+class OpenAIClient:
+    def __init__(self, api_key, model_name):
+        if not (api_key or os.environ.get('OPENAI_API_KEY')):
+            raise MissingKey("OpenAI API key missing.")
+        from openai import OpenAI
+        self.model_name = model_name
+        self.client = OpenAI(api_key=api_key or None) # None: read OPENAI_API_KEY
+
+    def generate(self, system_prompt, question):
+        completion = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": question}
+            ],
+            temperature=0
+        )
+        return strip_code_fences(completion.choices[0].message.content)
+
+class StubClient:
+    """
+    Local stand-in for a model: returns answers[question] (matched case-insensitively)
+    or `default`, and records every call in self.calls.
+    """
+    def __init__(self, answers=None, default="result = {'rows': len(df)}"):
+        self.model_name = 'stub'
+        self.answers = {q.strip().casefold(): code for q, code in (answers or {}).items()}
+        self.default = default
+        self.calls = []
+
+    def generate(self, system_prompt, question):
+        self.calls.append((system_prompt, question))
+        return self.answers.get((question or '').strip().casefold(), self.default)
+
+PROVIDERS = {
+    'gemini': GeminiClient,
+    'openai': OpenAIClient,
+}
+
+class LLMClients:
+    """Per-key client cache for one provider and model."""
+
+    def __init__(self, provider, model_name, maxsize=LLM_CLIENT_CACHE_SIZE):
+        self.provider = ASK_LLM_PROVIDER or provider
+        self.model_name = 'stub' if self.provider == 'stub' else model_name
+        self.maxsize = maxsize
+        self.stub = StubClient() if self.provider == 'stub' else None
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, api_key=None):
+        """Client for api_key, created on first use and reused afterwards. Raises MissingKey."""
+        if self.stub is not None:
+            return self.stub
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is not None:
+                self._clients.move_to_end(api_key)
+                return client
+        # Built outside the lock: creating a client may do network or credential lookups
+        client = PROVIDERS[self.provider](api_key, self.model_name)
+        with self._lock:
+            client = self._clients.setdefault(api_key, client)
+            self._clients.move_to_end(api_key)
+            while len(self._clients) > self.maxsize:
+                self._clients.popitem(last=False)
+        return client
+
+    def stats(self):
+        with self._lock:
+            return {"provider": self.provider, "model": self.model_name, "clients": len(self._clients)}
@@ -2,11 +2,15 @@ import os
 import sqlite3
 import pandas as pd
 from sqlalchemy import create_engine, text
-from database import init_db, engine as target_engine
+from database import init_db, metadata, rebuild_rollups, rebuild_anomaly_stats, canonicalize_states, backfill_date_values, CANONICAL_STATES_ON_INGEST, engine as target_engine
+import bulk_writer
 
 # Path to the local SQLite database
 SQLITE_DB_PATH = 'uidai_data.db'
 
+# Rows read from the source per round trip
+MIGRATION_CHUNK_SIZE = 100000
+
 def migrate():
     print("--- Database Migration Tool ---")
     
@@ -47,24 +51,56 @@ def migrate():
     for table in tables:
         print(f"\nMigrating table: {table}...")
         try:
-            # Read from Source
-            df = pd.read_sql_query(f"SELECT * FROM {table}", src_conn)
+            table_obj = metadata.tables[table]
+            total = 0
+            
+            # Read from Source in chunks and write each with the dialect-native bulk writer
+            # (COPY FROM STDIN on PostgreSQL) inside a single target transaction
+            with target_engine.begin() as conn:
+                for df in pd.read_sql_query(f"SELECT * FROM {table}", src_conn, chunksize=MIGRATION_CHUNK_SIZE):
+                    total += bulk_writer.bulk_insert(conn, table_obj, df)
+                    print(f"  - Copied {total} records...")
+                
+                if total and conn.dialect.name == 'postgresql':
+                    # Explicit ids were copied, so move the serial sequence past them
+                    conn.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+                    ))
             
-            if df.empty:
+            if not total:
                 print(f"  - Table {table} is empty. Skipping.")
                 continue
                 
-            print(f"  - Read {len(df)} records from source.")
-            
-            # Write to Target
-            # chunksize=1000 helps with memory and network timeouts
-            df.to_sql(table, target_engine, if_exists='append', index=False, chunksize=1000)
-            print(f"  - Successfully wrote {len(df)} records to target.")
+            print(f"  - Successfully wrote {total} records to target.")
             
         except Exception as e:
             print(f"  - Error migrating {table}: {e}")
 
     src_conn.close()
+
+    # Rollups are derived from aadhaar_data, so recompute them on the target
+    try:
+        rebuild_rollups()
+    except Exception as e:
+        print(f"Error rebuilding rollups: {e}")
+
+    try:
+        rebuild_anomaly_stats()
+    except Exception as e:
+        print(f"Error rebuilding anomaly statistics: {e}")
+
+    # Sources older than the date_value column leave it empty
+    try:
+        backfill_date_values()
+    except Exception as e:
+        print(f"Error filling date values: {e}")
+
+    # Sources older than the state_canonical column leave it empty
+    if CANONICAL_STATES_ON_INGEST:
+        try:
+            canonicalize_states()
+        except Exception as e:
+            print(f"Error filling canonical states: {e}")
     print("\n--- Migration Complete ---")
 
 if __name__ == "__main__":
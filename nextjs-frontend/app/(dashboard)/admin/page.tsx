@@ -42,8 +42,27 @@ export default function AdminDashboard() {
 
         try {
             const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://127.0.0.1:5000';
-            await axios.post(`${API_URL}/api/upload`, formData);
-            setUploadStatus('Success! Data reloaded.');
+            const res = await axios.post(`${API_URL}/api/upload`, formData);
+            const jobId = res.data.job_id;
+
+            // Ingestion runs in the background: poll the job until it finishes
+            while (true) {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                const { data: job } = await axios.get(`${API_URL}/api/jobs/${jobId}`);
+                if (job.status === 'succeeded') {
+                    setUploadStatus('Success! Data reloaded.');
+                    break;
+                }
+                if (job.status === 'skipped') {
+                    setUploadStatus(`Nothing to import: ${job.message}`);
+                    break;
+                }
+                if (job.status === 'failed') {
+                    setUploadStatus(`Upload Failed: ${job.message}`);
+                    break;
+                }
+                setUploadStatus(job.status === 'queued' ? 'Queued...' : `Importing... ${job.rows_inserted} rows`);
+            }
             fetchStatus();
         } catch (e: any) {
             console.error("Upload Error Details:", e);
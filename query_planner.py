@@ -0,0 +1,318 @@
+"""
+Deterministic answers for common /api/ask questions.
+QueryPlanner matches a question against a small grammar over the aadhaar_data
+columns and compiles it into vectorized pandas code, so totals by state, top
+districts or counts by status are answered in milliseconds without an LLM call.
+A question is only planned when every word in it is understood:
+    [how many | total | number of | count]  metric
+    [top | bottom | which ... most | least ...] [N]  dimension
+    [in <state> | <district> | <status> ...]  (filters on known values)
+e.g. "top 5 districts in Bihar by enrolments", "count by status", "total updates",
+"how many districts in Bihar" (a distinct count).
+States are matched and grouped by official name: any spelling state_utils knows
+("Orissa") filters on its official state ("Odisha").
+Anything else (averages, trends, dates, ...) returns None and goes to the LLM.
+The generated code is what the LLM would have written, so it is shown in the
+response and keys the result cache like any other /api/ask code.
+"""
+import os
+import re
+import threading
+from collections import namedtuple
+import pandas as pd
+from ask_cache import normalize_question
+from state_utils import STATE_INDEX
+
+ASK_PLANNER = os.environ.get('ASK_PLANNER', '1') == '1'
+# Rows returned for "top districts" when the question gives no number
+ASK_PLANNER_DEFAULT_LIMIT = int(os.environ.get('ASK_PLANNER_DEFAULT_LIMIT', 10))
+
+Plan = namedtuple('Plan', ['intent', 'code'])
+
+# Dimensions: (name, pattern); the name is the column, except for 'state' (see _state_source).
+# Sub-district must precede district.
+DIMENSIONS = [
+    ('sub_district', r'sub ?districts?|tehsils?|talukas?'),
+    ('district', r'districts?'),
+    ('state', r'states?'),
+    ('pincode', r'pin ?codes?'),
+    ('status', r'status(?:es)?'),
+    ('gender', r'genders?'),
+    ('enrolment_agency', r'(?:enrol?ment |enroll?ment )?agenc(?:y|ies)'),
+    ('registrar', r'registrars?'),
+]
+
+# Metrics: name -> (pattern, summed columns; None counts rows). Same names and
+# NULL semantics as database.ROLLUP_METRICS: a row missing either side adds nothing.
+METRICS = [
+    ('total_demographic', r'demographic(?: updates?)?', ['demo_age_5_17', 'demo_age_17_']),
+    ('total_biometric', r'biometric(?: updates?)?', ['bio_age_5_17', 'bio_age_17_']),
+    ('total_enrolments', r'enrol?ments?|enroll?ments?|enrolled', ['total_enrolments']),
+    ('total_updates', r'updates?', ['total_updates']),
+    ('record_count', r'records?|rows?|entries|applications?|applicants?', None),
+]
+
+# Columns filtered by the values they contain, after states, in priority order
+# when a value appears in several of them
+FILTER_COLUMNS = ['status', 'gender', 'district', 'sub_district']
+
+# Official state per row, added to the frame when state_canonical alone is not enough
+STATE_COLUMN = 'state_official'
+
+COUNTING = r'how many|how much|number of|count|total|sum'
+# "count by status" groups rows; "how many districts" counts distinct districts
+GROUPING = r'by|per|each|every|wise|across|breakdown|distribution|split|grouped'
+DESCENDING = r'top|highest|most|largest|biggest|maximum|max|leading'
+ASCENDING = r'bottom|lowest|least|fewest|smallest|minimum|min'
+
+STOPWORDS = set("""
+    a all an and any are across at be by do does each every for from get give has have having
+    i in is it its list me of on or over overall per please show so tell the their there
+    to wise what which with were was breakdown broken down grouped split distribution ranked
+    sorted order whose where see
+""".split())
+
+def _words(text):
+    """Casefolded words of text, joined by single spaces ('Delhi_NCR' -> 'delhi ncr')."""
+    return re.sub(r'[\W_]+', ' ', str(text).casefold()).strip()
+
+def _take(pattern, text):
+    """(matches, text with them blanked out) for a whole-word pattern."""
+    regex = re.compile(rf'\b(?:{pattern})\b')
+    return regex.findall(text), regex.sub(' ', text)
+
+# Any grammar phrase, for telling filter values apart from the words of a question
+GRAMMAR = re.compile(r'\b(?:' + '|'.join(
+    [p for _, p in DIMENSIONS] + [p for _, p, _ in METRICS] + [COUNTING, DESCENDING, ASCENDING]
+) + r')\b')
+
+def _is_grammar(phrase):
+    """True if the grammar alone accounts for every word of phrase."""
+    return all(word in STOPWORDS for word in GRAMMAR.sub(' ', phrase).split())
+
+def _state_source(df, stored_states):
+    """
+    (column, preamble code) giving each row's official state:
+        state_canonical as stored at ingest, when it is complete;
+        the stored names with the rows they left empty normalized from `state`;
+        or `state` normalized (nothing stored, or stored_states is off).
+    (None, None) without any state column.
+    """
+    has_raw = 'state' in df.columns
+    if stored_states and 'state_canonical' in df.columns:
+        if not has_raw:
+            return 'state_canonical', None
+        canonical = df['state_canonical']
+        missing = canonical.isna() & df['state'].notna()
+        # Rows loaded while canonicalization was off; UTs / invalid names stay NaN either way
+        gaps = missing.any() and any(STATE_INDEX.get(' '.join(str(v).split()).casefold()) for v in df['state'][missing].unique())
+        if not gaps:
+            return 'state_canonical', None
+        return STATE_COLUMN, (
+            "from state_utils import fill_canonical_states\n"
+            f"df = df.assign({STATE_COLUMN}=fill_canonical_states(df['state_canonical'], df['state']))"
+        )
+    if has_raw:
+        return STATE_COLUMN, (
+            "from state_utils import normalize_state_series\n"
+            f"df = df.assign({STATE_COLUMN}=normalize_state_series(df['state']))"
+        )
+    return None, None
+
+def compile_code(metric, columns, group_by=None, label=None, filters=None, ascending=False, limit=None,
+                 distinct=None, preamble=None):
+    """
+    Pandas code that stores the answer in `result`: a dict for totals, records for groups.
+    distinct: column whose distinct values are counted instead of aggregating a metric.
+    preamble: code run first (e.g. adding the official state column).
+    """
+    lines = [preamble] if preamble else []
+    frame = 'df'
+    if filters:
+        conditions = []
+        for col, values in filters.items():
+            if len(values) == 1:
+                conditions.append(f"(df[{col!r}] == {values[0]!r})")
+            else:
+                conditions.append(f"df[{col!r}].isin({values!r})")
+        lines.append(f"sub = df[{' & '.join(conditions)}]")
+        frame = 'sub'
+
+    if columns is None:
+        values = None
+    elif len(columns) == 1:
+        values = f"{frame}[{columns[0]!r}]"
+    else:
+        values = '(' + ' + '.join(f"{frame}[{c!r}]" for c in columns) + ')'
+
+    if distinct is not None:
+        lines.append(f"result = {{{metric!r}: int({frame}[{distinct!r}].nunique())}}")
+        return '\n'.join(lines)
+    if group_by is None:
+        total = f"len({frame})" if values is None else f"int({values}.sum())"
+        lines.append(f"result = {{{metric!r}: {total}}}")
+        return '\n'.join(lines)
+
+    if values is None:
+        lines.append(f"totals = {frame}.groupby({group_by!r}, observed=True).size()")
+    else:
+        lines.append(f"totals = {values}.groupby({frame}[{group_by!r}], observed=True).sum()")
+    ranked = f"totals.sort_values(ascending={ascending}, kind='stable')"
+    if limit is not None:
+        ranked += f".head({limit})"
+    lines.append(f"totals = {ranked}")
+    lines.append(f"result = totals.rename({metric!r}).rename_axis({label!r}).reset_index().to_dict(orient='records')")
+    return '\n'.join(lines)
+
+def run(plan, df):
+    """Execute a plan's code in-process (it is generated here, not by a model) and return `result`."""
+    local_vars = {'df': df}
+    exec(plan.code, {'pd': pd}, local_vars)
+    return local_vars['result']
+
+class QueryPlanner:
+    """Plans questions against the latest data version; known filter values are indexed once per version."""
+
+    def __init__(self, default_limit=ASK_PLANNER_DEFAULT_LIMIT, stored_states=True):
+        """stored_states: trust state_canonical (database.CANONICAL_STATES_ON_INGEST)."""
+        self.default_limit = default_limit
+        self.stored_states = stored_states
+        self._version = None
+        self._values = None # (regex or None, normalized value -> (filter, value), state column, preamble)
+        self._lock = threading.Lock()
+        self.planned = 0
+        self.unmatched = 0
+
+    def _index_values(self, df):
+        lookup = {}
+        state_column, preamble = _state_source(df, self.stored_states)
+        if state_column is not None:
+            # Every known spelling filters on its official name
+            for spelling, official in STATE_INDEX.items():
+                key = _words(spelling)
+                if official and key and not _is_grammar(key):
+                    lookup.setdefault(key, ('state', official))
+        for col in FILTER_COLUMNS:
+            if col not in df.columns:
+                continue
+            for value in df[col].dropna().unique():
+                key = _words(value)
+                # Values that read like grammar words ('Total', 'Top') would swallow the question
+                if key and key not in lookup and not _is_grammar(key):
+                    lookup[key] = (col, str(value))
+        if not lookup:
+            return None, lookup, state_column, preamble
+        alternatives = '|'.join(re.escape(k) for k in sorted(lookup, key=len, reverse=True))
+        return re.compile(rf'\b(?:{alternatives})\b'), lookup, state_column, preamble
+
+    def _filter_values(self, df, version):
+        with self._lock:
+            if self._values is not None and self._version == version:
+                return self._values
+        values = self._index_values(df)
+        with self._lock:
+            self._version, self._values = version, values
+        return values
+
+    def plan(self, question, df, version):
+        """Plan for the question, or None if it falls outside the grammar."""
+        plan = self._plan(question, df, version)
+        with self._lock:
+            if plan is None:
+                self.unmatched += 1
+            else:
+                self.planned += 1
+        return plan
+
+    def _plan(self, question, df, version):
+        text = f" {_words(normalize_question(question))} "
+
+        filters = {} # filter name ('state' or a FILTER_COLUMNS column) -> values
+        regex, lookup, state_column, preamble = self._filter_values(df, version)
+        if regex is not None:
+            for match in regex.findall(text):
+                name, value = lookup[match]
+                if value not in filters.setdefault(name, []):
+                    filters[name].append(value)
+            text = regex.sub(' ', text)
+        grouped = bool(_take(GROUPING, text)[0])
+
+        dimensions = []
+        singular = False
+        for name, pattern in DIMENSIONS:
+            found, text = _take(pattern, text)
+            if found:
+                dimensions.append(name)
+                singular = not found[0].endswith('s') or found[0] == 'status'
+        metrics = []
+        for name, pattern, columns in METRICS:
+            found, text = _take(pattern, text)
+            if found:
+                metrics.append((name, columns))
+        counted, text = _take(COUNTING, text)
+        descending, text = _take(DESCENDING, text)
+        ascending, text = _take(ASCENDING, text)
+        numbers, text = _take(r'\d+', text)
+
+        # Every remaining word must be filler, and the question must name one thing to aggregate
+        if any(word not in STOPWORDS for word in text.split()):
+            return None
+        if len(dimensions) > 1 or len(metrics) > 1 or len(numbers) > 1:
+            return None
+        if descending and ascending:
+            return None
+        ranked = bool(descending or ascending)
+        if numbers and not (ranked and dimensions):
+            return None
+        if not (dimensions or metrics or counted):
+            return None
+
+        def column(name):
+            return state_column if name == 'state' else (name if name in df.columns else None)
+
+        if metrics:
+            metric, metric_columns = metrics[0]
+        elif ranked:
+            metric, metric_columns = 'total_enrolments', ['total_enrolments'] # Rankings default to enrolments
+        else:
+            metric, metric_columns = 'record_count', None
+        if metric_columns and any(c not in df.columns for c in metric_columns):
+            return None
+
+        group_by = label = limit = distinct = None
+        if dimensions:
+            label = dimensions[0]
+            group_by = column(label)
+            if group_by is None:
+                return None
+            if counted and not (metrics or ranked or grouped):
+                # "how many districts in Bihar": the dimension is what is being counted
+                metric, distinct = f"{label}_count", group_by
+                group_by = None
+            elif numbers:
+                limit = int(numbers[0])
+            elif ranked:
+                # "which state has the most ..." -> one row; "top districts" -> a page
+                limit = 1 if singular else self.default_limit
+        elif ranked:
+            return None
+
+        uses_state = label == 'state' or 'state' in filters
+        code = compile_code(
+            metric, metric_columns, group_by=group_by, label=label,
+            filters={column(name): values for name, values in filters.items()},
+            ascending=bool(ascending), limit=limit, distinct=distinct,
+            preamble=preamble if uses_state else None
+        )
+        intent = {
+            "metric": metric,
+            "group_by": label if group_by else None,
+            "filters": filters,
+            "order": ("asc" if ascending else "desc") if group_by else None,
+            "limit": limit
+        }
+        return Plan(intent, code)
+
+    def stats(self):
+        with self._lock:
+            return {"enabled": ASK_PLANNER, "planned": self.planned, "unmatched": self.unmatched}
@@ -0,0 +1,210 @@
+"""
+Shared response layer for list-shaped API results.
+    - paging: ?offset=&limit= or an opaque ?cursor= (pinned to the data it was issued for)
+    - projection: ?fields=a,b keeps only those keys of each record
+    - formats: json (default) or ndjson, one record per line
+Large JSON bodies are streamed in chunks from a generator instead of being built
+as one string, so memory stays flat and the first bytes leave immediately.
+Everything is encoded by dumps(), which handles NumPy and pandas scalars natively
+and uses orjson when it is installed.
+"""
+import base64
+import datetime
+import decimal
+import hashlib
+import json
+import math
+import os
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bodies with at least this many records are streamed
+RESPONSE_STREAM_MIN_RECORDS = int(os.environ.get('RESPONSE_STREAM_MIN_RECORDS', 1000))
+# Records encoded per streamed chunk
+RESPONSE_CHUNK_RECORDS = int(os.environ.get('RESPONSE_CHUNK_RECORDS', 500))
+
+# paged: the request itself asked for paging (limit, offset or cursor)
+ListParams = namedtuple('ListParams', ['offset', 'limit', 'fields', 'format', 'paged'])
+
+class ResponseError(ValueError):
+    """Invalid paging, projection or format parameter."""
+    status = 400
+
+class StaleCursor(ResponseError):
+    """The cursor was issued for a different version of the data."""
+    status = 409
+
+def default(value):
+    """Encoder fallback for values the JSON encoder does not know."""
+    if isinstance(value, np.generic):
+        value = value.item()
+        return None if isinstance(value, float) and math.isnan(value) else value
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return str(value)
+
+def dumps(obj):
+    """Compact JSON bytes for obj. NaN becomes null, as it is not valid JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_clean(obj), default=default, separators=(',', ':')).encode()
+
+def _clean(obj):
+    # The stdlib encoder writes NaN literally; orjson writes null
+    if isinstance(obj, float) and math.isnan(obj):
+        return None
+    if isinstance(obj, dict):
+        return {k: _clean(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_clean(v) for v in obj]
+    return obj
+
+def respond(body, status=200, headers=None):
+    """Flask response with body encoded by dumps()."""
+    return Response(dumps(body), status=status, headers=headers, mimetype='application/json')
+
+# --- Parameters ---
+
+def _version_tag(version):
+    return hashlib.sha256(repr(version).encode()).hexdigest()[:16]
+
+def encode_cursor(offset, version):
+    """Opaque cursor for the record at offset in the data identified by version."""
+    raw = json.dumps([offset, _version_tag(version)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, version):
+    """Offset a cursor points at. Raises ResponseError, or StaleCursor if the data changed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        offset, tag = json.loads(raw)
+        offset = int(offset)
+    except (ValueError, TypeError):
+        raise ResponseError("cursor is not valid")
+    if tag != _version_tag(version):
+        raise StaleCursor("the data changed since this cursor was issued; start again without a cursor")
+    return max(0, offset)
+
+def _int_param(params, name, default_value):
+    value = params.get(name)
+    if value in (None, ''):
+        return default_value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ResponseError(f"{name} must be an integer")
+
+def list_params(params, version=None, default_limit=None, max_limit=None, formats=('json', 'ndjson')):
+    """
+    ListParams from request args (or a JSON body): offset or cursor, limit, fields, format.
+    formats[0] is the default format. Raises ResponseError.
+    """
+    limit = _int_param(params, 'limit', default_limit)
+    if limit is not None:
+        limit = max(0, limit if max_limit is None else min(limit, max_limit))
+    if params.get('cursor'):
+        offset = decode_cursor(params['cursor'], version)
+    else:
+        offset = max(0, _int_param(params, 'offset', 0))
+
+    fields = params.get('fields')
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+    fields = list(fields) if fields else None
+
+    fmt = params.get('format') or formats[0]
+    if fmt not in formats:
+        raise ResponseError(f"format must be one of {', '.join(formats)}")
+    paged = any(params.get(name) not in (None, '') for name in ('limit', 'offset', 'cursor'))
+    return ListParams(offset, limit, fields, fmt, paged)
+
+# --- Shaping ---
+
+def paginate(records, params):
+    """The page of records selected by params."""
+    end = None if params.limit is None else params.offset + params.limit
+    return records[params.offset:end]
+
+def project(records, fields):
+    """
+    Keep only `fields` of each record (or of a columnar dict). A field is known if any
+    record has it; records without it get None. Raises ResponseError on unknown fields.
+    """
+    if not fields:
+        return records
+    if isinstance(records, dict):
+        available = list(records)
+    else:
+        available = list(dict.fromkeys(k for record in records for k in record)) if len(records) else fields
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise ResponseError(f"unknown fields: {', '.join(unknown)}; available: {', '.join(available)}")
+    if isinstance(records, dict):
+        return {f: records[f] for f in fields}
+    return [{f: record.get(f) for f in fields} for record in records]
+
+# --- Streaming ---
+
+def _chunks(records):
+    for start in range(0, len(records), RESPONSE_CHUNK_RECORDS):
+        yield records[start:start + RESPONSE_CHUNK_RECORDS]
+
+def _ndjson(records):
+    for chunk in _chunks(records):
+        yield b''.join(dumps(record) + b'\n' for record in chunk)
+
+def _json_array(records):
+    yield b'['
+    for i, chunk in enumerate(_chunks(records)):
+        yield (b',' if i else b'') + b','.join(dumps(record) for record in chunk)
+    yield b']'
+
+def _json_envelope(envelope, key, records):
+    # {...envelope, "key": [records]} with the records streamed last
+    head = dumps(envelope)[:-1]
+    yield head + (b',' if len(head) > 1 else b'') + dumps(key) + b':'
+    yield from _json_array(records)
+    yield b'}'
+
+def send_list(page, params, total=None, version=None, envelope=None, key='items'):
+    """
+    Response for one page of records, already paginated and projected.
+    With total (records across all pages) the response carries X-Total-Count and,
+    if more remain, X-Next-Cursor. When the request asked for paging the envelope
+    also gets next_cursor (null on the last page).
+    envelope: dict the records are nested under `key` in; None sends a bare array.
+    ndjson sends the records only, one per line.
+    """
+    headers = {}
+    next_cursor = None
+    if total is not None:
+        headers['X-Total-Count'] = str(total)
+        # A columnar page is a dict of equal-length lists, one per field
+        returned = len(next(iter(page.values()), [])) if isinstance(page, dict) else len(page)
+        end = params.offset + returned
+        if end < total and returned:
+            next_cursor = encode_cursor(end, version)
+            headers['X-Next-Cursor'] = next_cursor
+    if envelope is not None and total is not None and params.paged:
+        envelope = dict(envelope, next_cursor=next_cursor)
+
+    if params.format == 'ndjson':
+        return Response(_ndjson(page), headers=headers, mimetype='application/x-ndjson')
+    if isinstance(page, dict) or len(page) < RESPONSE_STREAM_MIN_RECORDS:
+        body = page if envelope is None else dict(envelope, **{key: page})
+        return respond(body, headers=headers)
+    stream = _json_array(page) if envelope is None else _json_envelope(envelope, key, page)
+    return Response(stream, headers=headers, mimetype='application/json')
@@ -0,0 +1,142 @@
+"""
+Bounded LRU cache for computed analytics results.
+Keys include the data version, so entries for old data are never served and
+simply age out of the LRU order.
+Entries can also expire after `ttl` seconds, and a cache with a `directory` keeps
+each entry in its own JSON file there (string keys and JSON values only) so it
+survives restarts. Entry files are written and deleted by one background thread,
+so set() never waits for the disk and never rewrites the other entries.
+"""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class ResultCache:
+    def __init__(self, maxsize=128, ttl=None, directory=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.directory = directory
+        self._data = OrderedDict() # key -> (value, expires_at epoch seconds or None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._writer = None
+        if directory:
+            # A single worker applies writes and deletions in the order they were made
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-writer')
+            self.load()
+
+    def get(self, key):
+        """Return (found, value) and count the hit or miss."""
+        expired = False
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.time():
+                del self._data[key]
+                entry = None
+                expired = True
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            self.misses += 1
+        if expired and self._writer:
+            self._writer.submit(self._remove_entry, key)
+        return False, None
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False)[0])
+        if self._writer:
+            self._writer.submit(self._write_entry, key, value, expires_at)
+            for old_key in evicted:
+                self._writer.submit(self._remove_entry, old_key)
+
+    def get_or_compute(self, key, compute):
+        """Cached value for key, computing (outside the lock) and storing it on a miss."""
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.json')
+
+    def _write_entry(self, key, value, expires_at):
+        # Atomic per entry: a crash leaves the old file or the new one, never half of either
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump([key, value, expires_at], f)
+            os.replace(tmp_path, self._entry_path(key))
+        except Exception as e:
+            print(f"Could not save cache entry in {self.directory}: {e}")
+
+    def _remove_entry(self, key):
+        try:
+            os.remove(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not remove cache entry in {self.directory}: {e}")
+
+    def flush(self):
+        """Wait until every pending entry write or deletion has reached the disk."""
+        if self._writer:
+            self._writer.submit(lambda: None).result()
+
+    def load(self):
+        """Read the entry files, oldest first, dropping expired ones and any beyond maxsize."""
+        now = time.time()
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    key, value, expires_at = json.load(f)
+                mtime = os.path.getmtime(path)
+            except Exception as e:
+                print(f"Could not load cache entry {path}: {e}")
+                continue
+            if expires_at is not None and expires_at <= now:
+                self._writer.submit(self._remove_entry, key)
+                continue
+            entries.append((mtime, key, value, expires_at))
+        entries.sort(key=lambda e: e[0])
+        surplus = max(0, len(entries) - self.maxsize)
+        for _, key, _, _ in entries[:surplus]:
+            self._writer.submit(self._remove_entry, key)
+        with self._lock:
+            for _, key, value, expires_at in entries[surplus:]:
+                self._data[key] = (value, expires_at)
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._data)
+            self._data.clear()
+        if self._writer:
+            for key in keys:
+                self._writer.submit(self._remove_entry, key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl
+            }
@@ -0,0 +1,96 @@
+"""
+Running per-district enrolment statistics for ingest-time anomaly scoring.
+Each group keeps (n, mean, m2) - count, mean and sum of squared deviations - so a
+new chunk is folded in with the parallel form of Welford's update (Chan et al.)
+without revisiting earlier rows. database.py stores the stats and flags; this
+module only does the arithmetic on DataFrames.
+"""
+import os
+import numpy as np
+import pandas as pd
+from data_schema import parse_dates
+
+# Rows scoring above this z-score against their district's stats are stored in anomaly_flags
+ANOMALY_THRESHOLD = float(os.environ.get('ANOMALY_THRESHOLD', 2.5))
+
+KEY_COLUMN = 'district'
+VALUE_COLUMN = 'total_enrolments'
+STAT_COLUMNS = ['n', 'mean', 'm2']
+
+def _values(df):
+    return pd.Series(
+        pd.to_numeric(df[VALUE_COLUMN], errors='coerce').to_numpy(dtype='float64', na_value=np.nan),
+        index=df.index
+    )
+
+def chunk_stats(df):
+    """(n, mean, m2) per district for one frame; rows without a district or a count are skipped."""
+    if KEY_COLUMN not in df.columns or VALUE_COLUMN not in df.columns:
+        return pd.DataFrame(columns=STAT_COLUMNS)
+    frame = pd.DataFrame({'key': df[KEY_COLUMN].astype(object), 'value': _values(df)}).dropna()
+    grouped = frame.groupby('key', sort=False)['value']
+    stats = grouped.agg(['count', 'mean']).rename(columns={'count': 'n'})
+    stats['m2'] = grouped.var(ddof=0) * stats['n']
+    stats.index.name = KEY_COLUMN
+    return stats[STAT_COLUMNS]
+
+def combine(prior, chunk):
+    """
+    Merge two sets of group statistics (indexed by district).
+    Groups present in only one side are carried over unchanged.
+    """
+    if prior is None or prior.empty:
+        return chunk
+    if chunk is None or chunk.empty:
+        return prior
+    index = prior.index.union(chunk.index)
+    a = prior.reindex(index, fill_value=0.0)
+    b = chunk.reindex(index, fill_value=0.0)
+    n = a['n'] + b['n']
+    delta = b['mean'] - a['mean']
+    out = pd.DataFrame({
+        'n': n,
+        'mean': a['mean'] + delta * b['n'] / n,
+        'm2': a['m2'] + b['m2'] + delta ** 2 * a['n'] * b['n'] / n,
+    })
+    out.index.name = KEY_COLUMN
+    return out
+
+def score(df, stats, threshold=ANOMALY_THRESHOLD):
+    """
+    Flag rows of df whose count is more than `threshold` sample standard deviations
+    above their district's mean in stats. Same rule as UidaiAnalytics.anomaly_frame
+    (a zero deviation counts as 1, single-row districts are never flagged).
+    Returns a frame with district, date, enrolments, z_score, mean, std.
+    """
+    empty = pd.DataFrame(columns=[KEY_COLUMN, 'date', 'enrolments', 'z_score', 'mean', 'std'])
+    if stats is None or stats.empty or KEY_COLUMN not in df.columns or VALUE_COLUMN not in df.columns:
+        return empty
+
+    # One index lookup per distinct district, then plain numpy takes. Position -1
+    # (missing or unknown district) picks the trailing all-NaN column.
+    codes, uniques = pd.factorize(df[KEY_COLUMN])
+    positions = np.append(stats.index.get_indexer(pd.Index(uniques, dtype=object)), -1)
+    table = np.hstack([stats[STAT_COLUMNS].to_numpy(dtype='float64').T, np.full((len(STAT_COLUMNS), 1), np.nan)])
+    n, mean, m2 = table[:, positions[codes]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.where(n > 1, np.sqrt(m2 / (n - 1)), np.nan)
+    std = np.where(std == 0, 1.0, std)
+    z_score = (_values(df).to_numpy() - mean) / std
+
+    hits = np.flatnonzero(z_score > threshold)
+    if not len(hits):
+        return empty
+    rows = df.iloc[hits]
+    if 'date' in rows.columns:
+        dates = parse_dates(rows['date']).dt.strftime('%Y-%m-%d %H:%M:%S').fillna('NaT').to_numpy()
+    else:
+        dates = np.full(len(rows), 'N/A', dtype=object)
+    return pd.DataFrame({
+        KEY_COLUMN: rows[KEY_COLUMN].astype(object).to_numpy(),
+        'date': dates,
+        'enrolments': _values(rows).round().to_numpy(),
+        'z_score': z_score[hits],
+        'mean': mean[hits],
+        'std': std[hits],
+    })
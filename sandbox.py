@@ -0,0 +1,256 @@
+"""
+Sandboxed execution of generated pandas code (/api/ask).
+SandboxPool keeps ASK_WORKERS pre-forked worker processes. Each one inherits the
+data frame at fork time, so the frame is shared copy-on-write rather than copied,
+and runs one snippet at a time against a shallow copy of it, so a snippet's own
+changes never leak into the next one. Limits per query:
+    - ASK_CPU_SECONDS: CPU time (soft RLIMIT_CPU, reported as an error)
+    - ASK_MEMORY_MB: address space the worker may add on top of what it inherited (RLIMIT_AS)
+    - ASK_TIMEOUT_SECONDS: wall clock; the parent kills the worker and forks a fresh one
+Results travel back as compact JSON bytes, at most ASK_MAX_RESULT_BYTES.
+When the data version changes, workers are re-forked from the new frame.
+
+Workers are forked from the API process, so this needs the 'fork' start method
+(Linux/macOS). Elsewhere snippets run inline in the calling thread, without limits.
+
+Forking a threaded process copies every lock in the state it was in, including
+locks that other threads (request handlers, ingest jobs, the result-cache writer)
+held at that moment, and copies the database pool's open sockets. So a worker
+only reads its frame and its pipe: it never prints (snippet output is discarded),
+logs, touches a cache or the job queue, or talks to the database. database.py
+drops the inherited pool in every forked child (engine.dispose(close=False)),
+so even an accidental query would open its own connection.
+"""
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+ASK_WORKERS = int(os.environ.get('ASK_WORKERS', 2))
+ASK_TIMEOUT_SECONDS = float(os.environ.get('ASK_TIMEOUT_SECONDS', 30))
+ASK_CPU_SECONDS = int(os.environ.get('ASK_CPU_SECONDS', 20))
+ASK_MEMORY_MB = int(os.environ.get('ASK_MEMORY_MB', 2048))
+ASK_MAX_RESULT_BYTES = int(os.environ.get('ASK_MAX_RESULT_BYTES', 10 * 1024 * 1024))
+# Scheduling priority offset of the workers, so dashboard requests win the CPU
+ASK_NICE = int(os.environ.get('ASK_NICE', 5))
+
+class SandboxError(Exception):
+    """Base class for failures of a sandboxed query."""
+
+class ExecutionError(SandboxError):
+    """The snippet raised an exception."""
+
+class LimitExceeded(SandboxError):
+    """The snippet ran out of time, CPU or memory, or returned too large a result."""
+
+class PoolBusy(SandboxError):
+    """No worker became free within the wall-clock limit."""
+
+class _CpuLimit(Exception):
+    pass
+
+def _on_cpu_limit(signum, frame):
+    raise _CpuLimit()
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (pd.Timestamp, pd.Period)):
+        return str(value)
+    if value is pd.NA or value is pd.NaT:
+        return None
+    return str(value)
+
+def serialize_result(result):
+    """JSON bytes for a snippet's `result` (DataFrames become records, Series dicts)."""
+    if isinstance(result, pd.DataFrame):
+        result = json.loads(result.to_json(orient='records', date_format='iso'))
+    elif isinstance(result, pd.Series):
+        try:
+            result = json.loads(result.to_json(date_format='iso'))
+        except ValueError: # Non-unique index
+            result = result.to_dict()
+    return json.dumps({"ok": True, "result": result}, default=_json_default, separators=(',', ':')).encode()
+
+def _error(kind, message):
+    return json.dumps({"ok": False, "kind": kind, "error": message}).encode()
+
+def execute(code, df):
+    """Run a snippet against df and return its serialized result. Its stdout and stderr output is discarded."""
+    local_vars = {'df': df.copy(deep=False), 'pd': pd}
+    try:
+        # Safe in a worker: it is single-threaded, so nobody else writes to its stdout/stderr
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            exec(code, {}, local_vars)
+        payload = serialize_result(local_vars.get('result'))
+    except _CpuLimit:
+        return _error('limit', "Query exceeded its CPU time limit.")
+    except MemoryError:
+        return _error('limit', "Query exceeded its memory limit.")
+    except Exception as e:
+        return _error('execution', str(e))
+    if len(payload) > ASK_MAX_RESULT_BYTES:
+        return _error('limit', f"Result is {len(payload)} bytes; the limit is {ASK_MAX_RESULT_BYTES}.")
+    return payload
+
+def _address_space():
+    """Current virtual memory size of this process in bytes (Linux), or None."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+def _cpu_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _worker_main(conn, df, cpu_seconds, memory_mb):
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl-C is for the API process
+    if ASK_NICE:
+        os.nice(ASK_NICE)
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    current = _address_space()
+    if current is not None and memory_mb:
+        limit = current + memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    while True:
+        try:
+            code = conn.recv_bytes().decode()
+        except (EOFError, OSError):
+            break
+        # RLIMIT_CPU counts the whole process, so each query gets a budget on top of what it has used
+        soft = math.ceil(_cpu_used()) + cpu_seconds
+        if cpu_hard != resource.RLIM_INFINITY:
+            soft = min(soft, cpu_hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, cpu_hard))
+        try:
+            payload = execute(code, df)
+        finally:
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_hard, cpu_hard))
+        conn.send_bytes(payload)
+
+class _Worker:
+    def __init__(self, context, df, version, cpu_seconds, memory_mb):
+        self.version = version
+        self.broken = False # Killed or crashed; never handed out again
+        self.conn, child_conn = context.Pipe()
+        # Fork start method: df reaches the child through the fork, not through pickling
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, df, cpu_seconds, memory_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+class SandboxPool:
+    def __init__(self, size=ASK_WORKERS, wall_seconds=ASK_TIMEOUT_SECONDS, cpu_seconds=ASK_CPU_SECONDS, memory_mb=ASK_MEMORY_MB):
+        self.size = size
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.inline = resource is None or 'fork' not in multiprocessing.get_all_start_methods()
+        self._context = None if self.inline else multiprocessing.get_context('fork')
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._df = None
+        self.version = None
+        if self.inline:
+            print("Sandbox: 'fork' is unavailable, /api/ask code runs inline without limits")
+
+    def _spawn(self):
+        return _Worker(self._context, self._df, self.version, self.cpu_seconds, self.memory_mb)
+
+    def prepare(self, df, version):
+        """Fork the workers for this data version (no-op if they already have it)."""
+        with self._lock:
+            if self.version == version and self._df is not None:
+                return
+            self._df, self.version = df, version
+            if self.inline:
+                return
+            # Idle workers hold the old frame; busy ones are retired when they come back
+            while True:
+                try:
+                    self._idle.get_nowait().stop()
+                except queue.Empty:
+                    break
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+
+    def _release(self, worker):
+        with self._lock:
+            if worker.version == self.version and not worker.broken:
+                self._idle.put(worker)
+                return
+            worker.stop()
+            if worker.version == self.version:
+                # Replace a killed worker of the current version
+                self._idle.put(self._spawn())
+
+    def run(self, code, df, version):
+        """
+        Execute a snippet against df (data version `version`) and return its JSON-ready result.
+        Raises ExecutionError, LimitExceeded or PoolBusy.
+        """
+        self.prepare(df, version)
+        if self.inline:
+            response = json.loads(execute(code, df))
+        else:
+            try:
+                worker = self._idle.get(timeout=self.wall_seconds)
+            except queue.Empty:
+                raise PoolBusy(f"All {self.size} query workers are busy; try again later.")
+            if worker.version != self.version:
+                # Raced with a data update: this worker was forked from the previous frame
+                self._release(worker)
+                return self.run(code, df, version)
+
+            try:
+                worker.conn.send_bytes(code.encode())
+                if not worker.conn.poll(self.wall_seconds):
+                    worker.broken = True
+                    raise LimitExceeded(f"Query exceeded the time limit of {self.wall_seconds:g}s.")
+                response = json.loads(worker.conn.recv_bytes())
+            except (EOFError, OSError):
+                # Killed by the kernel (hard memory/CPU limit) or crashed
+                worker.broken = True
+                raise LimitExceeded("Query worker died while running the query.")
+            finally:
+                self._release(worker)
+
+        if response['ok']:
+            return response['result']
+        if response['kind'] == 'limit':
+            raise LimitExceeded(response['error'])
+        raise ExecutionError(response['error'])
+
+    def close(self):
+        with self._lock:
+            self.version = None
+            while True:
+                try:
+                    self._idle.get_nowait().stop()
+                except queue.Empty:
+                    break
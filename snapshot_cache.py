@@ -0,0 +1,105 @@
+"""
+Columnar on-disk snapshot of aadhaar_data for fast worker cold starts.
+The table is written as an uncompressed Feather (Arrow IPC) file after ingestion
+and memory-mapped on startup instead of pulling every row through SQLAlchemy.
+Each snapshot carries a fingerprint of the uploaded_files contents, so it is
+ignored as soon as a new file is loaded.
+Requires pyarrow; without it every function degrades to a no-op.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import database
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'data_cache')
+SNAPSHOT_PATH = os.path.join(SNAPSHOT_DIR, 'aadhaar_data.feather')
+
+def is_available():
+    return feather is not None
+
+def _meta_path(path):
+    return path + '.json'
+
+def current_fingerprint():
+    """Hash of the loaded-file manifest, the id watermark and the table's columns."""
+    manifest = database.get_uploaded_manifest()
+    columns = [c.name for c in database.aadhaar_data.columns] # A new column invalidates old snapshots
+    payload = json.dumps({"files": manifest, "max_id": database.get_max_id(), "columns": columns}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def read_meta(path=SNAPSHOT_PATH):
+    try:
+        with open(_meta_path(path), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_snapshot(df, fingerprint=None, watermark=None, path=SNAPSHOT_PATH):
+    """Atomically write df and its metadata. Returns True on success."""
+    if feather is None or df is None:
+        return False
+    fingerprint = fingerprint or current_fingerprint()
+    if watermark is None:
+        watermark = int(df['id'].max()) if 'id' in df.columns and len(df) else 0
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = None
+    try:
+        # Write to a temp file first so readers never see a half-written snapshot
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        feather.write_feather(df.reset_index(drop=True), tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+
+        meta = {"fingerprint": fingerprint, "watermark": watermark, "rows": len(df)}
+        fd, tmp_meta = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, _meta_path(path))
+        print(f"Snapshot written: {len(df)} records -> {path}")
+        return True
+    except Exception as e:
+        print(f"Error writing snapshot: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """Memory-map a snapshot file into a DataFrame (no fingerprint check)."""
+    if feather is None or not os.path.exists(path):
+        return None
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+def load_if_fresh(path=SNAPSHOT_PATH):
+    """
+    Return (df, meta) when the snapshot matches the current database contents,
+    otherwise None.
+    """
+    if feather is None:
+        return None
+    meta = read_meta(path)
+    if not meta or meta.get('fingerprint') != current_fingerprint():
+        return None
+    try:
+        df = read_snapshot(path)
+    except Exception as e:
+        print(f"Error reading snapshot: {e}")
+        return None
+    if df is None:
+        return None
+    return df, meta
+
+def write_from_database(path=SNAPSHOT_PATH):
+    """Rebuild the snapshot straight from the database (e.g. after a bulk load)."""
+    if feather is None:
+        return False
+    fingerprint = current_fingerprint()
+    # Read from the primary: a lagging replica would not match the fingerprint
+    return write_snapshot(database.get_all_data(bind=database.engine), fingerprint=fingerprint, path=path)
@@ -0,0 +1,92 @@
+"""
+SQL execution mode for the analytics engine (ANALYTICS_BACKEND=sql).
+SqlAnalytics answers the aggregate endpoints with SQLAlchemy Core GROUP BY queries
+against aadhaar_rollup, so an API worker never loads aadhaar_data into pandas;
+only the small aggregated result (states x dates, top districts) comes back.
+Anomalies are served from the flags stored at ingest (see running_stats).
+Works on SQLite and PostgreSQL alike: the database groups by the raw date string,
+and the few distinct dates per state are bucketed afterwards with the same parser
+as pandas mode, so dd-mm-yyyy and yyyy-mm-dd rows land in the same buckets.
+"""
+import pandas as pd
+from sqlalchemy import select, func, cast, BigInteger
+import database
+from analytics_pipeline import UidaiAnalytics, format_state_trends, anomaly_records
+from state_utils import normalize_state_series
+from data_schema import parse_dates
+
+PERIOD_FREQS = {'daily': 'D', 'monthly': 'M', 'yearly': 'Y'}
+
+def _total(column):
+    # SUM of BIGINT is NUMERIC on PostgreSQL; cast back so pandas gets plain integers
+    return cast(func.coalesce(func.sum(column), 0), BigInteger)
+
+class SqlAnalytics(UidaiAnalytics):
+    """UidaiAnalytics whose aggregate methods run in the database instead of on master_df."""
+
+    def __init__(self, upload_folder='data_uploads', engine=None):
+        super().__init__(upload_folder)
+        self.engine = engine or database.read_engine
+
+    def load_datasets(self, df=None, snapshot_path=None, version=None):
+        # Nothing to prepare: every query reads the database directly
+        return True
+
+    def get_state_trends(self, period='monthly'):
+        """Same response as UidaiAnalytics.get_state_trends, aggregated by the database."""
+        rollup = database.aadhaar_rollup
+        query = (
+            select(
+                rollup.c.state,
+                rollup.c.date,
+                _total(rollup.c.total_enrolments).label('enrolments'),
+                _total(rollup.c.total_updates).label('updates'),
+                _total(rollup.c.total_demographic).label('demographic'),
+                _total(rollup.c.total_biometric).label('biometric'),
+            )
+            .where(rollup.c.state != '', rollup.c.date != '')
+            .group_by(rollup.c.state, rollup.c.date)
+        )
+        with self.engine.connect() as conn:
+            rows = pd.read_sql_query(query, conn)
+        if rows.empty:
+            return []
+
+        # At most (raw states x distinct dates) rows: normalize and bucket them here,
+        # then merge spellings of the same state and dates of the same period
+        freq = PERIOD_FREQS.get(period, 'M')
+        rows['state'] = normalize_state_series(rows['state'])
+        rows['TimeKey'] = parse_dates(rows.pop('date')).dt.to_period(freq)
+        grouped = rows.groupby(['state', 'TimeKey'], observed=True, sort=True).sum()
+        grouped.index = grouped.index.set_levels(grouped.index.levels[1].astype(str), level='TimeKey')
+        return format_state_trends(grouped)
+
+    def analyze_societal_trends(self):
+        """Same insights as UidaiAnalytics.analyze_societal_trends, aggregated by the database."""
+        insights = {
+            "migration_hubs": [],
+            "saturation_gaps": [],
+            "demographic_shift": None
+        }
+
+        # aadhaar_data has no age_group column, so (as in pandas mode) every row counts
+        # as 18+ and there is no 0-5 slice for saturation gaps
+        rollup = database.aadhaar_rollup
+        total = _total(rollup.c.total_updates).label('total_updates')
+        query = (
+            select(rollup.c.district, total)
+            .where(rollup.c.district != '')
+            .group_by(rollup.c.district)
+            .order_by(total.desc(), rollup.c.district)
+            .limit(5)
+        )
+        with self.engine.connect() as conn:
+            insights['migration_hubs'] = [dict(r._mapping) for r in conn.execute(query)]
+        return insights
+
+    def detect_anomalies(self, df=None, threshold=2.5, level='district', limit=None, offset=0):
+        """Stored ingest-time flags (district level only)."""
+        if level != 'district':
+            return []
+        _, flags = database.get_anomaly_flags(threshold=threshold, limit=limit, offset=offset)
+        return anomaly_records(flags)
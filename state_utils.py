@@ -2,6 +2,8 @@
 State normalization utilities for UIDAI Analytics
 Maps various state name variations to official 29 states of India
 """
+import numpy as np
+import pandas as pd
 
 # Official 29 states of India (as of 2024)
 OFFICIAL_STATES = [
@@ -106,6 +108,18 @@ STATE_NORMALIZATION_MAP = {
     '100000': None,
 }
 
+def _fold(name):
+    """Case- and whitespace-insensitive lookup key ('  WEST   bengal ' -> 'west bengal')."""
+    return ' '.join(name.split()).casefold()
+
+# Folded spelling -> official name (None for Union Territories / invalid entries).
+# Built once, so a lookup is a single dict access instead of a scan of OFFICIAL_STATES.
+STATE_INDEX = {_fold(name): canonical for name, canonical in STATE_NORMALIZATION_MAP.items()}
+STATE_INDEX.update({_fold(name): name for name in OFFICIAL_STATES})
+
+# Category order of normalized state columns (alphabetical, like grouping on plain strings)
+STATE_CATEGORIES = sorted(OFFICIAL_STATES)
+
 def normalize_state_name(state_name):
     """
     Normalize state name to official format
@@ -113,27 +127,44 @@ def normalize_state_name(state_name):
     """
     if not state_name or not isinstance(state_name, str):
         return None
-    
-    # Check if already in official list
-    if state_name in OFFICIAL_STATES:
-        return state_name
-    
-    # Check normalization map
-    if state_name in STATE_NORMALIZATION_MAP:
-        return STATE_NORMALIZATION_MAP[state_name]
-    
-    # If not found, return None (will be filtered out)
-    return None
+    return STATE_INDEX.get(_fold(state_name))
+
+def normalize_state_series(series):
+    """
+    Vectorized normalize_state_name: each distinct value is looked up once and the
+    result is spread back over the rows through its integer codes.
+    Returns a categorical Series (categories STATE_CATEGORIES) with NaN for
+    Union Territories and invalid entries.
+    """
+    codes, uniques = pd.factorize(series)
+    lookup = {name: i for i, name in enumerate(STATE_CATEGORIES)}
+    mapped = np.array([lookup.get(normalize_state_name(u), -1) for u in uniques] + [-1], dtype=np.int8)
+    # codes are -1 for missing values, which picks the trailing -1 above
+    state_codes = mapped[codes]
+    return pd.Series(
+        pd.Categorical.from_codes(state_codes, categories=STATE_CATEGORIES),
+        index=series.index, name=series.name
+    )
+
+def fill_canonical_states(canonical, raw):
+    """
+    Official state per row from a stored canonical column (e.g. state_canonical),
+    with the rows it left empty (loaded while canonicalization was off) normalized
+    from the raw names. Same categories as normalize_state_series.
+    """
+    missing = canonical.isna() & raw.notna()
+    states = canonical.astype(pd.CategoricalDtype(STATE_CATEGORIES))
+    if not missing.any():
+        return states
+    return states.where(~missing, normalize_state_series(raw[missing]))
 
 def get_official_states_only(df):
     """
     Filter dataframe to only include official 29 states
     """
-    df = df.copy()
-    df['normalized_state'] = df['state'].apply(normalize_state_name)
-    # Filter out None values (UTs and invalid entries)
-    df = df[df['normalized_state'].notna()]
-    # Replace original state column
-    df['state'] = df['normalized_state']
-    df = df.drop(columns=['normalized_state'])
+    states = normalize_state_series(df['state'])
+    mask = states.notna()
+    # Boolean indexing already returns a new frame, so no upfront copy is needed
+    df = df[mask]
+    df['state'] = states[mask]
     return df
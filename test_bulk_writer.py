@@ -0,0 +1,113 @@
+"""
+Checks for the dialect-native bulk writers against an in-memory SQLite database
+(the PostgreSQL COPY path against a recording cursor), no server needed:
+    python test_bulk_writer.py      (or: pytest test_bulk_writer.py)
+"""
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Float, Date, DateTime, text
+import bulk_writer
+
+metadata = MetaData()
+
+def _table(name):
+    return Table(
+        name, metadata,
+        Column('id', Integer, primary_key=True),
+        Column('state', String),
+        Column('pincode', String),
+        Column('total_enrolments', Integer),
+        Column('ratio', Float),
+        Column('date_value', Date),
+        Column('timestamp', DateTime),
+    )
+
+records = _table('records')
+baseline = _table('baseline')
+
+def _frame():
+    return pd.DataFrame({
+        'state': ['Bihar', None, 'Kerala'],
+        'pincode': [800001.0, np.nan, 691001.0], # Float from a CSV column with gaps
+        'total_enrolments': [280.0, np.nan, 3.0],
+        'ratio': [0.5, np.nan, 1.25],
+        'date_value': pd.to_datetime(['2025-01-15', None, '2025-03-03']),
+        'timestamp': pd.to_datetime(['2025-01-15 10:00:00', '2025-01-16 11:30:00', None]),
+        'not_a_column': [1, 2, 3],
+    })
+
+def _engine():
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    return engine
+
+def _rows(conn, table):
+    return conn.execute(text(
+        f"SELECT state, pincode, total_enrolments, ratio, date_value, timestamp FROM {table} ORDER BY id"
+    )).fetchall()
+
+def test_sqlite_writer_matches_to_sql():
+    engine = _engine()
+    with engine.begin() as conn:
+        assert bulk_writer.bulk_insert(conn, records, _frame()) == 3
+        bulk_writer.pandas_writer(conn, baseline, bulk_writer.prepare_frame(_frame(), baseline))
+        written, expected = _rows(conn, 'records'), _rows(conn, 'baseline')
+    assert written == expected
+    assert written[0][:4] == ('Bihar', '800001', 280, 0.5)
+    assert written[1][:4] == (None, None, None, None)
+    assert written[0][4] == '2025-01-15'
+
+def test_sqlite_writer_batches_and_uses_the_callers_transaction():
+    engine = _engine()
+    df = pd.DataFrame({'state': [f's{i}' for i in range(25)], 'total_enrolments': range(25)})
+    saved = bulk_writer.BATCH_SIZE
+    bulk_writer.BATCH_SIZE = 10
+    try:
+        with engine.connect() as conn:
+            assert bulk_writer.bulk_insert(conn, records, df) == 25
+            assert conn.execute(text("SELECT COUNT(*), SUM(total_enrolments) FROM records")).first() == (25, 300)
+            conn.rollback()
+            assert conn.execute(text("SELECT COUNT(*) FROM records")).scalar() == 0
+    finally:
+        bulk_writer.BATCH_SIZE = saved
+
+def test_columns_restrict_the_write_and_empty_frames_write_nothing():
+    engine = _engine()
+    with engine.begin() as conn:
+        assert bulk_writer.bulk_insert(conn, records, _frame(), columns=['state', 'total_enrolments']) == 3
+        assert conn.execute(text("SELECT COUNT(pincode), COUNT(state) FROM records")).first() == (0, 2)
+        assert bulk_writer.bulk_insert(conn, records, _frame().iloc[:0]) == 0
+
+class _CopyCursor:
+    """psycopg2-style cursor that records what COPY would read."""
+    def __init__(self):
+        self.statements = []
+    def copy_expert(self, statement, buffer):
+        self.statements.append((statement, buffer.read()))
+    def close(self):
+        pass
+
+def test_postgres_copy_writer_sends_csv_batches():
+    cursor = _CopyCursor()
+    conn = SimpleNamespace(connection=SimpleNamespace(cursor=lambda: cursor))
+    df = bulk_writer.prepare_frame(_frame(), records)
+    saved = bulk_writer.BATCH_SIZE
+    bulk_writer.BATCH_SIZE = 2
+    try:
+        assert bulk_writer.postgres_copy_writer(conn, records, df) == 3
+    finally:
+        bulk_writer.BATCH_SIZE = saved
+    assert len(cursor.statements) == 2
+    statement, first = cursor.statements[0]
+    assert statement.startswith('COPY "records" ("state", "pincode", "total_enrolments"')
+    assert first.splitlines()[0].startswith('Bihar,800001,280,0.5,2025-01-15,2025-01-15 10:00:00')
+    # Missing values are empty fields, which COPY reads as NULL
+    assert first.splitlines()[1].startswith(',,,,,')
+
+if __name__ == "__main__":
+    test_sqlite_writer_matches_to_sql()
+    test_sqlite_writer_batches_and_uses_the_callers_transaction()
+    test_columns_restrict_the_write_and_empty_frames_write_nothing()
+    test_postgres_copy_writer_sends_csv_batches()
+    print("Bulk writer checks passed.")
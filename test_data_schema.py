@@ -0,0 +1,42 @@
+"""
+Checks for the compact in-memory schema, no server or database needed:
+    python test_data_schema.py      (or: pytest test_data_schema.py)
+"""
+import pandas as pd
+import data_schema
+import responses
+
+def test_parse_dates_all_missing():
+    series = pd.Series([None, None], dtype=object, index=[5, 7], name='date')
+    parsed = data_schema.parse_dates(series)
+    assert parsed.dtype == 'datetime64[ns]'
+    assert parsed.index.tolist() == [5, 7]
+    assert parsed.name == 'date'
+    assert parsed.isna().all()
+    assert data_schema.parse_dates(series.iloc[:0]).empty
+
+def test_parse_dates_mixed_formats_and_missing():
+    series = pd.Series(['15-01-2025', None, '2025-02-20', '15-01-2025', 'not a date'], dtype=object)
+    parsed = data_schema.parse_dates(series)
+    assert parsed.dtype == 'datetime64[ns]'
+    assert parsed.tolist()[0] == pd.Timestamp('2025-01-15')
+    assert parsed.tolist()[2] == pd.Timestamp('2025-02-20')
+    assert parsed.tolist()[3] == pd.Timestamp('2025-01-15')
+    assert parsed.isna().tolist() == [False, True, False, False, True]
+
+def test_nullable_counts_sum_exactly():
+    big = 2 ** 24 + 1 # Not representable in float32
+    df = data_schema.apply_schema(pd.DataFrame({'total_enrolments': [big, 1, None], 'total_updates': [1, 2, 3]}))
+    assert str(df['total_enrolments'].dtype) == 'Int32'
+    assert str(df['total_updates'].dtype) == 'int32'
+    assert df['total_enrolments'].sum() == big + 1
+    assert df['total_enrolments'].to_numpy(dtype='float64', na_value=float('nan')).tolist()[:2] == [big, 1.0]
+    missing = df['total_enrolments'].tolist()[2]
+    assert missing is pd.NA
+    assert responses.dumps({'total_enrolments': missing}) == b'{"total_enrolments":null}'
+
+if __name__ == "__main__":
+    test_parse_dates_all_missing()
+    test_parse_dates_mixed_formats_and_missing()
+    test_nullable_counts_sum_exactly()
+    print("Schema checks passed.")
@@ -0,0 +1,75 @@
+"""
+EXPLAIN checks for the aadhaar_data indexes and the schema upgrade.
+Runs against a throwaway SQLite database, no server needed:
+    python test_indexes.py      (or: pytest test_indexes.py)
+"""
+import os
+import tempfile
+
+# Point database.py at a scratch file before it creates its engine
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'explain_check.db')
+
+import pandas as pd
+from sqlalchemy import text
+import database
+
+# query -> index the planner is expected to use
+INDEXED_QUERIES = {
+    "SELECT SUM(total_enrolments) FROM aadhaar_data WHERE state = 'Bihar' AND date_value >= '2025-01-01'":
+        'ix_aadhaar_data_state_date',
+    "SELECT SUM(total_updates) FROM aadhaar_data WHERE district = 'Patna' AND date_value BETWEEN '2025-01-01' AND '2025-03-31'":
+        'ix_aadhaar_data_district_date',
+    "SELECT COUNT(*) FROM aadhaar_data WHERE date_value >= '2025-03-01'":
+        'ix_aadhaar_data_date_value',
+    "SELECT COUNT(*) FROM aadhaar_data WHERE status = 'Generated'":
+        'ix_aadhaar_data_status',
+    "SELECT * FROM aadhaar_data WHERE pincode = '800001'":
+        'ix_aadhaar_data_pincode',
+}
+
+def _setup():
+    database.init_db()
+    with database.engine.begin() as conn:
+        if conn.execute(text("SELECT COUNT(*) FROM aadhaar_data")).scalar():
+            return
+        # Rows as an older version wrote them: no date_value
+        conn.execute(text(
+            "INSERT INTO aadhaar_data (state, district, pincode, status, date, total_enrolments, total_updates) VALUES "
+            "('Bihar', 'Patna', '800001', 'Generated', '15-01-2025', 10, 2), "
+            "('Bihar', 'Gaya', '823001', 'Hold', '2025-02-20', 5, 1), "
+            "('Kerala', 'Kollam', '691001', 'Generated', '03-03-2025', 7, 0)"
+        ))
+
+def _plan(conn, query):
+    return ' | '.join(str(row[-1]) for row in conn.execute(text(f"EXPLAIN QUERY PLAN {query}")))
+
+def test_queries_use_indexes():
+    _setup()
+    with database.engine.connect() as conn:
+        for query, index in INDEXED_QUERIES.items():
+            plan = _plan(conn, query)
+            assert index in plan, f"{index} not used: {plan}"
+
+def test_upgrade_is_idempotent():
+    _setup()
+    database.upgrade()
+    database.upgrade()
+    with database.engine.connect() as conn:
+        names = {ix['name'] for ix in database.inspect(conn).get_indexes('aadhaar_data')}
+        dates = pd.read_sql_query("SELECT date, date_value FROM aadhaar_data ORDER BY id", conn)
+    assert {ix.name for ix in database.aadhaar_data.indexes} <= names
+    assert dates['date_value'].tolist() == ['2025-01-15', '2025-02-20', '2025-03-03']
+
+def test_deferred_indexes_kept_on_a_table_with_rows():
+    _setup()
+    expected = {ix.name for ix in database.aadhaar_data.indexes}
+    with database.deferred_indexes():
+        with database.engine.connect() as conn:
+            names = {ix['name'] for ix in database.inspect(conn).get_indexes('aadhaar_data')}
+        assert expected <= names
+
+if __name__ == "__main__":
+    test_queries_use_indexes()
+    test_upgrade_is_idempotent()
+    test_deferred_indexes_kept_on_a_table_with_rows()
+    print("Index checks passed.")
@@ -0,0 +1,186 @@
+"""
+Checks for streamed, resumable ingestion and its enrichment.
+Each test loads into its own throwaway SQLite database, no server needed:
+    python test_ingest.py      (or: pytest test_ingest.py)
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Point database.py at a scratch file before it creates its engine
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'ingest_check.db'))
+os.environ.setdefault('JOBS_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'jobs_check.db'))
+
+import threading
+import time
+import pandas as pd
+import database
+import enrichment
+import ingest
+import ingest_jobs
+
+ROWS = 25
+CHUNK_SIZE = 10 # Three chunks: 10, 10, 5
+
+@contextmanager
+def _scratch_database():
+    """Swap database.py's engines for an empty SQLite file for the duration of a test."""
+    saved = database.engine, database.read_engine
+    database.engine = database.read_engine = database.make_engine('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'scratch.db'))
+    try:
+        database.init_db()
+        yield
+    finally:
+        database.engine.dispose()
+        database.engine, database.read_engine = saved
+
+def _write_csv(directory, name='upload.csv'):
+    # No status, gender or counts: the Enricher draws them
+    path = os.path.join(directory, name)
+    pd.DataFrame({
+        'state': ['Bihar', 'Kerala', 'Odisha', 'Goa', 'Assam'] * (ROWS // 5),
+        'district': [f'District {i}' for i in range(ROWS)],
+        'pincode': [str(800000 + i) for i in range(ROWS)],
+        'date': ['15-01-2025'] * ROWS,
+    }).to_csv(path, index=False)
+    return path
+
+def _loaded_rows():
+    with database.engine.connect() as conn:
+        return pd.read_sql_query(
+            "SELECT district, status, gender, total_enrolments, total_updates FROM aadhaar_data ORDER BY district", conn
+        )
+
+def _quiet(chunk_index, chunk_rows, total_rows):
+    pass
+
+def _load(path, stop_after=None, seed=42):
+    """stream_file with a seeded Enricher; stop_after=n fails the load once n chunks are committed."""
+    def progress(chunk_index, chunk_rows, total_rows):
+        if stop_after is not None and chunk_index + 1 >= stop_after:
+            raise RuntimeError("interrupted")
+    return ingest.stream_file(path, chunk_size=CHUNK_SIZE, transform=enrichment.Enricher(seed), on_progress=progress)
+
+def test_read_chunks_is_bounded_for_csv_and_xlsx():
+    directory = tempfile.mkdtemp()
+    csv_path = _write_csv(directory)
+    xlsx_path = os.path.join(directory, 'upload.xlsx')
+    pd.read_csv(csv_path, dtype=str).to_excel(xlsx_path, index=False)
+    for path in (csv_path, xlsx_path):
+        chunks = list(ingest.read_chunks(path, chunk_size=CHUNK_SIZE))
+        assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+        assert list(chunks[0].columns) == ['state', 'district', 'pincode', 'date']
+        assert pd.concat(chunks)['district'].tolist() == [f'District {i}' for i in range(ROWS)]
+
+    empty = os.path.join(directory, 'empty.xlsx')
+    pd.DataFrame().to_excel(empty, index=False)
+    assert list(ingest.read_chunks(empty, chunk_size=CHUNK_SIZE)) == []
+
+def test_resumed_load_matches_a_clean_one():
+    path = _write_csv(tempfile.mkdtemp())
+    with _scratch_database():
+        assert _load(path)[0]
+        clean = _loaded_rows()
+
+    with _scratch_database():
+        success, message = _load(path, stop_after=1)
+        assert not success and 'interrupted' in message
+        assert list(database.get_committed_chunks(ingest.file_digest(path))) == [0]
+        assert _load(path)[0]
+        resumed = _loaded_rows()
+
+    assert len(clean) == ROWS
+    pd.testing.assert_frame_equal(clean, resumed)
+
+def test_enricher_chunks_depend_only_on_seed_digest_and_index():
+    frame = pd.DataFrame({'district': ['Patna'] * 5})
+    enricher = enrichment.Enricher(7)
+    first = enricher.for_chunk('ab' * 32, 1)(frame.copy())
+    enricher.for_chunk('ab' * 32, 0)(frame.copy())
+    again = enricher.for_chunk('ab' * 32, 1)(frame.copy())
+    other = enricher.for_chunk('ab' * 32, 2)(frame.copy())
+    pd.testing.assert_frame_equal(first, again)
+    assert first['eid'].tolist() != other['eid'].tolist()
+    # Unseeded Enrichers keep one unpredictable Generator
+    unseeded = enrichment.Enricher(None)
+    assert unseeded.for_chunk('ab' * 32, 0) is unseeded
+
+def _wait(job_id):
+    while ingest_jobs.get_job(job_id)['status'] in ('queued', 'running'):
+        time.sleep(0.02)
+    return ingest_jobs.get_job(job_id)
+
+def test_upload_job_enriches_like_a_direct_load():
+    path = _write_csv(tempfile.mkdtemp())
+    with _scratch_database():
+        assert _load(path)[0]
+        direct = _loaded_rows()
+
+    with _scratch_database():
+        queue = ingest_jobs.JobQueue(workers=1)
+        job = _wait(queue.submit(path, 'upload.csv', chunk_size=CHUNK_SIZE, transform=enrichment.Enricher(42)))
+        assert job['status'] == 'succeeded'
+        assert job['rows_inserted'] == ROWS
+        pd.testing.assert_frame_equal(direct, _loaded_rows())
+
+def _raises(exception, call, *args):
+    try:
+        call(*args)
+    except exception as e:
+        return e
+    raise AssertionError(f"{call.__name__}{args!r} did not raise {exception.__name__}")
+
+def test_a_file_being_imported_cannot_be_uploaded_again():
+    path = _write_csv(tempfile.mkdtemp())
+    queue = ingest_jobs.JobQueue(workers=1, max_pending=1)
+    started, finish = threading.Event(), threading.Event()
+    with _scratch_database():
+        queue.reserve('upload.csv')
+        assert _raises(ingest_jobs.FileBusy, queue.reserve, 'upload.csv').job_id is None
+        queue.release('upload.csv')
+        queue.reserve('upload.csv')
+
+        # submit() takes the reservation over; the job holds the name until it ends
+        job_id = queue.submit(path, 'upload.csv', on_success=lambda: started.set() or finish.wait(10))
+        assert started.wait(10)
+        assert _raises(ingest_jobs.FileBusy, queue.reserve, 'upload.csv').job_id == job_id
+        queue.release('upload.csv') # Does not drop a running job's claim
+        assert _raises(ingest_jobs.FileBusy, queue.submit, path, 'upload.csv').job_id == job_id
+        _raises(ingest_jobs.QueueFull, queue.submit, path, 'other.csv')
+        assert queue.stats()['files'] == ['upload.csv']
+
+        finish.set()
+        assert _wait(job_id)['status'] == 'succeeded'
+        while queue.stats()['pending']:
+            time.sleep(0.02)
+        queue.reserve('upload.csv')
+        queue.release('upload.csv')
+        assert queue.stats() == {'workers': 1, 'pending': 0, 'files': []}
+
+def test_identical_content_is_skipped():
+    directory = tempfile.mkdtemp()
+    path = _write_csv(directory)
+    with _scratch_database():
+        assert ingest.stream_file(path, chunk_size=CHUNK_SIZE, transform=enrichment.Enricher(1), on_progress=_quiet)[0]
+        # Same bytes under another name: skipped before parsing
+        copy = os.path.join(directory, 'copy.csv')
+        with open(path, 'rb') as src, open(copy, 'wb') as dst:
+            dst.write(src.read())
+        success, message = ingest.stream_file(copy, on_progress=_quiet)
+        assert not success and 'upload.csv' in message
+        assert len(_loaded_rows()) == ROWS
+
+        # As an upload job: reported as skipped, not failed, and the redundant copy is removed
+        job = _wait(ingest_jobs.JobQueue(workers=1).submit(copy, 'copy.csv'))
+        assert job['status'] == 'skipped' and 'upload.csv' in job['message']
+        assert not os.path.exists(copy) and os.path.exists(path)
+        assert len(_loaded_rows()) == ROWS
+
+if __name__ == "__main__":
+    test_read_chunks_is_bounded_for_csv_and_xlsx()
+    test_resumed_load_matches_a_clean_one()
+    test_enricher_chunks_depend_only_on_seed_digest_and_index()
+    test_upload_job_enriches_like_a_direct_load()
+    test_a_file_being_imported_cannot_be_uploaded_again()
+    test_identical_content_is_skipped()
+    print("Ingest checks passed.")
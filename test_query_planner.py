@@ -0,0 +1,92 @@
+"""
+Checks for the /api/ask query planner against a small in-memory frame, no server
+or database needed:
+    python test_query_planner.py      (or: pytest test_query_planner.py)
+"""
+import pandas as pd
+import query_planner
+
+ROWS = [
+    # state, state_canonical, district, status, total_enrolments, total_updates
+    ('Bihar', 'Bihar', 'Patna', 'Generated', 10, 1),
+    ('Bihar', 'Bihar', 'Gaya', 'Hold', 5, 2),
+    ('Bihar', None, 'Muzaffarpur', 'Generated', 4, 0), # Loaded while canonicalization was off
+    ('Orissa', 'Odisha', 'Khurda', 'Generated', 7, 1),
+    ('Odisha', 'Odisha', 'Cuttack', 'Rejected', 3, 0),
+    ('Delhi', None, 'New Delhi', 'Generated', 6, 0), # Union Territory: no official state
+    ('Kerala', 'Kerala', 'Kollam', 'Rejected', 2, 3),
+]
+
+def _frame():
+    df = pd.DataFrame(ROWS, columns=['state', 'state_canonical', 'district', 'status', 'total_enrolments', 'total_updates'])
+    for col in ['state', 'state_canonical', 'district', 'status']:
+        df[col] = df[col].astype('category')
+    return df
+
+def _ask(question, planner=None, df=None):
+    """(plan, result) for a question, or (None, None) when the planner leaves it to the LLM."""
+    df = _frame() if df is None else df
+    plan = (planner or query_planner.QueryPlanner()).plan(question, df, 1)
+    return plan, (query_planner.run(plan, df) if plan is not None else None)
+
+def test_counting_a_dimension_counts_distinct_values():
+    assert _ask("How many districts in Bihar?")[1] == {'district_count': 3}
+    assert _ask("how many states are there")[1] == {'state_count': 3}
+    assert _ask("number of districts")[1] == {'district_count': 7}
+    # With a grouping word it is still a count of rows per group
+    plan, result = _ask("count by status")
+    assert plan.intent['group_by'] == 'status'
+    assert result[0] == {'status': 'Generated', 'record_count': 4}
+
+def test_state_spellings_filter_on_the_official_state():
+    assert _ask("total enrolments in Orissa")[1] == {'total_enrolments': 10}
+    assert _ask("total enrolments in odisha")[1] == {'total_enrolments': 10}
+
+def test_rows_without_state_canonical_are_kept():
+    assert _ask("total enrolments in Bihar")[1] == {'total_enrolments': 19}
+    plan, result = _ask("which state has the most enrolments")
+    assert result == [{'state': 'Bihar', 'total_enrolments': 19}]
+    # Complete canonical column: grouped directly, without normalizing
+    complete = _frame().dropna(subset=['state_canonical'])
+    plan, result = _ask("enrolments by state", df=complete)
+    assert 'fill_canonical_states' not in plan.code
+    assert result[0] == {'state': 'Bihar', 'total_enrolments': 15}
+
+def test_states_are_normalized_when_not_stored_at_ingest():
+    planner = query_planner.QueryPlanner(stored_states=False)
+    plan, result = _ask("enrolments by state", planner=planner)
+    assert 'normalize_state_series' in plan.code
+    assert result == [
+        {'state': 'Bihar', 'total_enrolments': 19},
+        {'state': 'Odisha', 'total_enrolments': 10},
+        {'state': 'Kerala', 'total_enrolments': 2},
+    ]
+
+def test_rankings_respect_the_limit():
+    assert _ask("top 0 districts")[1] == []
+    result = _ask("top 2 districts by enrolments")[1]
+    assert [r['district'] for r in result] == ['Patna', 'Khurda']
+    result = _ask("bottom 1 state by updates")[1]
+    assert result == [{'state': 'Odisha', 'total_updates': 1}]
+
+def test_unsupported_questions_go_to_the_llm():
+    for question in [
+        "average enrolments by state",
+        "enrolments in 2024",
+        "enrolments in May",
+        "total enrolments not in Bihar",
+        "districts with enrolments above 5",
+        "plot enrolments over time",
+        "enrolments in Delhi", # Not an official state
+        "top districts and states",
+    ]:
+        assert _ask(question)[0] is None, question
+
+if __name__ == "__main__":
+    test_counting_a_dimension_counts_distinct_values()
+    test_state_spellings_filter_on_the_official_state()
+    test_rows_without_state_canonical_are_kept()
+    test_states_are_normalized_when_not_stored_at_ingest()
+    test_rankings_respect_the_limit()
+    test_unsupported_questions_go_to_the_llm()
+    print("Query planner checks passed.")
@@ -0,0 +1,102 @@
+"""
+Checks for list paging, cursors and field projection, no server needed:
+    python test_responses.py      (or: pytest test_responses.py)
+"""
+import json
+import responses
+
+def _error(call, *args):
+    try:
+        call(*args)
+    except responses.ResponseError as e:
+        return e
+    raise AssertionError(f"{call.__name__}{args!r} did not raise")
+
+def test_cursor_round_trip_and_staleness():
+    cursor = responses.encode_cursor(40, ('aadhaar_data', 9021, 9021))
+    assert responses.decode_cursor(cursor, ('aadhaar_data', 9021, 9021)) == 40
+
+    stale = _error(responses.decode_cursor, cursor, ('aadhaar_data', 9022, 9022))
+    assert isinstance(stale, responses.StaleCursor) and stale.status == 409
+    for bad in ('not a cursor', 'e30', ''):
+        error = _error(responses.decode_cursor, bad, 1)
+        assert type(error) is responses.ResponseError and error.status == 400
+
+def test_list_params_paging_and_validation():
+    params = responses.list_params({}, default_limit=50)
+    assert params == responses.ListParams(0, 50, None, 'json', False)
+    params = responses.list_params({'limit': '5000', 'offset': '-3', 'fields': 'state, district,'}, max_limit=1000)
+    assert params == responses.ListParams(0, 1000, ['state', 'district'], 'json', True)
+
+    cursor = responses.encode_cursor(20, 'v1')
+    params = responses.list_params({'cursor': cursor, 'limit': '10'}, version='v1')
+    assert (params.offset, params.limit, params.paged) == (20, 10, True)
+    assert isinstance(_error(responses.list_params, {'cursor': cursor}, 'v2'), responses.StaleCursor)
+    assert 'limit' in str(_error(responses.list_params, {'limit': 'ten'}))
+    assert 'format' in str(_error(responses.list_params, {'format': 'csv'}))
+
+def test_paginate_slices_by_offset_and_limit():
+    records = list(range(10))
+    assert responses.paginate(records, responses.ListParams(3, 4, None, 'json', True)) == [3, 4, 5, 6]
+    assert responses.paginate(records, responses.ListParams(8, None, None, 'json', True)) == [8, 9]
+    assert responses.paginate(records, responses.ListParams(20, 5, None, 'json', True)) == []
+
+def test_project_uneven_records():
+    records = [{'state': 'Bihar', 'total': 3}, {'state': 'Kerala', 'anomaly_score': 2.7}]
+    assert responses.project(records, ['anomaly_score', 'state']) == [
+        {'anomaly_score': None, 'state': 'Bihar'}, {'anomaly_score': 2.7, 'state': 'Kerala'}
+    ]
+    assert responses.project(records, None) is records
+    assert responses.project([], ['state']) == []
+    error = _error(responses.project, records, ['state', 'pincode'])
+    assert 'pincode' in str(error) and 'anomaly_score' in str(error)
+
+    columns = {'state': ['Bihar', 'Kerala'], 'total': [3, 5]}
+    assert responses.project(columns, ['total']) == {'total': [3, 5]}
+    assert 'state_name' in str(_error(responses.project, columns, ['state_name']))
+
+def test_send_list_next_cursor():
+    records = [{'n': i} for i in range(5)]
+    params = responses.list_params({'limit': '2'}, version='v1')
+    response = responses.send_list(responses.paginate(records, params), params, total=5, version='v1', envelope={'total': 5})
+    body = json.loads(response.get_data())
+    assert body['items'] == [{'n': 0}, {'n': 1}]
+    assert body['next_cursor'] == response.headers['X-Next-Cursor']
+    assert response.headers['X-Total-Count'] == '5'
+    assert responses.decode_cursor(body['next_cursor'], 'v1') == 2
+
+    # A columnar page counts rows, not fields
+    params = responses.list_params({'offset': '3', 'limit': '2'}, version='v1')
+    page = {'n': [3, 4], 'label': ['d', 'e']}
+    response = responses.send_list(page, params, total=5, version='v1', envelope={})
+    assert json.loads(response.get_data())['next_cursor'] is None
+    assert 'X-Next-Cursor' not in response.headers
+
+    # Unpaged requests keep the envelope unchanged
+    params = responses.list_params({}, version='v1')
+    response = responses.send_list(records, params, total=5, version='v1', envelope={'total': 5})
+    assert 'next_cursor' not in json.loads(response.get_data())
+
+def test_ndjson_and_streamed_arrays_match_plain_json():
+    records = [{'n': i, 'state': None} for i in range(7)]
+    saved = responses.RESPONSE_STREAM_MIN_RECORDS, responses.RESPONSE_CHUNK_RECORDS
+    responses.RESPONSE_STREAM_MIN_RECORDS, responses.RESPONSE_CHUNK_RECORDS = 3, 2
+    try:
+        params = responses.list_params({})
+        streamed = responses.send_list(records, params, envelope={'total': 7})
+        assert json.loads(streamed.get_data()) == {'total': 7, 'items': records}
+        assert json.loads(responses.send_list(records, params).get_data()) == records
+        params = responses.list_params({'format': 'ndjson'})
+        lines = responses.send_list(records, params).get_data().splitlines()
+        assert [json.loads(line) for line in lines] == records
+    finally:
+        responses.RESPONSE_STREAM_MIN_RECORDS, responses.RESPONSE_CHUNK_RECORDS = saved
+
+if __name__ == "__main__":
+    test_cursor_round_trip_and_staleness()
+    test_list_params_paging_and_validation()
+    test_paginate_slices_by_offset_and_limit()
+    test_project_uneven_records()
+    test_send_list_next_cursor()
+    test_ndjson_and_streamed_arrays_match_plain_json()
+    print("Response checks passed.")
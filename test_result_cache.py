@@ -0,0 +1,89 @@
+"""
+Checks for the LRU/TTL result cache and its per-entry files, no server needed:
+    python test_result_cache.py      (or: pytest test_result_cache.py)
+"""
+import glob
+import os
+import tempfile
+import time
+from result_cache import ResultCache
+
+def _files(directory):
+    return sorted(glob.glob(os.path.join(directory, '*.json')))
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == (True, 1) # 'a' is now the most recent
+    cache.set('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1) and cache.get('c') == (True, 3)
+    assert cache.stats()['size'] == 2
+
+def test_get_or_compute_counts_hits_and_misses():
+    cache = ResultCache()
+    calls = []
+    compute = lambda: calls.append(1) or {'total': 5}
+    assert cache.get_or_compute('k', compute) == {'total': 5}
+    assert cache.get_or_compute('k', compute) == {'total': 5}
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+def test_entries_expire_after_ttl():
+    cache = ResultCache(ttl=0.05)
+    cache.set('k', 'v')
+    assert cache.get('k') == (True, 'v')
+    time.sleep(0.1)
+    assert cache.get('k') == (False, None)
+    assert cache.stats()['size'] == 0
+
+def test_directory_keeps_one_file_per_entry_across_restarts():
+    directory = tempfile.mkdtemp()
+    cache = ResultCache(maxsize=2, directory=directory)
+    cache.set('a', [1, 2])
+    cache.set('b', {'x': None})
+    cache.flush()
+    assert len(_files(directory)) == 2
+
+    cache.set('c', 'three') # Evicts 'a' and removes its file
+    cache.flush()
+    assert len(_files(directory)) == 2
+
+    restarted = ResultCache(maxsize=2, directory=directory)
+    assert restarted.get('a') == (False, None)
+    assert restarted.get('b') == (True, {'x': None})
+    assert restarted.get('c') == (True, 'three')
+
+    restarted.clear()
+    restarted.flush()
+    assert _files(directory) == []
+
+def test_load_drops_expired_entries_and_keeps_the_newest():
+    directory = tempfile.mkdtemp()
+    cache = ResultCache(maxsize=3, ttl=60, directory=directory)
+    for i, key in enumerate(['old', 'mid', 'new']):
+        cache.set(key, i)
+        cache.flush()
+        path = cache._entry_path(key)
+        os.utime(path, (1000 + i, 1000 + i)) # Distinct modification times, oldest first
+    expiring = ResultCache(ttl=0.05, directory=directory)
+    expiring.set('gone', 'soon')
+    expiring.flush()
+    time.sleep(0.1)
+
+    smaller = ResultCache(maxsize=2, directory=directory)
+    smaller.flush()
+    assert smaller.get('gone') == (False, None)
+    assert smaller.get('old') == (False, None) # Beyond maxsize, the oldest goes
+    assert smaller.get('mid') == (True, 1) and smaller.get('new') == (True, 2)
+    assert len(_files(directory)) == 2
+
+if __name__ == "__main__":
+    test_least_recently_used_entry_is_evicted()
+    test_get_or_compute_counts_hits_and_misses()
+    test_entries_expire_after_ttl()
+    test_directory_keeps_one_file_per_entry_across_restarts()
+    test_load_drops_expired_entries_and_keeps_the_newest()
+    print("Result cache checks passed.")
@@ -0,0 +1,76 @@
+"""
+Checks for the ingest-time anomaly statistics, no server or database needed:
+    python test_running_stats.py      (or: pytest test_running_stats.py)
+"""
+import numpy as np
+import pandas as pd
+import running_stats
+
+def _frame(seed=7, rows=600):
+    rng = np.random.default_rng(seed)
+    districts = rng.choice(['Patna', 'Gaya', 'Kollam', 'Pune'], size=rows)
+    enrolments = rng.poisson(40, size=rows).astype('float64')
+    enrolments[::97] *= 6 # A few spikes
+    df = pd.DataFrame({
+        'district': districts,
+        'date': pd.date_range('2025-01-01', periods=rows, freq='D').strftime('%d-%m-%Y'),
+        'total_enrolments': enrolments,
+    })
+    df.loc[5, 'district'] = None # Skipped: no district
+    df.loc[6, 'total_enrolments'] = np.nan # Skipped: no count
+    return df
+
+def _merged(df, splits):
+    stats = None
+    for part in np.array_split(np.arange(len(df)), splits):
+        stats = running_stats.combine(stats, running_stats.chunk_stats(df.iloc[part]))
+    return stats
+
+def test_combine_matches_numpy_on_split_data():
+    df = _frame()
+    stats = _merged(df, 7)
+    for district, group in df.dropna().groupby('district'):
+        values = group['total_enrolments'].to_numpy()
+        n, mean, m2 = stats.loc[district, ['n', 'mean', 'm2']]
+        assert n == len(values)
+        assert np.isclose(mean, values.mean())
+        assert np.isclose(np.sqrt(m2 / (n - 1)), np.std(values, ddof=1))
+
+def test_combine_keeps_groups_on_one_side():
+    a = running_stats.chunk_stats(pd.DataFrame({'district': ['Patna', 'Patna'], 'total_enrolments': [1, 3]}))
+    b = running_stats.chunk_stats(pd.DataFrame({'district': ['Gaya'], 'total_enrolments': [5]}))
+    stats = running_stats.combine(a, b)
+    assert stats.loc['Patna'].tolist() == [2.0, 2.0, 2.0]
+    assert stats.loc['Gaya'].tolist() == [1.0, 5.0, 0.0]
+    assert running_stats.combine(None, b) is b
+
+def test_score_does_not_depend_on_chunking_or_order():
+    df = _frame()
+    whole = running_stats.score(df, running_stats.chunk_stats(df))
+    assert len(whole)
+
+    # The same rule as a direct computation over the whole frame
+    values = df['total_enrolments']
+    grouped = values.groupby(df['district'])
+    z = (values - grouped.transform('mean')) / grouped.transform('std').replace(0, 1)
+    assert sorted(whole['z_score'].round(9)) == sorted(z[z > running_stats.ANOMALY_THRESHOLD].round(9))
+
+    shuffled = df.sample(frac=1, random_state=3)
+    split = running_stats.score(shuffled, _merged(shuffled, 5))
+    key = ['district', 'date', 'enrolments']
+    assert whole.sort_values(key)[key].values.tolist() == split.sort_values(key)[key].values.tolist()
+    assert np.allclose(whole.sort_values(key)['z_score'], split.sort_values(key)['z_score'])
+
+def test_score_without_dates_or_stats():
+    # Ten equal rows and a spike; the single Gaya row has no deviation and is never flagged
+    df = pd.DataFrame({'district': ['Patna'] * 11 + ['Gaya'], 'total_enrolments': [1] * 10 + [30, 400], 'date': [None] * 12})
+    flags = running_stats.score(df, running_stats.chunk_stats(df))
+    assert flags[['district', 'date', 'enrolments']].values.tolist() == [['Patna', 'NaT', 30.0]]
+    assert running_stats.score(df, None).empty
+
+if __name__ == "__main__":
+    test_combine_matches_numpy_on_split_data()
+    test_combine_keeps_groups_on_one_side()
+    test_score_does_not_depend_on_chunking_or_order()
+    test_score_without_dates_or_stats()
+    print("Running statistics checks passed.")
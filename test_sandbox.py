@@ -0,0 +1,82 @@
+"""
+Checks for the /api/ask sandbox workers and their limits, no server needed:
+    python test_sandbox.py      (or: pytest test_sandbox.py)
+The limits need the 'fork' start method (Linux/macOS); elsewhere only the inline path runs.
+"""
+import pandas as pd
+import sandbox
+
+def _frame(rows=5):
+    return pd.DataFrame({'district': [f'd{i}' for i in range(rows)], 'total_enrolments': range(rows)})
+
+def _error(pool, code, df, version=1):
+    try:
+        pool.run(code, df, version)
+    except sandbox.SandboxError as e:
+        return e
+    raise AssertionError(f"{code!r} ran without an error")
+
+def test_results_errors_and_isolation():
+    pool = sandbox.SandboxPool(size=1, wall_seconds=10)
+    df = _frame()
+    try:
+        assert pool.run("result = {'total': int(df['total_enrolments'].sum())}", df, 1) == {'total': 10}
+        assert pool.run("result = df.head(2)", df, 1) == [
+            {'district': 'd0', 'total_enrolments': 0}, {'district': 'd1', 'total_enrolments': 1}
+        ]
+        # A snippet's changes to df never reach the next one
+        pool.run("df['total_enrolments'] = 0\ndf.drop(index=0, inplace=True)\nresult = 1", df, 1)
+        assert pool.run("result = int(df['total_enrolments'].sum())", df, 1) == 10
+        assert int(df['total_enrolments'].sum()) == 10
+
+        error = _error(pool, "result = df['missing']", df)
+        assert isinstance(error, sandbox.ExecutionError) and 'missing' in str(error)
+        # New data version: workers see the new frame
+        assert pool.run("result = len(df)", _frame(7), 2) == 7
+    finally:
+        pool.close()
+
+def test_wall_clock_limit_replaces_the_worker():
+    pool = sandbox.SandboxPool(size=1, wall_seconds=0.5)
+    df = _frame()
+    try:
+        if pool.inline:
+            return
+        error = _error(pool, "import time\ntime.sleep(5)", df)
+        assert isinstance(error, sandbox.LimitExceeded) and 'time limit' in str(error)
+        assert pool.run("result = len(df)", df, 1) == 5
+    finally:
+        pool.close()
+
+def test_cpu_and_memory_limits():
+    pool = sandbox.SandboxPool(size=1, wall_seconds=10, cpu_seconds=1, memory_mb=64)
+    df = _frame()
+    try:
+        if pool.inline:
+            return
+        error = _error(pool, "while True:\n    pass", df)
+        assert isinstance(error, sandbox.LimitExceeded) and 'CPU' in str(error)
+        error = _error(pool, "block = bytearray(512 * 1024 * 1024)", df)
+        assert isinstance(error, sandbox.LimitExceeded) and 'memory' in str(error)
+        # The same worker keeps serving after a reported limit
+        assert pool.run("result = len(df)", df, 1) == 5
+    finally:
+        pool.close()
+
+def test_result_size_limit():
+    saved = sandbox.ASK_MAX_RESULT_BYTES
+    sandbox.ASK_MAX_RESULT_BYTES = 1000 # Read by workers forked after this point
+    pool = sandbox.SandboxPool(size=1, wall_seconds=10)
+    try:
+        error = _error(pool, "result = ['x' * 100] * 100", _frame())
+        assert isinstance(error, sandbox.LimitExceeded) and 'limit is 1000' in str(error)
+    finally:
+        pool.close()
+        sandbox.ASK_MAX_RESULT_BYTES = saved
+
+if __name__ == "__main__":
+    test_results_errors_and_isolation()
+    test_wall_clock_limit_replaces_the_worker()
+    test_cpu_and_memory_limits()
+    test_result_size_limit()
+    print("Sandbox checks passed.")
@@ -0,0 +1,82 @@
+"""
+Checks for the Feather snapshot cache and its freshness fingerprint.
+Each test uses its own throwaway SQLite database, no server needed:
+    python test_snapshot_cache.py      (or: pytest test_snapshot_cache.py)
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Point database.py at a scratch file before it creates its engine
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'snapshot_check.db'))
+
+import pandas as pd
+import database
+import snapshot_cache
+
+@contextmanager
+def _scratch_database():
+    """Swap database.py's engines for an empty SQLite file for the duration of a test."""
+    saved = database.engine, database.read_engine
+    database.engine = database.read_engine = database.make_engine('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'scratch.db'))
+    try:
+        database.init_db()
+        yield
+    finally:
+        database.engine.dispose()
+        database.engine, database.read_engine = saved
+
+def _upload(name, rows=3):
+    df = pd.DataFrame({
+        'state': ['Bihar'] * rows,
+        'district': ['Patna'] * rows,
+        'date': ['15-01-2025'] * rows,
+        'total_enrolments': range(rows),
+        'total_updates': [1] * rows,
+    })
+    success, message = database.insert_dataframe(df, name)
+    assert success, message
+
+def _path():
+    return os.path.join(tempfile.mkdtemp(), 'aadhaar_data.feather')
+
+def test_snapshot_is_fresh_until_the_data_changes():
+    path = _path()
+    with _scratch_database():
+        _upload('first.csv')
+        assert snapshot_cache.write_from_database(path=path)
+        fresh = snapshot_cache.load_if_fresh(path)
+        assert fresh is not None
+        df, meta = fresh
+        assert len(df) == 3 and meta['rows'] == 3 and meta['watermark'] == int(df['id'].max())
+        pd.testing.assert_frame_equal(df, database.get_all_data(bind=database.engine))
+
+        _upload('second.csv')
+        assert snapshot_cache.load_if_fresh(path) is None
+
+def test_failed_loads_keep_the_snapshot_fresh():
+    path = _path()
+    with _scratch_database():
+        _upload('first.csv')
+        assert snapshot_cache.write_from_database(path=path)
+        # Recorded in uploaded_files, but no rows reached aadhaar_data
+        database.record_file_failure('broken.csv', 'could not parse')
+        assert snapshot_cache.load_if_fresh(path) is not None
+
+def test_missing_or_unreadable_snapshots_are_ignored():
+    path = _path()
+    with _scratch_database():
+        _upload('first.csv')
+        assert snapshot_cache.load_if_fresh(path) is None # Never written
+        assert snapshot_cache.write_from_database(path=path)
+        with open(path, 'wb') as f:
+            f.write(b'not feather') # Metadata still matches, the file does not
+        assert snapshot_cache.load_if_fresh(path) is None
+        os.remove(path + '.json')
+        assert snapshot_cache.load_if_fresh(path) is None
+
+if __name__ == "__main__":
+    test_snapshot_is_fresh_until_the_data_changes()
+    test_failed_loads_keep_the_snapshot_fresh()
+    test_missing_or_unreadable_snapshots_are_ignored()
+    print("Snapshot checks passed.")
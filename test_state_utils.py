@@ -0,0 +1,55 @@
+"""
+Checks for state-name canonicalization, no server or database needed:
+    python test_state_utils.py      (or: pytest test_state_utils.py)
+"""
+import pandas as pd
+import state_utils
+
+def test_normalize_state_series_matches_row_by_row_lookup():
+    raw = pd.Series(
+        ['Orissa', '  WEST   bengal ', 'Westbengal', 'Bihar', 'bihar', 'Uttaranchal',
+         'Jammu & Kashmir', 'Delhi', 'Chandigarh', 'Jaipur', 'Atlantis', None, 42],
+        index=range(100, 113), name='state'
+    )
+    states = state_utils.normalize_state_series(raw)
+    assert list(states.cat.categories) == state_utils.STATE_CATEGORIES
+    assert states.index.equals(raw.index) and states.name == 'state'
+    assert states.tolist()[:7] == [
+        'Odisha', 'West Bengal', 'West Bengal', 'Bihar', 'Bihar', 'Uttarakhand', 'Jammu and Kashmir'
+    ]
+    # Union Territories, districts, unknown and non-string values are dropped
+    assert states.iloc[7:].isna().all()
+    expected = [state_utils.normalize_state_name(name) for name in raw]
+    assert [None if pd.isna(s) else s for s in states] == expected
+
+def test_every_official_state_maps_to_itself():
+    raw = pd.Series(state_utils.OFFICIAL_STATES)
+    assert state_utils.normalize_state_series(raw).tolist() == state_utils.OFFICIAL_STATES
+    assert state_utils.normalize_state_series(raw.str.upper()).tolist() == state_utils.OFFICIAL_STATES
+    assert state_utils.normalize_state_series(pd.Series([], dtype=object)).empty
+
+def test_fill_canonical_states_normalizes_only_the_gaps():
+    canonical = pd.Series(['Kerala', None, 'Bihar', None, None], index=[3, 4, 5, 6, 7])
+    raw = pd.Series(['kerala', 'Orissa', 'Patna', 'Delhi', None], index=[3, 4, 5, 6, 7])
+    states = state_utils.fill_canonical_states(canonical, raw)
+    assert list(states.cat.categories) == state_utils.STATE_CATEGORIES
+    # The stored value wins over the raw name (row 5), gaps fall back to the raw name
+    assert states.tolist()[:3] == ['Kerala', 'Odisha', 'Bihar']
+    assert states.iloc[3:].isna().all()
+
+    complete = state_utils.fill_canonical_states(canonical.fillna('Goa'), raw)
+    assert complete.tolist() == ['Kerala', 'Goa', 'Bihar', 'Goa', 'Goa']
+
+def test_get_official_states_only_drops_union_territories():
+    df = pd.DataFrame({'state': ['orissa', 'Delhi', 'Kerala'], 'total_enrolments': [1, 2, 3]})
+    filtered = state_utils.get_official_states_only(df)
+    assert filtered['state'].tolist() == ['Odisha', 'Kerala']
+    assert filtered['total_enrolments'].tolist() == [1, 3]
+    assert df['state'].tolist() == ['orissa', 'Delhi', 'Kerala'] # The input is untouched
+
+if __name__ == "__main__":
+    test_normalize_state_series_matches_row_by_row_lookup()
+    test_every_official_state_maps_to_itself()
+    test_fill_canonical_states_normalizes_only_the_gaps()
+    test_get_official_states_only_drops_union_territories()
+    print("State canonicalization checks passed.")